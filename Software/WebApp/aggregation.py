@@ -0,0 +1,281 @@
+# ~/librecorder/Software/WebApp/aggregation.py
+"""
+Streaming aggregation of per-image results into a case summary.
+
+Results are folded in one at a time (CaseAggregator.add), so memory does
+not grow with the number of images and summary() can be called at any
+point to publish a partial aggregate.
+
+Built in, for every model (same keys run_model always returned):
+  mean_pixel        -> "mean_pixel_avg"
+  classification    -> "class_counts"
+  cell_class_counts -> "cells", "cell_class_counts", "parasitemia"
+A model can ask for more by declaring AGGREGATES, result key -> aggregators:
+  AGGREGATES = {
+      "confidence": ["stats", "histogram"],
+      "p_infected": {"quantiles": {"q": [0.5, 0.9]}, "histogram": {"bins": 20}},
+  }
+Aggregators: stats (running mean/variance/min/max), counts, histogram,
+quantiles. Their output goes under agg[<aggregator>][<key>].
+"""
+import math
+
+DEFAULT_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+class RunningStats:
+    """Welford running mean / variance."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x):
+        self.n += 1
+        d = x - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (x - self.mean)
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+
+    def summary(self):
+        if not self.n:
+            return {"n": 0}
+        var = self.m2 / (self.n - 1) if self.n > 1 else 0.0
+        return {
+            "n": self.n,
+            "mean": round(self.mean, 6),
+            "std": round(math.sqrt(var), 6),
+            "min": round(self.min, 6),
+            "max": round(self.max, 6),
+        }
+
+
+class Counts:
+    def __init__(self):
+        self.counts = {}
+
+    def add(self, x, n=1):
+        self.counts[x] = self.counts.get(x, 0) + n
+
+    def summary(self):
+        return dict(self.counts)
+
+
+class Histogram:
+    """Fixed-bin histogram; values outside the range go to the edge bins."""
+
+    def __init__(self, range=(0.0, 1.0), bins=10):
+        self.lo, self.hi = float(range[0]), float(range[1])
+        if self.hi <= self.lo or bins <= 0:
+            raise ValueError("histogram needs hi > lo and bins > 0")
+        self.bins = int(bins)
+        self.counts = [0] * self.bins
+
+    def add(self, x):
+        i = int((x - self.lo) / (self.hi - self.lo) * self.bins)
+        self.counts[min(max(i, 0), self.bins - 1)] += 1
+
+    def summary(self):
+        width = (self.hi - self.lo) / self.bins
+        return {
+            "edges": [round(self.lo + i * width, 6) for i in range(self.bins + 1)],
+            "counts": list(self.counts),
+        }
+
+
+class P2Quantile:
+    """
+    One streaming quantile with the P-square algorithm (Jain & Chlamtac, 1985):
+    five markers, constant memory.
+    """
+
+    def __init__(self, p):
+        self.p = p
+        self.count = 0
+        self.q = []                      # marker heights
+        self.n = [0, 1, 2, 3, 4]         # marker positions
+        self.np = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self.dn = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        q, n = self.q, self.n
+        self.count += 1
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.np[i] += self.dn[i]
+
+        for i in (1, 2, 3):
+            d = self.np[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = qp
+                n[i] += d
+
+    def value(self):
+        if not self.q:
+            return None
+        if self.count <= 5:
+            # exact on the few values seen so far
+            s = self.q
+            return s[min(int(round(self.p * (len(s) - 1))), len(s) - 1)]
+        return self.q[2]
+
+
+class Quantiles:
+    """
+    Exact quantiles while few values have been seen (bounded buffer), then
+    P-square estimates, so memory stays flat for very large cases.
+    """
+
+    EXACT_LIMIT = 1000
+
+    def __init__(self, q=DEFAULT_QUANTILES):
+        self.ps = [float(p) for p in q]
+        self.buffer = []
+        self.estimators = None
+
+    def add(self, x):
+        if self.estimators is not None:
+            for e in self.estimators:
+                e.add(x)
+            return
+        self.buffer.append(x)
+        if len(self.buffer) > self.EXACT_LIMIT:
+            self.estimators = [P2Quantile(p) for p in self.ps]
+            for v in self.buffer:
+                for e in self.estimators:
+                    e.add(v)
+            self.buffer = None
+
+    def _exact(self, p):
+        s = sorted(self.buffer)
+        if not s:
+            return None
+        pos = p * (len(s) - 1)
+        lo = int(pos)
+        hi = min(lo + 1, len(s) - 1)
+        return s[lo] + (s[hi] - s[lo]) * (pos - lo)
+
+    def summary(self):
+        out = {}
+        for i, p in enumerate(self.ps):
+            v = self._exact(p) if self.estimators is None else self.estimators[i].value()
+            out[f"p{p * 100:g}"] = round(v, 6) if v is not None else None
+        return out
+
+
+AGGREGATORS = {
+    "stats": RunningStats,
+    "counts": Counts,
+    "histogram": Histogram,
+    "quantiles": Quantiles,
+}
+
+
+def _is_number(v):
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def _declared(mod):
+    """[(result_key, aggregator_name, instance)] from a model's AGGREGATES."""
+    spec = getattr(mod, "AGGREGATES", None) or {}
+    out = []
+    for key, aggs in spec.items():
+        if isinstance(aggs, str):
+            aggs = [aggs]
+        if not isinstance(aggs, dict):
+            aggs = {name: {} for name in aggs}
+        for name, opts in aggs.items():
+            if name not in AGGREGATORS:
+                raise ValueError(f"Unknown aggregator '{name}' for '{key}'")
+            out.append((key, name, AGGREGATORS[name](**(opts or {}))))
+    return out
+
+
+class CaseAggregator:
+    """Fold per-image entries ({"file", "result"|"error"}) into a case summary."""
+
+    def __init__(self, mod=None):
+        self.positive = getattr(mod, "POSITIVE_CLASS", None)
+        self.images = 0
+        self.errors = 0
+        self.mean_pixel = RunningStats()
+        self.classes = Counts()
+        self.cells = Counts()
+        self.declared = _declared(mod)
+
+    def add(self, entry):
+        self.images += 1
+        r = entry.get("result")
+        if not isinstance(r, dict):
+            if "error" in entry:
+                self.errors += 1
+            return
+
+        if _is_number(r.get("mean_pixel")):
+            self.mean_pixel.add(float(r["mean_pixel"]))
+        if "classification" in r:
+            self.classes.add(r["classification"])
+        for k, n in (r.get("cell_class_counts") or {}).items():
+            self.cells.add(k, n)
+
+        for key, name, agg in self.declared:
+            v = r.get(key)
+            if v is None:
+                continue
+            if name == "counts":
+                agg.add(v)
+            elif _is_number(v):
+                agg.add(float(v))
+
+    def summary(self):
+        agg = {}
+        if self.mean_pixel.n:
+            agg["mean_pixel_avg"] = round(self.mean_pixel.mean, 4)
+        if self.classes.counts:
+            agg["class_counts"] = self.classes.summary()
+        if self.cells.counts:
+            total = sum(self.cells.counts.values())
+            agg["cells"] = total
+            agg["cell_class_counts"] = self.cells.summary()
+            if self.positive is not None:
+                agg["parasitemia"] = round(self.cells.counts.get(self.positive, 0) / total, 6)
+        for key, name, a in self.declared:
+            agg.setdefault(name, {})[key] = a.summary()
+        if self.errors:
+            agg["errors"] = self.errors
+        return agg
+
+
+def aggregate(per_image, mod=None):
+    """Summarize an iterable of per-image entries for one model over a case."""
+    a = CaseAggregator(mod)
+    for x in per_image:
+        a.add(x)
+    return a.summary()
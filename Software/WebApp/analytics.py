@@ -0,0 +1,300 @@
+# ~/librecorder/Software/WebApp/analytics.py
+"""
+Grouped statistics across cases, for QA reports and drift checks.
+
+  GET /analytics/images?group_by=day,model&metric=confidence&positive=Infected
+  GET /analytics/cases?group_by=month,level&model=mean_pixel_v1&metric=mean_pixel_avg
+      &from=2026-01-01&to=2026-02-01&domain=&level=&tag=&case=&format=json|csv|parquet
+
+/analytics/images works on the per-image rows (ImageResult), one value per
+image and model; /analytics/cases on the latest summary each model logged
+for each case (the "model:<id>" results of /run_model and /run_pipeline).
+
+group_by: any of day, month, model, case, level, domain, tag and, for
+images, classification. A case with several tags counts once per tag.
+
+metric: for images confidence, latency_ms or a numeric key of the result
+(e.g. mean_pixel, p_infected), read in SQL (json_extract on SQLite and
+MySQL, jsonb_extract_path_text on Postgres); for cases a
+key of the summary, dotted for nested ones (stats.mean_pixel.mean).
+Each group gets n (and errors for images), and for the metric count, mean,
+std, min, max, p50 and p95 over the rows that have it. positive=<class> adds
+positive_rate, the share of images without an error classified as it.
+
+The database filters and picks out the columns; grouping is done on NumPy
+arrays (bincount, one sort for the percentiles) rather than row by row.
+Parquet output needs pyarrow.
+"""
+import ast
+import csv
+import io
+import json
+import math
+import re
+
+from models import db, Case, CaseTag, ImageResult, TestResult
+from case_meta import filter_cases
+
+IMAGE_GROUPS = ("day", "month", "model", "case", "level", "domain", "tag", "classification")
+CASE_GROUPS = ("day", "month", "model", "case", "level", "domain", "tag")
+QUANTILES = (("p50", 0.5), ("p95", 0.95))
+_METRIC = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+SUMMARY_PREFIX = "model:"
+
+
+class AnalyticsError(Exception):
+    """Raised with an HTTP status for the route to return."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_group_by(text, allowed):
+    keys = [k.strip() for k in (text or "").split(",") if k.strip()]
+    bad = [k for k in keys if k not in allowed]
+    if bad:
+        raise AnalyticsError(f"cannot group by {', '.join(bad)}; choose from {', '.join(allowed)}")
+    return list(dict.fromkeys(keys))
+
+
+def parse_metric(text):
+    if text and not _METRIC.match(text):
+        raise AnalyticsError("metric must be a result key such as confidence or stats.mean_pixel.mean")
+    return text or None
+
+
+def parse_summary(text):
+    """A logged model summary: JSON, or the Python repr older versions wrote."""
+    if not text:
+        return None
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return None
+
+
+def _number(v):
+    if isinstance(v, bool) or v is None:
+        return math.nan
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _dig(obj, path):
+    for part in path.split("."):
+        if not isinstance(obj, dict):
+            return None
+        obj = obj.get(part)
+    return obj
+
+
+# ----------------------------
+# Queries
+# ----------------------------
+# day / month keys as YYYY-MM-DD / YYYY-MM strings on every backend
+_DATE_FORMATS = {
+    "sqlite": ("strftime", {"day": "%Y-%m-%d", "month": "%Y-%m"}),
+    "postgresql": ("to_char", {"day": "YYYY-MM-DD", "month": "YYYY-MM"}),
+    "mysql": ("date_format", {"day": "%Y-%m-%d", "month": "%Y-%m"}),
+    "mariadb": ("date_format", {"day": "%Y-%m-%d", "month": "%Y-%m"}),
+}
+
+
+def _dialect():
+    return db.session.get_bind().dialect.name
+
+
+def _date_key(timestamp, unit, dialect):
+    func, formats = _DATE_FORMATS.get(dialect, _DATE_FORMATS["sqlite"])
+    if func == "strftime":
+        return db.func.strftime(formats[unit], timestamp)
+    return getattr(db.func, func)(timestamp, formats[unit])
+
+
+def _json_value(column, path, dialect):
+    """A (possibly dotted) key of a JSON text column; _number() reads what it returns."""
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import JSONB
+        return db.func.jsonb_extract_path_text(db.cast(column, JSONB), *path.split("."))
+    return db.func.json_extract(column, "$." + path)
+
+
+def _key_columns(group_by, timestamp, model, dialect):
+    columns = {
+        "day": _date_key(timestamp, "day", dialect),
+        "month": _date_key(timestamp, "month", dialect),
+        "model": model,
+        "case": Case.case_id,
+        "level": Case.level,
+        "domain": Case.domain,
+        "tag": CaseTag.tag,
+        "classification": ImageResult.classification,
+    }
+    return [columns[k].label(k) for k in group_by]
+
+
+def _filtered(q, case_id_col, timestamp, group_by, filters):
+    q = q.join(Case, Case.case_id == case_id_col)
+    if "tag" in group_by:
+        q = q.outerjoin(CaseTag, CaseTag.case_id == case_id_col)
+    q = filter_cases(q, filters.get("domain"), filters.get("level"), filters.get("tag"))
+    if filters.get("case"):
+        q = q.filter(case_id_col == filters["case"])
+    if filters.get("start"):
+        q = q.filter(timestamp >= filters["start"])
+    if filters.get("end"):
+        q = q.filter(timestamp < filters["end"])
+    return q
+
+
+def image_analytics(group_by, metric=None, positive=None, model=None, **filters):
+    """(fields, rows) of grouped per-image statistics."""
+    dialect = _dialect()
+    if metric in ("confidence", "latency_ms"):
+        value = getattr(ImageResult, metric)
+    elif metric:
+        value = _json_value(ImageResult.result, metric, dialect)
+    else:
+        value = db.null()
+    q = db.session.query(
+        *_key_columns(group_by, ImageResult.timestamp, ImageResult.model_id, dialect),
+        value, ImageResult.error.isnot(None), ImageResult.classification,
+    ).select_from(ImageResult)
+    q = _filtered(q, ImageResult.case_id, ImageResult.timestamp, group_by, filters)
+    if model:
+        q = q.filter(ImageResult.model_id == model)
+
+    n = len(group_by)
+    keys, values, errors, hits = [], [], [], []
+    for row in q.execution_options(yield_per=5000):
+        keys.append(tuple(row[:n]))
+        values.append(_number(row[n]))
+        errors.append(bool(row[n + 1]))
+        hits.append(positive is not None and row[n + 2] == positive)
+    return group_stats(
+        group_by, keys,
+        values=values if metric else None,
+        errors=errors,
+        positive=hits if positive is not None else None,
+    )
+
+
+def case_analytics(group_by, metric=None, model=None, **filters):
+    """(fields, rows) of grouped statistics over the latest model summary of each case."""
+    latest = db.select(db.func.max(TestResult.id)).where(
+        TestResult.test_name.like(SUMMARY_PREFIX + "%")
+    ).group_by(TestResult.case_id, TestResult.test_name)
+    q = db.session.query(
+        *_key_columns(group_by, TestResult.timestamp, db.func.substr(TestResult.test_name, len(SUMMARY_PREFIX) + 1),
+                      _dialect()),
+        TestResult.result,
+    ).select_from(TestResult).filter(TestResult.id.in_(latest))
+    q = _filtered(q, TestResult.case_id, TestResult.timestamp, group_by, filters)
+    if model:
+        q = q.filter(TestResult.test_name == SUMMARY_PREFIX + model)
+
+    n = len(group_by)
+    keys, values = [], []
+    for row in q.execution_options(yield_per=5000):
+        keys.append(tuple(row[:n]))
+        if metric:
+            values.append(_number(_dig(parse_summary(row[n]), metric)))
+    return group_stats(group_by, keys, values=values if metric else None)
+
+
+# ----------------------------
+# Grouping
+# ----------------------------
+def group_stats(group_by, keys, values=None, errors=None, positive=None):
+    """
+    Group rows by their key tuple. values are floats (NaN where a row has
+    none); errors and positive are per-row flags. Returns (fields, rows).
+    """
+    import numpy as np
+
+    index = {}
+    inv = np.fromiter((index.setdefault(k, len(index)) for k in keys), dtype=np.int64, count=len(keys))
+    g = len(index)
+    cols = {"n": np.bincount(inv, minlength=g)}
+    if errors is not None:
+        cols["errors"] = np.bincount(inv, weights=np.asarray(errors, dtype=float), minlength=g).astype(np.int64)
+    if positive is not None:
+        ok = cols["n"] - cols.get("errors", 0)
+        hits = np.bincount(inv, weights=np.asarray(positive, dtype=float), minlength=g)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cols["positive_rate"] = np.where(ok > 0, hits / ok, np.nan)
+    if values is not None:
+        cols.update(_value_stats(np, inv, np.asarray(values, dtype=float), g))
+
+    fields = list(group_by) + list(cols)
+    rows = []
+    for key, i in index.items():
+        row = dict(zip(group_by, key))
+        for name, arr in cols.items():
+            v = arr[i].item()
+            row[name] = None if isinstance(v, float) and math.isnan(v) else (round(v, 6) if isinstance(v, float) else v)
+        rows.append(row)
+    rows.sort(key=lambda r: tuple("" if r[k] is None else str(r[k]) for k in group_by))
+    return fields, rows
+
+
+def _value_stats(np, inv, v, g):
+    valid = ~np.isnan(v)
+    iv, vv = inv[valid], v[valid]
+    cnt = np.bincount(iv, minlength=g)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(iv, weights=vv, minlength=g) / cnt
+        dev = vv - mean[iv]
+        std = np.where(cnt > 1, np.sqrt(np.bincount(iv, weights=dev * dev, minlength=g) / (cnt - 1)), 0.0)
+    std[cnt == 0] = np.nan
+    lo = np.full(g, np.inf)
+    hi = np.full(g, -np.inf)
+    np.minimum.at(lo, iv, vv)
+    np.maximum.at(hi, iv, vv)
+    lo[cnt == 0] = hi[cnt == 0] = np.nan
+    out = {"count": cnt, "mean": mean, "std": std, "min": lo, "max": hi}
+
+    # one sort by (group, value); percentiles interpolated inside each group's run
+    ordered = vv[np.lexsort((vv, iv))]
+    start = np.concatenate(([0], np.cumsum(cnt)[:-1]))
+    for name, q in QUANTILES:
+        pos = start + q * np.maximum(cnt - 1, 0)
+        below = np.floor(pos).astype(np.int64)
+        above = np.ceil(pos).astype(np.int64)
+        has = cnt > 0
+        val = np.full(g, np.nan)
+        if has.any():
+            a, b = ordered[below[has]], ordered[above[has]]
+            val[has] = a + (b - a) * (pos[has] - below[has])
+        out[name] = val
+    return out
+
+
+# ----------------------------
+# Output
+# ----------------------------
+def to_csv(fields, rows):
+    buf = io.StringIO()
+    w = csv.DictWriter(buf, fieldnames=fields)
+    w.writeheader()
+    w.writerows(rows)
+    return buf.getvalue()
+
+
+def to_parquet(fields, rows):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise AnalyticsError("Parquet output needs pyarrow (pip install pyarrow)", 501)
+    table = pa.table({f: [r.get(f) for r in rows] for f in fields})
+    buf = pa.BufferOutputStream()
+    pq.write_table(table, buf)
+    return buf.getvalue().to_pybytes()
@@ -0,0 +1,311 @@
+# ~/librecorder/Software/WebApp/bench_app.py
+"""
+Benchmark the WebApp hot paths on synthetic cases.
+
+  python bench_app.py --cases 3 --images 50 --size 1024x768 --notes 10 --results 200 \
+      --json bench.json
+  python bench_app.py --compare bench.json          # same settings, flag regressions
+
+Generates cases of N images (jpg, png or tif), M notes and K recorded
+results, then times each endpoint:
+  upload      POST /upload (jpg images and the notes)
+  import      POST /import_folder (png/tif images, which /upload does not take)
+  record      POST /record_result
+  list        GET /cases
+  case        GET /cases/<id>
+  render      GET /render/<id> and the first page of /cases/<id>/images
+  results     GET /results/<id>
+  run_model   POST /run_model (--model, default mean_pixel_v1)
+and reports throughput and p50/p95/p99 latency per step.
+
+By default the app runs in this process through the Flask test client,
+on a throwaway data directory (LIBRECORDER_DATA_DIR), so the real database
+and uploads are not touched. --server http://host:port drives a running
+server instead (import needs the server to see this machine's temp dir).
+
+Images are generated from --seed, so runs are comparable between commits.
+--compare exits with status 1 when a step's p50 or p95 got slower by more
+than --threshold percent.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+FORMATS = {"jpg": "JPEG", "png": "PNG", "tif": "TIFF"}
+
+
+# ----------------------------
+# Synthetic data
+# ----------------------------
+def make_image(width, height, rng):
+    """A smooth background with noise and some dark blobs, like a stained field."""
+    small = rng.random((max(2, height // 64), max(2, width // 64), 3))
+    bg = np.asarray(Image.fromarray((small * 255).astype(np.uint8)).resize((width, height), Image.BILINEAR))
+    img = bg.astype(np.float32) * 0.6 + 80 + rng.normal(0, 8, (height, width, 3))
+    yy, xx = np.ogrid[:height, :width]
+    for _ in range(max(1, width * height // 40000)):
+        cy, cx = rng.integers(0, height), rng.integers(0, width)
+        r = rng.integers(6, 20)
+        img[(yy - cy) ** 2 + (xx - cx) ** 2 < r * r] *= 0.55
+    return Image.fromarray(np.clip(img, 0, 255).astype(np.uint8))
+
+
+def image_bytes(img, fmt):
+    buf = io.BytesIO()
+    img.save(buf, format=FORMATS[fmt])
+    return buf.getvalue()
+
+
+def make_note(i, rng):
+    words = ["sample", "stain", "field", "parasite", "slide", "giemsa", "thin", "smear", "ring", "trophozoite"]
+    return (f"Note {i}\n" + " ".join(rng.choice(words, 200)) + "\n").encode()
+
+
+# ----------------------------
+# Clients
+# ----------------------------
+class LocalClient:
+    """The app in this process, through the Flask test client."""
+
+    def __init__(self):
+        from app import app, init_db
+        init_db()
+        self.c = app.test_client()
+
+    def request(self, method, path, json=None, upload=None, form=None):
+        if upload is not None:
+            name, data = upload
+            r = self.c.open(path, method=method, data={"file": (io.BytesIO(data), name), **(form or {})})
+        else:
+            r = self.c.open(path, method=method, json=json)
+        body = r.get_data()
+        return r.status_code, body
+
+
+class ServerClient:
+    def __init__(self, server):
+        import requests
+        self.server = server.rstrip("/")
+        self.s = requests.Session()
+
+    def request(self, method, path, json=None, upload=None, form=None):
+        files = {"file": upload} if upload is not None else None
+        r = self.s.request(method, self.server + path, json=json, files=files, data=form)
+        return r.status_code, r.content
+
+
+# ----------------------------
+# Timing
+# ----------------------------
+def latency_stats(samples, elapsed):
+    """{count, seconds, per_s, mean_ms, p50_ms, p95_ms, p99_ms, max_ms} for latencies in seconds."""
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples) * 1000
+    return {
+        "count": len(samples),
+        "seconds": round(elapsed, 4),
+        "per_s": round(len(samples) / elapsed, 2) if elapsed > 0 else None,
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+class Timer:
+    def __init__(self, client):
+        self.client = client
+        self.samples = {}
+        self.elapsed = {}
+        self.failures = {}
+
+    def call(self, step, method, path, ok=(200,), **kw):
+        t0 = time.perf_counter()
+        status, body = self.client.request(method, path, **kw)
+        dt = time.perf_counter() - t0
+        self.samples.setdefault(step, []).append(dt)
+        self.elapsed[step] = self.elapsed.get(step, 0) + dt
+        if status not in ok:
+            self.failures[step] = self.failures.get(step, 0) + 1
+            if self.failures[step] == 1:
+                print(f"  {step}: {method} {path} -> {status} {body[:200]!r}", file=sys.stderr)
+        return status, body
+
+    def report(self):
+        out = {}
+        for step, samples in self.samples.items():
+            out[step] = latency_stats(samples, self.elapsed[step])
+            if self.failures.get(step):
+                out[step]["failures"] = self.failures[step]
+        return out
+
+
+# ----------------------------
+# The benchmark
+# ----------------------------
+def run(args, client, workdir):
+    rng = np.random.default_rng(args.seed)
+    width, height = args.size
+    timer = Timer(client)
+
+    print(f"generating {args.images} {args.format} image(s) of {width}x{height} ...")
+    images = [image_bytes(make_image(width, height, rng), args.format) for _ in range(args.images)]
+    notes = [make_note(i, rng) for i in range(args.notes)]
+
+    case_ids = []
+    for n in range(args.cases):
+        case_id = f"bench-{args.seed}-{n}-{time.strftime('%H%M%S')}"
+        case_ids.append(case_id)
+        print(f"case {case_id}")
+        if args.format == "jpg":
+            for i, data in enumerate(images):
+                timer.call("upload", "POST", "/upload", upload=(f"img{i:05d}.jpg", data), form={"case_id": case_id})
+        else:
+            src = os.path.join(workdir, f"import-{n}")
+            os.makedirs(src, exist_ok=True)
+            for i, data in enumerate(images):
+                with open(os.path.join(src, f"img{i:05d}.{args.format}"), "wb") as f:
+                    f.write(data)
+            timer.call("import", "POST", "/import_folder", json={"src": src, "case_id": case_id})
+        for i, data in enumerate(notes):
+            timer.call("upload", "POST", "/upload", upload=(f"note{i:04d}.txt", data), form={"case_id": case_id})
+        for i in range(args.results):
+            timer.call("record", "POST", "/record_result", json={
+                "case_id": case_id, "test_name": f"bench_{i % 10}", "result": str(rng.random()), "units": "",
+            })
+
+    for _ in range(args.repeat):
+        timer.call("list", "GET", "/cases")
+        for case_id in case_ids:
+            timer.call("case", "GET", f"/cases/{case_id}")
+            timer.call("render", "GET", f"/render/{case_id}")
+            timer.call("render", "GET", f"/cases/{case_id}/images?offset=0&limit=120")
+            timer.call("results", "GET", f"/results/{case_id}")
+
+    for _ in range(args.model_runs):
+        for case_id in case_ids:
+            timer.call("run_model", "POST", "/run_model",
+                       json={"case_id": case_id, "model_id": args.model, "per_image": False})
+    return timer.report()
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"commit": commit, "python": platform.python_version(), "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def compare(current, baseline, threshold, keys=("p50_ms", "p95_ms")):
+    """
+    Print each step's change against a baseline report. Returns the list of
+    (step, key, old, new) that got slower by more than threshold percent.
+    """
+    regressions = []
+    for step, now in current.items():
+        before = baseline.get(step)
+        if not before or not now.get("count") or not before.get("count"):
+            continue
+        parts = []
+        for k in keys:
+            old, new = before[k], now[k]
+            change = (new - old) / old * 100 if old else 0.0
+            flag = ""
+            if change > threshold:
+                flag = " !"
+                regressions.append((step, k, old, new))
+            parts.append(f"{k} {old:.2f} -> {new:.2f} ({change:+.0f}%){flag}")
+        print(f"  {step:<24} " + ", ".join(parts))
+    return regressions
+
+
+def print_report(report):
+    print(f"{'step':<12}{'n':>7}{'per s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for step, s in report.items():
+        if not s.get("count"):
+            continue
+        fail = f"  ({s['failures']} failed)" if s.get("failures") else ""
+        print(f"{step:<12}{s['count']:>7}{s['per_s']:>10}{s['p50_ms']:>10}{s['p95_ms']:>10}"
+              f"{s['p99_ms']:>10}{s['max_ms']:>10}{fail}")
+
+
+def parse_size(s):
+    w, _, h = s.lower().partition("x")
+    return int(w), int(h or w)
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark the LibreRecorder WebApp on synthetic cases.")
+    p.add_argument("--cases", type=int, default=2)
+    p.add_argument("--images", type=int, default=40, help="images per case")
+    p.add_argument("--size", type=parse_size, default=(1024, 768), help="WxH (default 1024x768)")
+    p.add_argument("--format", choices=sorted(FORMATS), default="jpg")
+    p.add_argument("--notes", type=int, default=10, help="notes per case")
+    p.add_argument("--results", type=int, default=100, help="recorded results per case")
+    p.add_argument("--repeat", type=int, default=20, help="rounds of the read-only requests")
+    p.add_argument("--model", default="mean_pixel_v1")
+    p.add_argument("--model-runs", type=int, default=3, help="/run_model calls per case")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--server", help="benchmark a running server instead of the in-process app")
+    p.add_argument("--json", help="write the report here")
+    p.add_argument("--compare", help="a previous --json report; its settings are reused")
+    p.add_argument("--threshold", type=float, default=20.0, help="percent slowdown flagged by --compare")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        # rerun with the baseline's workload
+        for k, v in baseline["config"].items():
+            if k not in ("server", "json", "compare", "threshold"):
+                setattr(args, k, tuple(v) if k == "size" else v)
+
+    workdir = tempfile.mkdtemp(prefix="librecorder-bench-")
+    try:
+        if args.server:
+            client = ServerClient(args.server)
+        else:
+            os.environ["LIBRECORDER_DATA_DIR"] = os.path.join(workdir, "data")
+            client = LocalClient()
+        report = run(args, client, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(report)
+    config = {k: v for k, v in vars(args).items() if k not in ("json", "compare", "threshold")}
+    out = {"config": config, "environment": environment(), "steps": report}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(out, f, indent=2)
+        print(f"wrote {args.json}")
+
+    if baseline:
+        print(f"compared with {args.compare} ({baseline['environment'].get('commit') or 'unknown commit'}):")
+        regressions = compare(report, baseline["steps"], args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:g}%")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
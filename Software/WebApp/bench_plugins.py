@@ -0,0 +1,242 @@
+# ~/librecorder/Software/WebApp/bench_plugins.py
+"""
+Micro-benchmarks for the processing plugins (../processing/*.py) on
+generated images, offline and on CPU.
+
+  python bench_plugins.py                                  all plugins, formats, sizes
+  python bench_plugins.py --plugins mean_pixel dark_light --sizes 50x50 2048x1536
+  python bench_plugins.py --json baseline.json             store a baseline
+  python bench_plugins.py --baseline baseline.json         flag regressions (exit 1)
+
+For every plugin, format (jpg/png/tif) and size it times:
+  decode    decoding the file to RGB (pipeline.decode_rgb)
+  compute   the plugin on the decoded array (run_array, or run_batch([arr]))
+  run       run(image_path): decode and compute as the plugin does it
+and the peak memory allocated by one more call (tracemalloc: Python and
+numpy allocations), made separately because tracing slows Python code
+down several times over. Plugins with run_batch are also timed on --cells
+50x50 crops one at a time and as one batch ("single" / "batch", ms per crop).
+
+The result of run() is stored with each case, so a --baseline comparison
+flags changed results as well as slowdowns.
+
+Plugins that cannot be loaded here (e.g. malaria_cnn without torch or its
+checkpoint) are skipped with a note.
+"""
+import argparse
+import importlib.util
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:      # Windows
+    resource = None
+
+from bench_app import FORMATS, make_image, image_bytes, latency_stats, compare, environment, parse_size
+from pipeline import decode_rgb
+
+PROC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "processing")
+DEFAULT_SIZES = ["50x50", "512x512", "2048x1536", "4000x3000"]
+
+
+def load_plugins(names=None):
+    """{name: module or the error it failed with} for processing/*.py."""
+    out = {}
+    for fname in sorted(os.listdir(PROC_DIR)):
+        name, ext = os.path.splitext(fname)
+        if ext != ".py" or name.startswith("_") or (names and name not in names):
+            continue
+        try:
+            spec = importlib.util.spec_from_file_location(name, os.path.join(PROC_DIR, fname))
+            mod = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(mod)
+            if hasattr(mod, "warm_up"):
+                mod.warm_up()
+        except Exception as e:
+            out[name] = e
+            continue
+        if hasattr(mod, "run"):
+            out[name] = mod
+    return out
+
+
+def compute(mod, arr):
+    if hasattr(mod, "run_array"):
+        return mod.run_array(arr)
+    if hasattr(mod, "run_batch"):
+        return mod.run_batch([arr])[0]
+    return None
+
+
+def timed(fn, repeat):
+    """
+    Latencies (seconds) of repeat calls after one warm-up call, untraced,
+    then the peak traced bytes of one more call.
+    """
+    fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return samples, peak
+
+
+def stats(samples, peak=None):
+    s = latency_stats(samples, sum(samples))
+    if peak is not None:
+        s["peak_mb"] = round(peak / (1024 * 1024), 2)
+    return s
+
+
+def bench_plugin(name, mod, fmt, size, path, arr, repeat):
+    steps = {}
+    key = f"{name}/{fmt}/{size[0]}x{size[1]}"
+    if hasattr(mod, "run_array") or hasattr(mod, "run_batch"):
+        steps[f"{key}/compute"] = stats(*timed(lambda: compute(mod, arr), repeat))
+    steps[f"{key}/run"] = stats(*timed(lambda: mod.run(path), repeat))
+    steps[f"{key}/run"]["output"] = json.loads(json.dumps(mod.run(path), default=str))
+    return steps
+
+
+def same_output(a, b, rel=1e-6):
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(same_output(a[k], b[k], rel) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(same_output(x, y, rel) for x, y in zip(a, b))
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return math.isclose(a, b, rel_tol=rel, abs_tol=1e-9)
+    return a == b
+
+
+def changed_outputs(current, baseline):
+    """Steps whose run() result differs from the baseline's."""
+    return [
+        step for step, s in current.items()
+        if "output" in s and "output" in baseline.get(step, {}) and not same_output(s["output"], baseline[step]["output"])
+    ]
+
+
+def bench_batch(name, mod, cells, rng, repeat):
+    """ms per crop for run_batch on one crop at a time vs all crops at once."""
+    crops = [np.asarray(make_image(50, 50, rng)) for _ in range(cells)]
+
+    def single():
+        for c in crops:
+            mod.run_batch([c])
+
+    samples, peak_single = timed(single, repeat)
+    per_crop_single = [s / cells for s in samples]
+    samples, peak_batch = timed(lambda: mod.run_batch(crops), repeat)
+    per_crop_batch = [s / cells for s in samples]
+    return {
+        f"{name}/cells{cells}/single": stats(per_crop_single, peak_single),
+        f"{name}/cells{cells}/batch": stats(per_crop_batch, peak_batch),
+    }
+
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    plugins = load_plugins(args.plugins)
+    for name, mod in plugins.items():
+        if isinstance(mod, Exception):
+            print(f"skipping {name}: {mod}")
+    plugins = {n: m for n, m in plugins.items() if not isinstance(m, Exception)}
+
+    report = {}
+    with tempfile.TemporaryDirectory(prefix="librecorder-bench-") as tmp:
+        for size in args.sizes:
+            img = make_image(size[0], size[1], rng)
+            for fmt in args.formats:
+                path = os.path.join(tmp, f"img.{fmt}")
+                with open(path, "wb") as f:
+                    f.write(image_bytes(img, fmt))
+                key = f"decode/{fmt}/{size[0]}x{size[1]}"
+                report[key] = stats(*timed(lambda: decode_rgb(path), args.repeat))
+                report[key]["file_kb"] = round(os.path.getsize(path) / 1024, 1)
+                arr = decode_rgb(path)
+                for name, mod in plugins.items():
+                    print(f"{name} {fmt} {size[0]}x{size[1]}")
+                    report.update(bench_plugin(name, mod, fmt, size, path, arr, args.repeat))
+
+        for name, mod in plugins.items():
+            if hasattr(mod, "run_batch") and args.cells:
+                print(f"{name} batch of {args.cells} cells")
+                report.update(bench_batch(name, mod, args.cells, rng, args.repeat))
+    return report
+
+
+def print_report(report):
+    print(f"{'step':<44}{'n':>5}{'p50 ms':>11}{'p95 ms':>11}{'peak MB':>10}")
+    for step, s in report.items():
+        peak = s.get("peak_mb", "")
+        print(f"{step:<44}{s['count']:>5}{s['p50_ms']:>11}{s['p95_ms']:>11}{peak:>10}")
+    if resource is None:
+        return
+    # ru_maxrss is KB on Linux, bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"process RSS high-water mark: {maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024):.0f} MB")
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark the processing plugins on generated images.")
+    p.add_argument("--plugins", nargs="+", help="module names (default: all in processing/)")
+    p.add_argument("--formats", nargs="+", choices=sorted(FORMATS), default=sorted(FORMATS))
+    p.add_argument("--sizes", nargs="+", type=parse_size, default=[parse_size(s) for s in DEFAULT_SIZES])
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--cells", type=int, default=256, help="crops for the batch vs single test (0: skip)")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--json", help="write the report here (e.g. a baseline)")
+    p.add_argument("--baseline", help="a previous --json report; its settings are reused")
+    p.add_argument("--threshold", type=float, default=25.0, help="percent slowdown flagged as a regression")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        for k, v in baseline["config"].items():
+            if k not in ("json", "baseline", "threshold"):
+                setattr(args, k, [tuple(s) for s in v] if k == "sizes" else v)
+
+    report = run(args)
+    print_report(report)
+    config = {k: v for k, v in vars(args).items() if k not in ("json", "baseline", "threshold")}
+    out = {"config": config, "environment": environment(), "steps": report}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(out, f, indent=2)
+        print(f"wrote {args.json}")
+
+    if baseline:
+        print(f"compared with {args.baseline} ({baseline['environment'].get('commit') or 'unknown commit'}):")
+        regressions = compare(report, baseline["steps"], args.threshold)
+        changed = changed_outputs(report, baseline["steps"])
+        for step in changed:
+            print(f"  {step}: result changed: {baseline['steps'][step]['output']} -> {report[step]['output']}")
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:g}%")
+        if regressions or changed:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,295 @@
+# ~/librecorder/Software/WebApp/blobstore.py
+"""
+Content-addressable, deduplicated storage for case files.
+
+Each distinct upload is stored once in the object store (storage.py) under
+the key <sha[:2]>/<sha[2:4]>/<sha>, named by the sha256 of the uploaded
+bytes. CaseFile rows map each case file to its blob, and Blob.refcount
+counts them; a blob is deleted when its last case is purged.
+
+uploads/<case_id>/<filename> is the working copy that models and pages read
+by path. With local storage it is a hard link to the blob. With S3 it is a
+plain file, and ensure_case_local() fetches the missing ones, e.g. on an
+app node that did not receive the upload.
+
+TIFF and PNG files are losslessly recompressed (deflate / optimized PNG)
+when that makes them smaller. The pixels are checked to be identical after
+decoding, and the TIFF tags are kept. Set LIBRECORDER_RECOMPRESS=0 to turn
+this off.
+
+If the filesystem cannot hard-link (e.g. the blob dir is on another volume),
+the local case file is a copy: still mapped and counted, but not deduplicated
+on disk.
+
+Existing case files can be moved into the store with:
+  python blobstore.py migrate
+"""
+import hashlib
+import os
+import shutil
+import sys
+import uuid
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Blob, CaseFile
+
+RECOMPRESS = os.environ.get("LIBRECORDER_RECOMPRESS", "1") not in ("0", "false", "no")
+HASH_BLOCK = 1024 * 1024
+
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def blob_key(sha256):
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def _tmp_name(path):
+    return f"{path}.{uuid.uuid4().hex}.tmp"
+
+
+def _link_or_copy(src, dst):
+    """Hard-link src to dst (dst must not exist), copying when links are not supported."""
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        raise
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _recompress(src, out):
+    """
+    Write a losslessly recompressed copy of a TIFF/PNG to out.
+    Returns the encoding name, or None when it would not be smaller or
+    the pixels would not be identical.
+    """
+    import numpy as np
+    from PIL import Image, PngImagePlugin
+    ext = os.path.splitext(src)[1].lower()
+    try:
+        with Image.open(src) as img:
+            if getattr(img, "n_frames", 1) > 1:
+                return None
+            before = np.asarray(img)
+            mode = img.mode
+            if ext in (".tif", ".tiff"):
+                encoding = "deflate"
+                img.save(out, format="TIFF", compression="tiff_adobe_deflate", tiffinfo=img.tag_v2)
+            elif ext == ".png":
+                encoding = "png-opt"
+                info = PngImagePlugin.PngInfo()
+                for k, v in (getattr(img, "text", None) or {}).items():
+                    info.add_text(k, v)
+                extra = {k: img.info[k] for k in ("dpi", "icc_profile", "transparency") if k in img.info}
+                img.save(out, format="PNG", optimize=True, pnginfo=info, **extra)
+            else:
+                return None
+
+        if os.path.getsize(out) >= os.path.getsize(src):
+            return None
+        with Image.open(out) as check:
+            if check.mode != mode or not np.array_equal(np.asarray(check), before):
+                return None
+        return encoding
+    except Exception:
+        return None
+
+
+def store_file(storage, src, dest, sha256=None, move=False, recompress=RECOMPRESS):
+    """
+    Put src into the store and make dest (the local case file path) its
+    working copy. src may equal dest. With move=True a separate src is
+    removed; otherwise it is copied, never linked, so later edits to it
+    cannot change the blob.
+    Returns {"sha256", "size", "stored_size", "encoding", "new"}; the
+    database is updated separately by add_case_file().
+    """
+    sha256 = sha256 or sha256_file(src)
+    size = os.path.getsize(src)
+    key = blob_key(sha256)
+    owned = move or os.path.abspath(src) == os.path.abspath(dest)
+
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp = _tmp_name(dest)
+    new, encoding = False, ""
+    try:
+        if storage.exists(key):
+            local = storage.local_path(key)
+            if local:
+                _link_or_copy(local, tmp)
+            elif owned:
+                _link_or_copy(src, tmp)
+            else:
+                shutil.copy2(src, tmp)
+        else:
+            if recompress and src.lower().endswith((".tif", ".tiff", ".png")):
+                encoding = _recompress(src, tmp) or ""
+            if not encoding:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                if owned:
+                    _link_or_copy(src, tmp)
+                else:
+                    shutil.copy2(src, tmp)
+            # False if the same bytes were stored concurrently
+            new = storage.put_file(key, tmp)
+
+        # atomically replace dest (which may be src) with the working copy
+        os.replace(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    if move and os.path.abspath(src) != os.path.abspath(dest):
+        os.remove(src)
+
+    return {
+        "sha256": sha256,
+        "size": size,
+        "stored_size": storage.size(key),
+        "encoding": encoding,
+        "new": new,
+    }
+
+
+def ensure_case_local(storage, upload_dir, case_id):
+    """Fetch the case files that have no local working copy. Returns the count fetched."""
+    fetched = 0
+    rows = db.session.query(CaseFile.filename, CaseFile.sha256).filter_by(case_id=case_id).all()
+    for fname, sha256 in rows:
+        path = os.path.join(upload_dir, case_id, fname)
+        if os.path.exists(path):
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            storage.fetch(blob_key(sha256), path)
+            fetched += 1
+        except FileExistsError:
+            pass  # fetched concurrently
+    return fetched
+
+
+def case_file_blob(case_id, filename):
+    """Storage key of a case file, or None if it is not in the store."""
+    sha256 = db.session.query(CaseFile.sha256).filter_by(case_id=case_id, filename=filename).scalar()
+    return blob_key(sha256) if sha256 else None
+
+
+def _insert_blob_if_missing(values):
+    """INSERT of a Blob row that does nothing if another upload (or node) stored the same bytes first."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "sqlite":
+        stmt = db.insert(Blob).prefix_with("OR IGNORE")
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(Blob).on_conflict_do_nothing(index_elements=["sha256"])
+    elif dialect in ("mysql", "mariadb"):
+        stmt = db.insert(Blob).prefix_with("IGNORE")
+    else:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(Blob), values)
+        except IntegrityError:
+            pass
+        return
+    db.session.execute(stmt, values)
+
+
+def add_case_file(case_id, filename, info):
+    """Record a case file and count a reference to its blob. Does not commit."""
+    _insert_blob_if_missing(
+        {"sha256": info["sha256"], "size": info["size"], "stored_size": info["stored_size"],
+         "encoding": info["encoding"], "refcount": 0},
+    )
+    db.session.execute(
+        db.update(Blob).where(Blob.sha256 == info["sha256"]).values(refcount=Blob.refcount + 1)
+    )
+    db.session.add(CaseFile(case_id=case_id, filename=filename, sha256=info["sha256"]))
+
+
+def release_case(case_id):
+    """
+    Drop a case's file mappings and the Blob rows no longer referenced.
+    Does not commit. Returns [(key, stored_size)] of the orphaned objects,
+    for delete_blobs() once the transaction has committed: deleting them
+    earlier would lose the files of a case whose purge is rolled back.
+    """
+    refs = {}
+    for (sha,) in db.session.query(CaseFile.sha256).filter_by(case_id=case_id):
+        refs[sha] = refs.get(sha, 0) + 1
+    if not refs:
+        return []
+
+    CaseFile.query.filter_by(case_id=case_id).delete(synchronize_session=False)
+    for sha, n in refs.items():
+        db.session.execute(
+            db.update(Blob).where(Blob.sha256 == sha).values(refcount=Blob.refcount - n)
+        )
+    orphans = db.session.query(Blob.sha256, Blob.stored_size).filter(
+        Blob.sha256.in_(list(refs)), Blob.refcount <= 0
+    ).all()
+    Blob.query.filter(Blob.sha256.in_([sha for sha, _ in orphans])).delete(synchronize_session=False)
+    db.session.flush()
+    return [(blob_key(sha), stored_size) for sha, stored_size in orphans]
+
+
+def delete_blobs(storage, orphans):
+    """Delete objects returned by release_case(); returns the bytes freed."""
+    freed = 0
+    for key, stored_size in orphans:
+        try:
+            storage.delete(key)
+            freed += stored_size
+        except Exception:
+            pass  # an unreferenced object left behind is harmless
+    return freed
+
+
+def storage_stats():
+    blobs, size, stored = db.session.query(
+        db.func.count(Blob.sha256), db.func.sum(Blob.size), db.func.sum(Blob.stored_size)
+    ).one()
+    files, logical = db.session.query(
+        db.func.count(CaseFile.id), db.func.sum(Blob.size)
+    ).join(Blob, Blob.sha256 == CaseFile.sha256).one()
+    return {
+        "case_files": files,
+        "blobs": blobs,
+        "logical_bytes": logical or 0,      # what the case files add up to
+        "unique_bytes": size or 0,          # after deduplication
+        "stored_bytes": stored or 0,        # after deduplication and recompression
+    }
+
+
+def migrate(storage, upload_dir):
+    """Move case files not yet in the store into it. Returns the number stored."""
+    known = {(c, f) for c, f in db.session.query(CaseFile.case_id, CaseFile.filename)}
+    stored = 0
+    for case_id in sorted(os.listdir(upload_dir)):
+        case_dir = os.path.join(upload_dir, case_id)
+        if not os.path.isdir(case_dir):
+            continue
+        for fname in sorted(os.listdir(case_dir)):
+            path = os.path.join(case_dir, fname)
+            if (case_id, fname) in known or not os.path.isfile(path) or fname.endswith(".tmp"):
+                continue
+            add_case_file(case_id, fname, store_file(storage, path, path))
+            stored += 1
+        db.session.commit()
+    return stored
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["migrate"]:
+        sys.exit("usage: python blobstore.py migrate")
+    from app import app, storage, UPLOAD_DIR
+
+    with app.app_context():
+        print(f"stored {migrate(storage, UPLOAD_DIR)} file(s)")
+        print(storage_stats())
@@ -0,0 +1,117 @@
+# ~/librecorder/Software/WebApp/case_meta.py
+"""
+Case metadata stored in the database: domain, level, state, description,
+analysis columns, tags and notes.
+
+Metadata used to live in uploads/<case_id>/meta.json (and per browser in
+localStorage). Those files are imported once by import_legacy_meta(), run by
+app.init_db() when the server starts (or `flask --app app init-db`).
+"""
+import json
+import os
+
+from models import db, Case, CaseTag
+
+DEFAULT_META = {
+    "domain": "health",
+    "level": "Not Analyzed",          # Analyzed | Not Analyzed | Not for Analysis
+    "state": "Intake",
+    "columns": {},                    # analysis-type -> status (e.g., {"Microscopy QC":"Queued"})
+    "tags": [],
+    "notes": "",
+}
+
+
+def parse_tags(tags):
+    """Accept a list or a comma-separated string; return unique, trimmed tags."""
+    if tags is None:
+        return []
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    out = []
+    for t in tags:
+        t = str(t).strip()[:64]
+        if t and t not in out:
+            out.append(t)
+    return out
+
+
+def meta_json(c, tags=None):
+    return {
+        "domain": c.domain or DEFAULT_META["domain"],
+        "level": c.level or DEFAULT_META["level"],
+        "state": c.state or DEFAULT_META["state"],
+        "description": c.description or "",
+        "columns": json.loads(c.columns) if c.columns else {},
+        "tags": list(tags or []),
+        "notes": c.notes or "",
+    }
+
+
+def tags_by_case(case_ids=None):
+    """{case_id: [tag, ...]}; case_ids may be a list or a select of case ids."""
+    q = db.session.query(CaseTag.case_id, CaseTag.tag)
+    if case_ids is not None:
+        q = q.filter(CaseTag.case_id.in_(case_ids))
+    out = {}
+    for case_id, tag in q.order_by(CaseTag.id):
+        out.setdefault(case_id, []).append(tag)
+    return out
+
+
+def set_tags(case_id, tags):
+    """Replace a case's tags. Does not commit."""
+    CaseTag.query.filter_by(case_id=case_id).delete(synchronize_session=False)
+    if tags:
+        db.session.execute(db.insert(CaseTag), [{"case_id": case_id, "tag": t} for t in tags])
+
+
+def apply_meta(c, data):
+    """Update a Case from a (partial) meta dict. Does not commit."""
+    for key in ("domain", "level", "state"):
+        if data.get(key):
+            setattr(c, key, str(data[key])[:32])
+    if data.get("description") is not None:
+        c.description = str(data["description"])[:255]
+    if data.get("columns") is not None:
+        c.columns = json.dumps(data["columns"])
+    if data.get("notes") is not None:
+        c.notes = str(data["notes"])
+    if "tags" in data:
+        set_tags(c.case_id, parse_tags(data["tags"]))
+
+
+def filter_cases(q, domain=None, level=None, tag=None):
+    if domain:
+        q = q.filter(Case.domain == domain)
+    if level:
+        q = q.filter(Case.level == level)
+    if tag:
+        q = q.filter(Case.case_id.in_(db.select(CaseTag.case_id).where(CaseTag.tag == tag)))
+    return q
+
+
+def import_legacy_meta(upload_dir):
+    """
+    Move uploads/<case_id>/meta.json files into the database, renaming each
+    to meta.json.imported so it is only imported once. Returns the count.
+    """
+    if not os.path.isdir(upload_dir):
+        return 0
+    imported = 0
+    for case_id in os.listdir(upload_dir):
+        path = os.path.join(upload_dir, case_id, "meta.json")
+        if not os.path.isfile(path):
+            continue
+        c = Case.query.filter_by(case_id=case_id).first()
+        if not c:
+            continue
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                apply_meta(c, json.load(f))
+            db.session.commit()
+            os.replace(path, path + ".imported")
+            imported += 1
+        except (OSError, ValueError):
+            db.session.rollback()
+    return imported
@@ -0,0 +1,200 @@
+# ~/librecorder/Software/WebApp/chunked_upload.py
+"""
+Chunked, resumable uploads for large files.
+
+  POST   /uploads                  {"filename", "size", "case_id"?}  -> {"upload_id", "offset", "chunk_size"}
+  GET    /uploads/<id>                                               -> {"offset", "size", ...}
+  PUT    /uploads/<id>?offset=N    raw bytes, appended at N
+  POST   /uploads/<id>/finalize    {"sha256"}                        -> same as /upload
+  DELETE /uploads/<id>
+
+Bytes are streamed straight to <staging>/<id>/data, so the offset to
+resume from is simply the size of that file: after a dropped connection
+the client asks for the offset and sends the rest. Session state lives in
+<staging>/<id>/info.json next to the data, so it survives restarts.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+from locks import FileLock
+
+CHUNK_SIZE = 8 * 1024 * 1024          # suggested to clients
+MAX_CHUNK_BYTES = 64 * 1024 * 1024    # largest single PUT accepted
+MAX_UPLOAD_BYTES = 4 * 1024 * 1024 * 1024
+STALE_SECONDS = 7 * 24 * 3600         # unfinished uploads are dropped after this
+COPY_BLOCK = 1024 * 1024
+
+
+class UploadError(Exception):
+    """Raised with an HTTP status for the route to return."""
+
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+def _session_dir(staging_dir, upload_id):
+    # ids are uuid4 hex; anything else could escape the staging dir
+    if not upload_id or len(upload_id) != 32 or not all(c in "0123456789abcdef" for c in upload_id):
+        raise UploadError("upload not found", 404)
+    return os.path.join(staging_dir, upload_id)
+
+
+def _read_info(staging_dir, upload_id):
+    d = _session_dir(staging_dir, upload_id)
+    try:
+        with open(os.path.join(d, "info.json"), "r", encoding="utf-8") as f:
+            return d, json.load(f)
+    except (OSError, ValueError):
+        raise UploadError("upload not found", 404)
+
+
+def _session_lock(d):
+    # a file lock, so one session takes one PUT at a time across worker processes
+    return FileLock(os.path.join(d, "lock"))
+
+
+def _offset(d):
+    try:
+        return os.path.getsize(os.path.join(d, "data"))
+    except OSError:
+        return 0
+
+
+def session_json(info, offset):
+    return {
+        "upload_id": info["upload_id"],
+        "filename": info["filename"],
+        "case_id": info["case_id"],
+        "size": info["size"],
+        "offset": offset,
+        "chunk_size": CHUNK_SIZE,
+        "complete": offset == info["size"],
+    }
+
+
+def drop_stale(staging_dir, max_age=STALE_SECONDS):
+    """Delete unfinished uploads not written to for max_age seconds."""
+    if not os.path.isdir(staging_dir):
+        return 0
+    cutoff = time.time() - max_age
+    dropped = 0
+    for name in os.listdir(staging_dir):
+        d = os.path.join(staging_dir, name)
+        data = os.path.join(d, "data")
+        try:
+            if os.path.getmtime(data if os.path.exists(data) else d) < cutoff:
+                shutil.rmtree(d)
+                dropped += 1
+        except OSError:
+            pass
+    return dropped
+
+
+def start_upload(staging_dir, filename, size, case_id):
+    if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+        raise UploadError("size must be a non-negative integer")
+    if size > MAX_UPLOAD_BYTES:
+        raise UploadError(f"file is larger than {MAX_UPLOAD_BYTES} bytes", 413)
+
+    drop_stale(staging_dir)
+    upload_id = uuid.uuid4().hex
+    d = os.path.join(staging_dir, upload_id)
+    os.makedirs(d)
+    info = {
+        "upload_id": upload_id,
+        "filename": filename,
+        "case_id": case_id,
+        "size": size,
+        "created": time.time(),
+    }
+    with open(os.path.join(d, "info.json"), "w", encoding="utf-8") as f:
+        json.dump(info, f)
+    open(os.path.join(d, "data"), "wb").close()
+    return session_json(info, 0)
+
+
+def upload_status(staging_dir, upload_id):
+    d, info = _read_info(staging_dir, upload_id)
+    return session_json(info, _offset(d))
+
+
+def write_chunk(staging_dir, upload_id, offset, stream, length):
+    """
+    Append length bytes from stream at offset. offset must equal the bytes
+    already received (409 with the current offset otherwise). Bytes that
+    arrive before a dropped connection are kept.
+    """
+    d, info = _read_info(staging_dir, upload_id)
+    if length is None:
+        raise UploadError("Content-Length is required", 411)
+    if length > MAX_CHUNK_BYTES:
+        raise UploadError(f"chunk is larger than {MAX_CHUNK_BYTES} bytes", 413)
+
+    path = os.path.join(d, "data")
+    with _session_lock(d):
+        current = _offset(d)
+        if offset != current:
+            raise UploadError("offset does not match bytes received", 409, offset=current)
+        if offset + length > info["size"]:
+            raise UploadError("chunk goes past the declared size", 400, offset=current)
+
+        with open(path, "ab") as f:
+            remaining = length
+            try:
+                while remaining > 0:
+                    block = stream.read(min(COPY_BLOCK, remaining))
+                    if not block:
+                        break
+                    f.write(block)
+                    remaining -= len(block)
+            finally:
+                f.flush()
+                os.fsync(f.fileno())
+
+    offset = _offset(d)
+    if remaining > 0:
+        raise UploadError("connection closed before the chunk was complete", 400, offset=offset)
+    return session_json(info, offset)
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(COPY_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def finish_upload(staging_dir, upload_id, sha256, dest_path):
+    """
+    Check size and checksum, then move the data to dest_path and drop the
+    session. Returns (info, sha256). On a checksum mismatch the session is
+    kept so the client can inspect it or abort.
+    """
+    if not sha256:
+        raise UploadError("sha256 is required")
+    d, info = _read_info(staging_dir, upload_id)
+    path = os.path.join(d, "data")
+    offset = _offset(d)
+    if offset != info["size"]:
+        raise UploadError("upload is incomplete", 409, offset=offset)
+
+    digest = _sha256(path)
+    if digest != str(sha256).lower():
+        raise UploadError("checksum mismatch", 422, sha256=digest)
+
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    os.replace(path, dest_path)
+    shutil.rmtree(d, ignore_errors=True)
+    return info, digest
+
+
+def abort_upload(staging_dir, upload_id):
+    d, _ = _read_info(staging_dir, upload_id)
+    shutil.rmtree(d, ignore_errors=True)
@@ -0,0 +1,401 @@
+# ~/librecorder/Software/WebApp/dataset_export.py
+"""
+Export stored model results as a columnar dataset for retraining.
+
+  python dataset_export.py export exports/malaria-2026-10 --model malaria_cnn_v1 --tensors
+  python dataset_export.py npy exports/malaria-2026-10 --positive Infected --out ../malaria_classifier
+
+export streams ImageResult rows (joined with the case and the stored file)
+into Hive-partitioned files, one partition per model and day:
+  <out>/model_id=malaria_cnn_v1/date=2026-10-19/part-00000.parquet
+One row per image, or per cell for segmented runs (cell, box). Columns:
+case_id, file, sha256, cell, box, classification, confidence, scores
+(every numeric field of the result), latency_ms, timestamp, level,
+domain, options, result (JSON). With --tensors each row also gets the
+model input as it saw it: the image resized to the model's INPUT_SIZE, or
+the cell crop, as raw uint8 RGB bytes (shape in the schema metadata).
+
+Rows are written in row groups of BATCH_ROWS and files are rolled every
+--rows-per-file rows, so memory does not grow with the export. --format
+arrow writes Arrow IPC files instead of Parquet. _manifest.json records
+the options and row counts.
+
+npy turns an export with tensors into Cells3.npy (float32, N x H x W x 3,
+scaled to [0, 1]) and Labels3.npy (1 for --positive, else 0), the files
+malaria_classifier/train_malaria_model.py loads from its directory.
+
+Needs pyarrow (in environment.yml).
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+from models import db, Case, CaseFile, ImageResult
+from plugins import plugin_paths, describe_plugin
+
+BATCH_ROWS = 1024               # rows per row group
+ROWS_PER_FILE = 200_000
+DEFAULT_INPUT_SIZE = (50, 50)
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+# file names malaria_classifier/train_malaria_model.py loads
+CELLS_FILE = "Cells3.npy"
+LABELS_FILE = "Labels3.npy"
+RESULT_COLUMNS = (
+    ImageResult.case_id, ImageResult.model_id, ImageResult.file, ImageResult.options, ImageResult.result,
+    ImageResult.classification, ImageResult.confidence, ImageResult.latency_ms, ImageResult.timestamp,
+)
+
+
+class ExportError(Exception):
+    pass
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        return pa
+    except ImportError:
+        raise ExportError("dataset export needs pyarrow (pip install pyarrow)")
+
+
+def input_size(model_id):
+    """The INPUT_SIZE a plugin declares, or DEFAULT_INPUT_SIZE."""
+    for path in plugin_paths():
+        desc = describe_plugin(path)
+        if desc is not None and str(getattr(desc, "MODEL_ID", "")) == model_id:
+            size = getattr(desc, "INPUT_SIZE", None)
+            if size:
+                return tuple(size)
+    return DEFAULT_INPUT_SIZE
+
+
+def schema(tensor_size=None):
+    pa = _pyarrow()
+    fields = [
+        ("case_id", pa.string()),
+        ("file", pa.string()),
+        ("sha256", pa.string()),
+        ("cell", pa.int32()),
+        ("box", pa.list_(pa.int32(), 4)),
+        ("classification", pa.string()),
+        ("confidence", pa.float64()),
+        ("scores", pa.map_(pa.string(), pa.float64())),
+        ("latency_ms", pa.float64()),
+        ("timestamp", pa.timestamp("us")),
+        ("level", pa.string()),
+        ("domain", pa.string()),
+        ("options", pa.string()),
+        ("result", pa.string()),
+    ]
+    metadata = None
+    if tensor_size:
+        w, h = tensor_size
+        fields.append(("tensor", pa.binary(w * h * 3)))
+        metadata = {"tensor_shape": f"{h},{w},3", "tensor_dtype": "uint8"}
+    return pa.schema(fields, metadata=metadata)
+
+
+# ----------------------------
+# Writing
+# ----------------------------
+class DatasetWriter:
+    """Buffers rows per partition and writes them out as row groups."""
+
+    def __init__(self, out_dir, schema, fmt="parquet", rows_per_file=ROWS_PER_FILE, batch_rows=BATCH_ROWS):
+        self.out_dir = out_dir
+        self.schema = schema
+        self.fmt = fmt
+        self.rows_per_file = rows_per_file
+        self.batch_rows = batch_rows
+        self.counts = {}            # partition dir -> rows
+        self._partition = None
+        self._rows = []
+        self._writer = None
+        self._file_rows = 0
+        self._file_index = 0
+
+    def write(self, partition, row):
+        """partition: ((column, value), ...), e.g. (("model_id", "m"), ("date", "2026-10-19"))."""
+        if partition != self._partition:
+            self._flush()
+            self._close_file()
+            self._partition = partition
+            self._file_index = 0
+        self._rows.append(row)
+        if len(self._rows) >= min(self.batch_rows, self.rows_per_file - self._file_rows):
+            self._flush()
+
+    def _path(self):
+        rel = os.path.join(*(f"{k}={v}" for k, v in self._partition))
+        return rel, os.path.join(self.out_dir, rel, f"part-{self._file_index:05d}{FORMATS[self.fmt]}")
+
+    def _flush(self):
+        if not self._rows:
+            return
+        pa = _pyarrow()
+        table = pa.Table.from_pylist(self._rows, schema=self.schema)
+        rel, path = self._path()
+        if self._writer is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if self.fmt == "arrow":
+                self._writer = pa.ipc.new_file(path, self.schema)
+            else:
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(path, self.schema)
+        self._writer.write_table(table)
+        self.counts[rel] = self.counts.get(rel, 0) + len(self._rows)
+        self._file_rows += len(self._rows)
+        self._rows = []
+        if self._file_rows >= self.rows_per_file:
+            self._close_file()
+            self._file_index += 1
+
+    def _close_file(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._writer = None
+        self._file_rows = 0
+
+    def close(self):
+        self._flush()
+        self._close_file()
+
+
+def _number(v):
+    return float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else None
+
+
+def _scores(result):
+    return [
+        (k, float(v)) for k, v in result.items()
+        if isinstance(v, (int, float)) and not isinstance(v, bool)
+    ] if isinstance(result, dict) else []
+
+
+def _image_tensor(path, size):
+    from PIL import Image
+    import numpy as np
+    # as malaria_cnn._preprocess: RGB, PIL resize
+    with Image.open(path) as img:
+        return np.asarray(img.convert("RGB").resize(tuple(size))).tobytes()
+
+
+def _cell_tensors(path, boxes, size):
+    # as segmentation.run_segmented: OpenCV decode, crop_cells
+    import cv2
+    import numpy as np
+    from segmentation import crop_cells
+    bgr = cv2.imread(path, cv2.IMREAD_COLOR)
+    if bgr is None:
+        raise ValueError(f"unable to read image: {path}")
+    rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+    return [c.tobytes() for c in crop_cells(rgb, np.asarray(boxes, dtype=np.int64).reshape(-1, 4), size)]
+
+
+def result_rows(model_id=None, case_id=None, start=None, end=None,
+                classification=None, min_confidence=None, chunk=500):
+    """Successful results with the file sha256 and case level/domain, by model, day and id."""
+    q = (db.session.query(*RESULT_COLUMNS, CaseFile.sha256, Case.level, Case.domain)
+         .join(Case, Case.case_id == ImageResult.case_id)
+         .outerjoin(CaseFile, db.and_(CaseFile.case_id == ImageResult.case_id,
+                                      CaseFile.filename == ImageResult.file))
+         .filter(ImageResult.error.is_(None), ImageResult.result.isnot(None)))
+    if model_id:
+        q = q.filter(ImageResult.model_id == model_id)
+    if case_id:
+        q = q.filter(ImageResult.case_id == case_id)
+    if start:
+        q = q.filter(ImageResult.timestamp >= start)
+    if end:
+        q = q.filter(ImageResult.timestamp < end)
+    if classification:
+        q = q.filter(ImageResult.classification == classification)
+    if min_confidence is not None:
+        q = q.filter(ImageResult.confidence >= min_confidence)
+    q = q.order_by(ImageResult.model_id, db.func.date(ImageResult.timestamp), ImageResult.id)
+    return q.execution_options(yield_per=chunk)
+
+
+def export_dataset(out_dir, upload_dir, storage=None, tensors=False, size=None, fmt="parquet",
+                   rows_per_file=ROWS_PER_FILE, **filters):
+    """
+    Write the dataset to out_dir (which must be new or empty). filters go
+    to result_rows(). With tensors, size overrides each model's
+    INPUT_SIZE. Returns the manifest.
+    """
+    if fmt not in FORMATS:
+        raise ExportError(f"format must be one of {', '.join(FORMATS)}")
+    if os.path.isdir(out_dir) and os.listdir(out_dir):
+        raise ExportError(f"{out_dir} is not empty")
+    os.makedirs(out_dir, exist_ok=True)
+
+    writers = {}                # tensor size -> DatasetWriter (one schema per size)
+    sizes = {}                  # model_id -> tensor size
+    local = set()               # cases whose files were fetched from the store
+    unreadable = 0
+    for r in result_rows(**filters):
+        tensor_size = None
+        if tensors:
+            tensor_size = sizes.setdefault(r.model_id, tuple(size) if size else input_size(r.model_id))
+        writer = writers.get(tensor_size)
+        if writer is None:
+            writer = writers[tensor_size] = DatasetWriter(out_dir, schema(tensor_size), fmt, rows_per_file)
+
+        result = json.loads(r.result)
+        base = {
+            "case_id": r.case_id, "file": r.file, "sha256": r.sha256, "latency_ms": r.latency_ms,
+            "timestamp": r.timestamp, "level": r.level, "domain": r.domain, "options": r.options or "",
+        }
+        cells = result.get("per_cell") if isinstance(result, dict) else None
+        if cells is not None:
+            rows = [{
+                **base, "cell": i, "box": cell.get("box"),
+                "classification": cell.get("classification"), "confidence": _number(cell.get("confidence")),
+                "scores": _scores(cell), "result": json.dumps(cell),
+            } for i, cell in enumerate(cells)]
+        else:
+            rows = [{
+                **base, "cell": None, "box": None,
+                "classification": r.classification, "confidence": r.confidence,
+                "scores": _scores(result), "result": r.result,
+            }]
+
+        if tensor_size:
+            path = os.path.join(upload_dir, r.case_id, r.file)
+            if storage is not None and r.case_id not in local and not os.path.exists(path):
+                from blobstore import ensure_case_local
+                ensure_case_local(storage, upload_dir, r.case_id)
+                local.add(r.case_id)
+            try:
+                if cells is not None:
+                    data = _cell_tensors(path, [c.get("box") for c in cells], tensor_size)
+                else:
+                    data = [_image_tensor(path, tensor_size)]
+            except Exception:
+                data = [None] * len(rows)
+                unreadable += 1
+            for row, t in zip(rows, data):
+                row["tensor"] = t
+
+        day = r.timestamp.date().isoformat() if r.timestamp else "unknown"
+        partition = (("model_id", r.model_id), ("date", day))
+        for row in rows:
+            writer.write(partition, row)
+
+    counts = {}
+    for writer in writers.values():
+        writer.close()
+        counts.update(writer.counts)
+    manifest = {
+        "created": datetime.utcnow().isoformat(),
+        "format": fmt,
+        "partitioning": ["model_id", "date"],
+        "filters": {k: v for k, v in filters.items() if v is not None},
+        "tensor_sizes": {mid: list(s) for mid, s in sizes.items()},
+        "unreadable_images": unreadable,
+        "rows": sum(counts.values()),
+        "partitions": counts,
+    }
+    with open(os.path.join(out_dir, "_manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, default=str)
+    return manifest
+
+
+# ----------------------------
+# Reading back for training
+# ----------------------------
+def training_arrays(dataset_dir, positive_class, model_id=None):
+    """
+    (cells, labels) from an export with tensors: float32 N x H x W x 3 in
+    [0, 1] and int64 labels (1 = positive_class), as Cells3.npy / Labels3.npy.
+    """
+    _pyarrow()
+    import numpy as np
+    import pyarrow.dataset as ds
+
+    with open(os.path.join(dataset_dir, "_manifest.json"), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    fmt = "ipc" if manifest["format"] == "arrow" else "parquet"
+    dataset = ds.dataset(dataset_dir, format=fmt, partitioning="hive")
+    if "tensor" not in dataset.schema.names:
+        raise ExportError("the export has no tensors (use export --tensors)")
+    expr = ds.field("tensor").is_valid()
+    if model_id:
+        expr = expr & (ds.field("model_id") == model_id)
+    table = dataset.to_table(columns=["tensor", "classification"], filter=expr)
+    if not table.num_rows:
+        return np.empty((0, 0, 0, 3), np.float32), np.empty(0, np.int64)
+
+    shapes = {tuple(s) for mid, s in manifest["tensor_sizes"].items() if not model_id or mid == model_id}
+    if len(shapes) != 1:
+        raise ExportError("tensors of several sizes; choose a model")
+    w, h = shapes.pop()
+    cells = np.frombuffer(b"".join(table.column("tensor").to_pylist()), dtype=np.uint8)
+    cells = cells.reshape(-1, h, w, 3).astype(np.float32) / 255.0
+    labels = np.asarray([c == positive_class for c in table.column("classification").to_pylist()], dtype=np.int64)
+    return cells, labels
+
+
+# ----------------------------
+# Command line
+# ----------------------------
+def _size(s):
+    w, _, h = s.lower().partition("x")
+    return int(w), int(h or w)
+
+
+def _date(s):
+    return datetime.fromisoformat(s)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Export stored results as a Parquet/Arrow dataset for retraining.")
+    sub = p.add_subparsers(dest="command", required=True)
+    e = sub.add_parser("export", help="write a partitioned dataset")
+    e.add_argument("out_dir")
+    e.add_argument("--model", help="model id (default: all)")
+    e.add_argument("--case", help="one case only")
+    e.add_argument("--from", dest="start", type=_date, help="results from this date (YYYY-MM-DD)")
+    e.add_argument("--to", dest="end", type=_date, help="results up to and including this date")
+    e.add_argument("--classification")
+    e.add_argument("--min-confidence", type=float)
+    e.add_argument("--tensors", action="store_true", help="include the model inputs")
+    e.add_argument("--size", type=_size, help="WxH of the tensors (default: the model's INPUT_SIZE)")
+    e.add_argument("--format", choices=sorted(FORMATS), default="parquet")
+    e.add_argument("--rows-per-file", type=int, default=ROWS_PER_FILE)
+    n = sub.add_parser("npy", help=f"write {CELLS_FILE} / {LABELS_FILE} from an export with tensors")
+    n.add_argument("dataset_dir")
+    n.add_argument("--positive", required=True, help="class labelled 1 (e.g. Infected)")
+    n.add_argument("--model")
+    n.add_argument("--out", default=".", help="directory to write them to (the trainer's, e.g. ../malaria_classifier)")
+    args = p.parse_args(argv)
+
+    try:
+        if args.command == "npy":
+            import numpy as np
+            cells, labels = training_arrays(args.dataset_dir, args.positive, args.model)
+            os.makedirs(args.out, exist_ok=True)
+            np.save(os.path.join(args.out, CELLS_FILE), cells)
+            np.save(os.path.join(args.out, LABELS_FILE), labels)
+            print(f"{len(labels)} samples ({int(labels.sum())} {args.positive}) -> {args.out}")
+            return 0
+
+        from app import app, storage, UPLOAD_DIR
+        end = args.end + timedelta(days=1) if args.end else None
+        with app.app_context():
+            manifest = export_dataset(
+                args.out_dir, UPLOAD_DIR, storage, tensors=args.tensors, size=args.size, fmt=args.format,
+                rows_per_file=args.rows_per_file, model_id=args.model, case_id=args.case, start=args.start,
+                end=end, classification=args.classification, min_confidence=args.min_confidence,
+            )
+        print(f"{manifest['rows']} rows in {len(manifest['partitions'])} partition(s) -> {args.out_dir}")
+        return 0
+    except ExportError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
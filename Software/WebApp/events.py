@@ -0,0 +1,226 @@
+# ~/librecorder/Software/WebApp/events.py
+"""
+Publish/subscribe for Server-Sent Events (GET /events).
+
+Routes publish small JSON events (case created/updated/deleted, file
+uploaded, result logged, model run progress) and every open /events
+stream receives them, so the dashboard can update incrementally instead
+of re-fetching everything.
+
+Each subscriber gets a bounded queue; a subscriber that falls too far
+behind is dropped rather than slowing down publishers (the browser's
+EventSource reconnects by itself).
+
+An open stream holds a server thread (gunicorn's gthread workers have
+LIBRECORDER_THREADS each), so a process serves at most
+LIBRECORDER_EVENTS_MAX_STREAMS streams at once (subscribe() returns None
+over the cap; /events answers 503), and a stream ends after
+LIBRECORDER_EVENTS_MAX_SECONDS. The browser reconnects after the "retry"
+delay, to whichever worker has room.
+
+EventBroker only reaches subscribers in its own process. With several
+worker processes (gunicorn.conf.py sets LIBRECORDER_EVENTS=shared),
+SharedEventBroker is used instead: events are appended to a small SQLite
+file and a thread in each worker polls it and passes new events on to
+that worker's subscribers.
+"""
+import itertools
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+HEARTBEAT_SECONDS = 15
+QUEUE_SIZE = 1000
+POLL_SECONDS = 0.25
+KEEP_SECONDS = 3600        # shared events older than this are pruned
+PRUNE_EVERY = 500          # events
+MAX_STREAMS = int(os.environ.get("LIBRECORDER_EVENTS_MAX_STREAMS", 4))          # per process
+MAX_STREAM_SECONDS = float(os.environ.get("LIBRECORDER_EVENTS_MAX_SECONDS", 300))
+
+
+class Stream:
+    """
+    SSE-formatted strings for one subscriber, until the broker drops it or
+    max_seconds pass. close() (called by the WSGI server when the client
+    goes away) unsubscribes, even if the stream was never read.
+    """
+
+    def __init__(self, broker, q, max_seconds):
+        self._broker = broker
+        self._q = q
+        self._deadline = time.monotonic() + max_seconds
+        self._started = False
+        self._done = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._done:
+            raise StopIteration
+        if not self._started:
+            self._started = True
+            return "retry: 3000\n\n"
+        left = self._deadline - time.monotonic()
+        if left > 0:
+            try:
+                msg = self._q.get(timeout=min(HEARTBEAT_SECONDS, left))
+            except queue.Empty:
+                if left > HEARTBEAT_SECONDS:
+                    return ": keep-alive\n\n"
+                msg = None
+            if msg is not None:
+                return msg
+        self.close()
+        raise StopIteration
+
+    def close(self):
+        self._done = True
+        self._broker._unsubscribe(self._q)
+
+
+class EventBroker:
+    def __init__(self, max_streams=MAX_STREAMS, max_seconds=MAX_STREAM_SECONDS):
+        self.max_streams = max_streams
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._ids = itertools.count(1)
+        self._closed = False
+
+    def publish(self, event, **data):
+        self._deliver(_format(next(self._ids), event, json.dumps(data, default=str)))
+
+    def _deliver(self, msg):
+        with self._lock:
+            subs = list(self._subscribers)
+        for q in subs:
+            try:
+                q.put_nowait(msg)
+            except queue.Full:
+                self._drop(q)
+
+    def _unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def _drop(self, q):
+        self._unsubscribe(q)
+        try:
+            q.put_nowait(None)  # tell the stream to end
+        except queue.Full:
+            pass
+
+    def close(self):
+        """End all open streams, e.g. so a worker can shut down gracefully."""
+        with self._lock:
+            self._closed = True
+            subs = list(self._subscribers)
+        for q in subs:
+            self._drop(q)
+
+    def subscribe(self):
+        """A Stream for one client, or None when closed or max_streams are open."""
+        q = queue.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            if self._closed or len(self._subscribers) >= self.max_streams:
+                return None
+            self._subscribers.add(q)
+        return Stream(self, q, self.max_seconds)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+class SharedEventBroker(EventBroker):
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._poller_pid = None
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS event ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, created REAL NOT NULL,"
+                "name TEXT NOT NULL, data TEXT NOT NULL)"
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def publish(self, event, **data):
+        conn = self._connect()
+        try:
+            with conn:
+                cur = conn.execute(
+                    "INSERT INTO event (created, name, data) VALUES (?, ?, ?)",
+                    (time.time(), event, json.dumps(data, default=str)),
+                )
+                if cur.lastrowid % PRUNE_EVERY == 0:
+                    conn.execute("DELETE FROM event WHERE created < ?", (time.time() - KEEP_SECONDS,))
+        finally:
+            conn.close()
+
+    def subscribe(self):
+        stream = super().subscribe()
+        if stream is not None:
+            self._start_poller()
+        return stream
+
+    def _start_poller(self):
+        # started lazily, in the worker: threads do not survive a fork
+        with self._lock:
+            if self._poller_pid == os.getpid():
+                return
+            self._poller_pid = os.getpid()
+        threading.Thread(target=self._poll, name="event-poller", daemon=True).start()
+
+    def _poll(self):
+        conn = self._connect()
+        last = conn.execute("SELECT COALESCE(MAX(id), 0) FROM event").fetchone()[0]
+        while not self._closed:
+            time.sleep(POLL_SECONDS)
+            try:
+                rows = conn.execute(
+                    "SELECT id, name, data FROM event WHERE id > ? ORDER BY id", (last,)
+                ).fetchall()
+            except sqlite3.OperationalError:
+                continue  # locked for longer than the timeout; try again
+            for event_id, name, data in rows:
+                self._deliver(_format(event_id, name, data))
+                last = event_id
+        conn.close()
+
+
+def _format(event_id, event, data_json):
+    return f"id: {event_id}\nevent: {event}\ndata: {data_json}\n\n"
+
+
+def make_broker():
+    """
+    LIBRECORDER_EVENTS=local (default, one process) or shared (several
+    worker processes; LIBRECORDER_EVENTS_DB is the file they share, by
+    default events.db in the data directory next to the database).
+    """
+    kind = os.environ.get("LIBRECORDER_EVENTS", "local").lower()
+    if kind == "shared":
+        data_dir = os.environ.get("LIBRECORDER_DATA_DIR", os.path.dirname(os.path.abspath(__file__)))
+        default = os.path.join(os.path.abspath(data_dir), "events.db")
+        return SharedEventBroker(os.environ.get("LIBRECORDER_EVENTS_DB", default))
+    if kind == "local":
+        return EventBroker()
+    raise ValueError(f"unknown LIBRECORDER_EVENTS '{kind}'")
+
+
+broker = make_broker()
@@ -0,0 +1,259 @@
+# ~/librecorder/Software/WebApp/export.py
+"""
+Whole-case downloads as a zip or tar bundle, built while it is sent.
+
+  GET /cases/<case_id>/export?format=zip|tar|tar.gz&images=full|thumbnails|none
+
+  <case_id>/meta.json            case metadata and tags
+  <case_id>/results.json         recorded results and per-image model results
+  <case_id>/results.csv          recorded results
+  <case_id>/image_results.csv    per-image model results
+  <case_id>/files/<name>         images and notes as uploaded
+  <case_id>/thumbnails/<name>.jpg   instead of the images, with images=thumbnails
+
+stream_case() yields the archive in pieces as each file is read. The
+results files are written row by row from the database query (a tar
+header needs their size first) into spooled temporary files, kept in
+memory up to SPOOL_BYTES and on disk past that, so memory stays at about
+one read block plus SPOOL_BYTES whatever the size of the case. Zip entries are stored (images) or deflated
+(notes, JSON, CSV); zip64 is used for files over 4 GB. Retention archives
+(retention.py) are the same bundle as tar.gz.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import tarfile
+import tempfile
+import textwrap
+import time
+import zipfile
+
+from models import Case, ImageResult, TestResult
+from case_meta import meta_json, tags_by_case
+from image_results import image_result_json
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff")
+FORMATS = {
+    "zip": ("application/zip", ".zip"),
+    "tar": ("application/x-tar", ".tar"),
+    "tar.gz": ("application/gzip", ".tar.gz"),
+}
+IMAGE_MODES = ("full", "thumbnails", "none")
+THUMB_SIZE = 512                # longest side of a thumbnail, pixels
+READ_BLOCK = 1024 * 1024
+SPOOL_BYTES = 8 * 1024 * 1024   # a generated file larger than this goes to a temporary file
+QUERY_BATCH = 500
+TEST_RESULT_FIELDS = ("test_name", "result", "units", "timestamp")
+IMAGE_RESULT_FIELDS = (
+    "model_id", "file", "classification", "confidence", "latency_ms", "error", "timestamp", "result")
+# already compressed; deflating them again costs CPU for nothing
+STORED_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".gz", ".zip")
+
+
+def case_meta(case_id):
+    """The case's metadata and tags as a JSON-ready dict."""
+    c = Case.query.filter_by(case_id=case_id).first()
+    meta = {"case_id": case_id}
+    if c:
+        meta.update(meta_json(c, tags_by_case([case_id]).get(case_id, [])))
+        meta["created_at"] = c.created_at.isoformat() if c.created_at else None
+    return meta
+
+
+def recorded_result_json(r):
+    return {"test_name": r.test_name, "result": r.result, "units": r.units,
+            "timestamp": r.timestamp.isoformat() if r.timestamp else None}
+
+
+class _Text:
+    """str writes (csv, json) encoded as UTF-8 onto a binary file."""
+
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, s):
+        return self.f.write(s.encode("utf-8"))
+
+
+def _json_list(out, rows, indent="    "):
+    """Write rows to out as the items of a JSON list while passing them on."""
+    out.write("[")
+    n = 0
+    for row in rows:
+        out.write(",\n" if n else "\n")
+        out.write(textwrap.indent(json.dumps(row, indent=2, default=str), indent))
+        n += 1
+        yield row
+    out.write("\n" + indent[:-2] + "]" if n else "]")
+
+
+def _csv_rows(out, rows, fields):
+    w = csv.DictWriter(out, fieldnames=fields, extrasaction="ignore")
+    w.writeheader()
+    for row in rows:
+        w.writerow({k: json.dumps(v) if isinstance(v, (dict, list)) else v for k, v in row.items()})
+
+
+def write_results(case_id, results_json, results_csv, image_results_csv):
+    """
+    Write results.json, results.csv and image_results.csv (binary files) in
+    one pass over each table, QUERY_BATCH rows at a time.
+    """
+    js = _Text(results_json)
+    tests = TestResult.query.filter_by(case_id=case_id).order_by(TestResult.id).yield_per(QUERY_BATCH)
+    images = ImageResult.query.filter_by(case_id=case_id).order_by(ImageResult.id).yield_per(QUERY_BATCH)
+    js.write('{\n  "results": ')
+    _csv_rows(_Text(results_csv), _json_list(js, map(recorded_result_json, tests)), TEST_RESULT_FIELDS)
+    js.write(',\n  "image_results": ')
+    _csv_rows(_Text(image_results_csv), _json_list(js, map(image_result_json, images)), IMAGE_RESULT_FIELDS)
+    js.write("\n}")
+
+
+def thumbnail(path, size=THUMB_SIZE):
+    """JPEG bytes of the image scaled down to fit size x size, or None if it cannot be decoded."""
+    from PIL import Image
+    try:
+        with Image.open(path) as img:
+            img.draft("RGB", (size, size))  # JPEG: decode at a reduced scale
+            img = img.convert("RGB")
+            img.thumbnail((size, size))
+            buf = io.BytesIO()
+            img.save(buf, format="JPEG", quality=85)
+            return buf.getvalue()
+    except Exception:
+        return None
+
+
+def case_entries(case_dir, case_id, images="full", thumb_size=THUMB_SIZE):
+    """(archive name, mtime, bytes, file path or open file) for everything in a case bundle."""
+    now = time.time()
+    yield f"{case_id}/meta.json", now, json.dumps(case_meta(case_id), indent=2).encode("utf-8")
+    names = ("results.json", "results.csv", "image_results.csv")
+    spools = [tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) for _ in names]
+    try:
+        write_results(case_id, *spools)
+        for name, f in zip(names, spools):
+            yield f"{case_id}/{name}", now, f
+    finally:
+        for f in spools:
+            f.close()
+
+    if not os.path.isdir(case_dir):
+        return
+    for fname in sorted(os.listdir(case_dir)):
+        path = os.path.join(case_dir, fname)
+        if fname.endswith(".tmp") or not os.path.isfile(path):
+            continue
+        mtime = os.path.getmtime(path)
+        if fname.lower().endswith(IMAGE_EXTENSIONS):
+            if images == "none":
+                continue
+            if images == "thumbnails":
+                data = thumbnail(path, thumb_size)
+                if data is not None:
+                    yield f"{case_id}/thumbnails/{os.path.splitext(fname)[0]}.jpg", mtime, data
+                continue
+        yield f"{case_id}/files/{fname}", mtime, path
+
+
+def _size(src):
+    """src is bytes, a file path or an open binary file."""
+    if isinstance(src, bytes):
+        return len(src)
+    if isinstance(src, str):
+        return os.path.getsize(src)
+    return src.seek(0, io.SEEK_END)
+
+
+def _read_blocks(f, size, name):
+    while size > 0:
+        block = f.read(min(READ_BLOCK, size))
+        if not block:
+            raise OSError(f"{name} shrank while it was being exported")
+        size -= len(block)
+        yield block
+
+
+def _blocks(src, size):
+    if isinstance(src, bytes):
+        yield src
+    elif isinstance(src, str):
+        with open(src, "rb") as f:
+            yield from _read_blocks(f, size, src)
+    else:
+        src.seek(0)
+        yield from _read_blocks(src, size, "a generated file")
+
+
+class _Sink:
+    """Unseekable output whose bytes are taken away as soon as they are written."""
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def write(self, data):
+        self._buf += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = bytes(self._buf)
+        self._buf.clear()
+        return data
+
+
+def _zip_stream(entries):
+    sink = _Sink()
+    # on an unseekable output zipfile writes sizes and CRCs after each entry
+    with zipfile.ZipFile(sink, "w") as zf:
+        for name, mtime, src in entries:
+            size = _size(src)
+            info = zipfile.ZipInfo(name, time.localtime(max(mtime, 315532800))[:6])
+            info.file_size = size
+            info.compress_type = (
+                zipfile.ZIP_STORED if name.lower().endswith(STORED_EXTENSIONS) else zipfile.ZIP_DEFLATED
+            )
+            with zf.open(info, "w") as dst:
+                for block in _blocks(src, size):
+                    dst.write(block)
+                    yield sink.take()
+            yield sink.take()
+    yield sink.take()
+
+
+def _tar_stream(entries, compress):
+    sink = _Sink()
+    out = gzip.GzipFile(fileobj=sink, mode="wb", compresslevel=6) if compress else sink
+    written = 0
+    for name, mtime, src in entries:
+        size = _size(src)
+        info = tarfile.TarInfo(name)
+        info.size, info.mtime, info.mode = size, int(mtime), 0o644
+        header = info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+        out.write(header)
+        for block in _blocks(src, size):
+            out.write(block)
+            yield sink.take()
+        padding = -size % tarfile.BLOCKSIZE
+        out.write(tarfile.NUL * padding)
+        written += len(header) + size + padding
+    # end-of-archive blocks, padded to a whole record like tarfile does
+    end = 2 * tarfile.BLOCKSIZE
+    end += -(written + end) % tarfile.RECORDSIZE
+    out.write(tarfile.NUL * end)
+    if compress:
+        out.close()
+    yield sink.take()
+
+
+def stream_case(case_dir, case_id, fmt="zip", images="full", thumb_size=THUMB_SIZE):
+    """Generator of the bundle's bytes; fmt is a key of FORMATS, images one of IMAGE_MODES."""
+    entries = case_entries(case_dir, case_id, images, thumb_size)
+    chunks = _zip_stream(entries) if fmt == "zip" else _tar_stream(entries, fmt == "tar.gz")
+    for chunk in chunks:
+        if chunk:
+            yield chunk
@@ -0,0 +1,87 @@
+# ~/librecorder/Software/WebApp/gunicorn.conf.py
+"""
+Production server: several worker processes, so a long /run_model or
+/run_pipeline in one worker does not hold up everyone else.
+
+  cd Software/WebApp
+  gunicorn -c gunicorn.conf.py app:app
+
+(gunicorn is POSIX only; on Windows use `python app.py`.)
+
+Shared state between the workers:
+  - SQLite in WAL mode with a busy timeout (models.configure_sqlite)
+  - case creation and chunked uploads use file locks (locks.py)
+  - /events goes through a shared event log (events.SharedEventBroker)
+  - /metrics adds up the snapshots each worker writes to metrics/ (metrics.py)
+The shared event log (events.db) and metrics/ live in the data directory
+with the database and uploads (LIBRECORDER_DATA_DIR, see app.py).
+The app is loaded once in the master, which then sets up the database
+(app.init_db) and loads the plugin models (app.preload_models), so each
+worker starts with them in memory. Each worker then starts its own plugin
+workers (sandbox.py, app.start_warmup) and retention sweeper right after
+the fork; the startup timings are printed and exported as
+librecorder_startup_seconds.
+
+Settings can be overridden with environment variables:
+  LIBRECORDER_BIND=0.0.0.0:8000  LIBRECORDER_WORKERS=<cpus>  LIBRECORDER_THREADS=8
+  LIBRECORDER_EVENTS_MAX_STREAMS=<threads / 2>  LIBRECORDER_EVENTS_MAX_SECONDS=300
+"""
+import multiprocessing
+import os
+import signal
+
+os.environ.setdefault("LIBRECORDER_EVENTS", "shared")
+_data_dir = os.path.abspath(os.environ.get("LIBRECORDER_DATA_DIR", os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LIBRECORDER_METRICS_DIR", os.path.join(_data_dir, "metrics"))
+
+bind = os.environ.get("LIBRECORDER_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("LIBRECORDER_WORKERS", multiprocessing.cpu_count()))
+# threads per worker: /events streams and uploads mostly wait on I/O
+worker_class = "gthread"
+threads = int(os.environ.get("LIBRECORDER_THREADS", 8))
+# each open /events stream holds a thread; leave at least half for requests
+os.environ.setdefault("LIBRECORDER_EVENTS_MAX_STREAMS", str(max(1, threads // 2)))
+preload_app = True
+# model runs can take minutes; with gthread this only bounds an unresponsive worker
+timeout = 120
+graceful_timeout = 60
+keepalive = 5
+accesslog = "-"
+
+
+def on_starting(server):
+    from metrics import clear_dir
+    from app import init_db, record_startup, STARTUP
+    clear_dir()
+    record_startup("imports", STARTUP["imports"])
+    init_db()
+
+
+def when_ready(server):
+    from app import preload_models, WARMUP
+    if WARMUP != "off":
+        preload_models()
+
+
+def post_fork(server, worker):
+    # connections opened in the master must not be shared with the children
+    from app import app, start_warmup, start_retention
+    from models import db
+    with app.app_context():
+        db.engine.dispose(close=False)
+    start_warmup()
+    start_retention()
+
+
+def post_worker_init(worker):
+    # On a graceful stop (SIGTERM / HUP) end the open /events streams first,
+    # otherwise they keep the worker busy until graceful_timeout.
+    from events import broker
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def stop(signum, frame):
+        broker.close()
+        if callable(previous):
+            previous(signum, frame)
+
+    signal.signal(signal.SIGTERM, stop)
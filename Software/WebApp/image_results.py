@@ -0,0 +1,238 @@
+# ~/librecorder/Software/WebApp/image_results.py
+"""
+Per-image result rows (ImageResult) and incremental re-analysis.
+
+Every model run stores one row per (case, model, file) together with the
+file's size / mtime and the run options. An incremental run only processes
+files whose row is missing or out of date, then rebuilds the case aggregate
+from the stored rows.
+
+Rows are written with bulk INSERT / UPDATE statements; the INSERT updates
+instead a row that a concurrent run of the same case and model stored
+first. classification, confidence and latency are kept in their own
+columns so results can be queried across cases without re-running
+inference.
+"""
+import json
+import os
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, ImageResult
+
+_STORED_COLUMNS = ("id", "file", "file_size", "file_mtime_ns", "options")
+_KEY_COLUMNS = ("case_id", "model_id", "file")
+_VALUE_COLUMNS = ("file_size", "file_mtime_ns", "options", "result", "error",
+                  "classification", "confidence", "latency_ms", "timestamp")
+
+
+def file_identity(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def options_key(**opts):
+    """Stable string for the run options that change results ("" if none)."""
+    opts = {k: v for k, v in opts.items() if v}
+    return json.dumps(opts, sort_keys=True) if opts else ""
+
+
+def stored_results(case_id, model_id):
+    """{file: row identity dict} for one model over a case (results not loaded)."""
+    cols = [getattr(ImageResult, c) for c in _STORED_COLUMNS]
+    rows = db.session.query(*cols).filter_by(case_id=case_id, model_id=model_id).all()
+    return {r.file: dict(zip(_STORED_COLUMNS, r)) for r in rows}
+
+
+def stale_files(files, identities, stored, options=""):
+    """Files with no stored row, or whose size, mtime or options changed."""
+    out = []
+    for f in files:
+        row = stored.get(f)
+        if (row is None
+                or (row["file_size"], row["file_mtime_ns"]) != identities[f]
+                or (row["options"] or "") != options):
+            out.append(f)
+    return out
+
+
+def _summary_fields(result):
+    """classification / confidence copied out of a result for indexing."""
+    if not isinstance(result, dict):
+        return None, None
+    c = result.get("classification")
+    conf = result.get("confidence")
+    if not isinstance(conf, (int, float)) or isinstance(conf, bool):
+        conf = None
+    return (str(c) if c is not None else None), (float(conf) if conf is not None else None)
+
+
+def _upsert(rows):
+    """
+    Bulk INSERT of rows that updates the existing row instead when another
+    run of the same case and model inserted it after stored was read.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(ImageResult)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(_KEY_COLUMNS), set_={c: stmt.excluded[c] for c in _VALUE_COLUMNS},
+        )
+    elif dialect in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(ImageResult)
+        stmt = stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in _VALUE_COLUMNS})
+    else:
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(db.insert(ImageResult), row)
+            except IntegrityError:
+                db.session.execute(
+                    db.update(ImageResult).filter_by(**{k: row[k] for k in _KEY_COLUMNS})
+                    .values({c: row[c] for c in _VALUE_COLUMNS})
+                )
+        return
+    db.session.execute(stmt, rows)
+
+
+def save_image_results(case_id, model_id, per_image, identities, stored, options=""):
+    """
+    Insert or update one row per entry of per_image with one bulk INSERT
+    (an upsert, see _upsert) and one bulk UPDATE. Does not commit.
+    """
+    now = datetime.utcnow()
+    inserts, updates = [], []
+    for x in per_image:
+        fname = x["file"]
+        size, mtime = identities[fname]
+        classification, confidence = _summary_fields(x.get("result"))
+        values = {
+            "file_size": size,
+            "file_mtime_ns": mtime,
+            "options": options,
+            "result": json.dumps(x["result"]) if "result" in x else None,
+            "error": x.get("error"),
+            "classification": classification,
+            "confidence": confidence,
+            "latency_ms": x.get("latency_ms"),
+            "timestamp": now,
+        }
+        row = stored.get(fname)
+        if row is None:
+            inserts.append({"case_id": case_id, "model_id": model_id, "file": fname, **values})
+            stored[fname] = {"id": None, "file": fname, "file_size": size,
+                             "file_mtime_ns": mtime, "options": options}
+        else:
+            updates.append({"id": row["id"], **values})
+            row.update(file_size=size, file_mtime_ns=mtime, options=options)
+
+    if inserts:
+        _upsert(inserts)
+    if updates:
+        db.session.execute(db.update(ImageResult), updates)
+
+
+def drop_missing(stored, files):
+    """Delete rows for files that are no longer in the case. Does not commit."""
+    present = set(files)
+    gone = [stored.pop(f)["id"] for f in list(stored) if f not in present]
+    if gone:
+        ImageResult.query.filter(ImageResult.id.in_(gone)).delete(synchronize_session=False)
+
+
+def iter_stored_per_image(case_id, model_id, chunk=500):
+    """
+    Yield {"file", "result"|"error"} for every stored row of one model over
+    a case, reading the table in chunks rather than all at once.
+    """
+    q = (db.session.query(ImageResult.file, ImageResult.result, ImageResult.error)
+         .filter_by(case_id=case_id, model_id=model_id)
+         .execution_options(yield_per=chunk))
+    for fname, result, error in q:
+        if result is not None:
+            yield {"file": fname, "result": json.loads(result)}
+        else:
+            yield {"file": fname, "error": error}
+
+
+def query_image_results(case_id=None, model_id=None, classification=None,
+                        min_confidence=None, max_confidence=None, limit=1000, offset=0):
+    """Filtered ImageResult rows, newest first."""
+    q = ImageResult.query
+    if case_id:
+        q = q.filter(ImageResult.case_id == case_id)
+    if model_id:
+        q = q.filter(ImageResult.model_id == model_id)
+    if classification:
+        q = q.filter(ImageResult.classification == classification)
+    if min_confidence is not None:
+        q = q.filter(ImageResult.confidence >= min_confidence)
+    if max_confidence is not None:
+        q = q.filter(ImageResult.confidence <= max_confidence)
+    q = q.order_by(ImageResult.timestamp.desc(), ImageResult.id.desc())
+    return q.offset(offset).limit(limit).all()
+
+
+def cell_matches(row, classification=None, min_confidence=None, max_confidence=None):
+    """Per-cell entries of a segmented result that match the filters."""
+    result = json.loads(row.result) if row.result else {}
+    cells = result.get("per_cell") if isinstance(result, dict) else None
+    out = []
+    for cell in cells or []:
+        if classification and cell.get("classification") != classification:
+            continue
+        confidence = cell.get("confidence") or 0
+        if min_confidence is not None and confidence < min_confidence:
+            continue
+        if max_confidence is not None and confidence > max_confidence:
+            continue
+        out.append(cell)
+    return out
+
+
+def query_cell_matches(case_id=None, model_id=None, classification=None,
+                       min_confidence=None, max_confidence=None, limit=1000, offset=0, chunk=500):
+    """
+    (row, matching cells) for the segmented rows with at least one matching
+    cell, newest first. offset and limit count those rows, so they are
+    applied after the per-cell filter, reading the table in chunks.
+    """
+    q = ImageResult.query.filter(ImageResult.result.like('%"per_cell"%'))
+    if case_id:
+        q = q.filter(ImageResult.case_id == case_id)
+    if model_id:
+        q = q.filter(ImageResult.model_id == model_id)
+    q = q.order_by(ImageResult.timestamp.desc(), ImageResult.id.desc()).yield_per(chunk)
+    out = []
+    for row in q:
+        cells = cell_matches(row, classification, min_confidence, max_confidence)
+        if not cells:
+            continue
+        if offset:
+            offset -= 1
+            continue
+        out.append((row, cells))
+        if len(out) >= limit:
+            break
+    return out
+
+
+def image_result_json(row):
+    return {
+        "case_id": row.case_id,
+        "model_id": row.model_id,
+        "file": row.file,
+        "url": f"/cases/{row.case_id}/{row.file}",
+        "result": json.loads(row.result) if row.result else None,
+        "error": row.error,
+        "classification": row.classification,
+        "confidence": row.confidence,
+        "latency_ms": row.latency_ms,
+        "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+    }
@@ -0,0 +1,68 @@
+# ~/librecorder/Software/WebApp/locks.py
+"""
+Locks that hold across worker processes (see gunicorn.conf.py) as well as
+threads.
+
+  lock = FileLock("locks/queue.lock")
+  with lock:
+      ...
+
+Each acquire opens the lock file and takes an exclusive OS lock on it
+(flock on POSIX, msvcrt.locking on Windows), which the OS releases when the
+file is closed, including when the process dies. Not re-entrant.
+"""
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:          # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _lock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            time.sleep(0.05)  # LK_LOCK gives up after ~10 s
+
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class FileLock:
+    def __init__(self, path):
+        self.path = path
+        self._held = threading.local()
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        f = open(self.path, "a+b")
+        try:
+            _lock(f)
+        except BaseException:
+            f.close()
+            raise
+        self._held.file = f
+        return self
+
+    def __exit__(self, *exc):
+        f = self._held.file
+        self._held.file = None
+        try:
+            _unlock(f)
+        finally:
+            f.close()
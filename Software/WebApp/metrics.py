@@ -0,0 +1,405 @@
+# ~/librecorder/Software/WebApp/metrics.py
+"""
+Request and hot-path timing, exported in the Prometheus text format on
+GET /metrics (and as JSON per model on GET /metrics/models).
+
+  HTTP_SECONDS     librecorder_http_request_duration_seconds{method, endpoint, status}
+  SPAN_SECONDS     librecorder_span_seconds{span, model}
+                     plugin_load, decode, aggregate, db_commit, file_save,
+                     blob_store, chunk_write
+  MODEL_SECONDS    librecorder_model_latency_seconds{model}   (per image, summary)
+  MODEL_ERRORS     librecorder_model_errors_total{model}
+  SANDBOX_RESTARTS librecorder_sandbox_restarts_total{reason}   timeout, memory, crash, recycled
+  STARTUP_SECONDS  librecorder_startup_seconds{phase}   imports, database, plugins
+  CASES_PURGED     librecorder_cases_purged_total{policy}   "" for DELETE /purge/<case_id>
+
+  with span("aggregate", model_id):
+      ...
+
+No client library is needed. Values are kept per process; with several
+worker processes (gunicorn.conf.py sets LIBRECORDER_METRICS_DIR) each one
+writes a snapshot to that directory every few seconds and /metrics adds
+them up, so a scrape sees every worker whichever one answers it.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+SUMMARY_WINDOW = 1024           # latest observations kept per label set for quantiles
+SUMMARY_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+FLUSH_SECONDS = 5
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def reset(self):
+        """Forget all values (a forked worker must not report its parent's)."""
+        self.lock = threading.Lock()
+        for m in self.metrics:
+            m._values = {}
+
+    def snapshot(self):
+        with self.lock:
+            return {m.name: [[list(k), m._dump(v)] for k, v in m._values.items()] for m in self.metrics}
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name, help, labels=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.registry = registry
+        self._values = {}
+        registry.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def _dump(self, value):
+        return value
+
+    def _merge(self, into, value):
+        raise NotImplementedError
+
+    def _lines(self, key, value):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        _started()
+
+    def _merge(self, into, value):
+        return (into or 0) + value
+
+    def _lines(self, key, value):
+        yield f"{self.name}{_labels(self.labels, key)} {_num(value)}"
+
+
+class Gauge(Metric):
+    """A value that is set; across worker processes the largest is reported."""
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self._values[key] = value
+        _started()
+
+    def _merge(self, into, value):
+        return value if into is None else max(into, value)
+
+    def _lines(self, key, value):
+        yield f"{self.name}{_labels(self.labels, key)} {_num(value)}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        super().__init__(name, help, labels, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self.registry.lock:
+            v = self._values.get(key)
+            if v is None:
+                v = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            v[0][i] += 1
+            v[1] += value
+            v[2] += 1
+        _started()
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def _dump(self, value):
+        return [list(value[0]), value[1], value[2]]
+
+    def _merge(self, into, value):
+        if into is None:
+            return [list(value[0]), value[1], value[2]]
+        into[0] = [a + b for a, b in zip(into[0], value[0])]
+        into[1] += value[1]
+        into[2] += value[2]
+        return into
+
+    def _lines(self, key, value):
+        counts, total, n = value
+        running = 0
+        for bound, c in zip(self.buckets + (float("inf"),), counts):
+            running += c
+            le = "+Inf" if bound == float("inf") else _num(bound)
+            yield f"{self.name}_bucket{_labels(self.labels + ('le',), key + (le,))} {running}"
+        yield f"{self.name}_sum{_labels(self.labels, key)} {_num(total)}"
+        yield f"{self.name}_count{_labels(self.labels, key)} {n}"
+
+
+class Summary(Metric):
+    """Count and sum, plus quantiles over the latest SUMMARY_WINDOW observations."""
+    type = "summary"
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            v = self._values.get(key)
+            if v is None:
+                v = self._values[key] = [deque(maxlen=SUMMARY_WINDOW), 0.0, 0]
+            v[0].append(value)
+            v[1] += value
+            v[2] += 1
+        _started()
+
+    def _dump(self, value):
+        return [list(value[0]), value[1], value[2]]
+
+    def _merge(self, into, value):
+        if into is None:
+            return [list(value[0]), value[1], value[2]]
+        into[0].extend(value[0])
+        into[1] += value[1]
+        into[2] += value[2]
+        return into
+
+    def stats(self, value):
+        window, total, n = value
+        ordered = sorted(window)
+        return {
+            "count": n,
+            "sum": total,
+            "quantiles": {q: _quantile(ordered, q) for q in SUMMARY_QUANTILES} if ordered else {},
+        }
+
+    def _lines(self, key, value):
+        s = self.stats(value)
+        for q, v in s["quantiles"].items():
+            yield f"{self.name}{_labels(self.labels + ('quantile',), key + (_num(q),))} {_num(v)}"
+        yield f"{self.name}_sum{_labels(self.labels, key)} {_num(s['sum'])}"
+        yield f"{self.name}_count{_labels(self.labels, key)} {s['count']}"
+
+
+def _quantile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _num(v):
+    if isinstance(v, float) and v.is_integer() and abs(v) < 1e15:
+        return str(int(v))
+    return repr(v) if isinstance(v, float) else str(v)
+
+
+def _escape(s):
+    return s.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+# ----------------------------
+# The application's metrics
+# ----------------------------
+HTTP_REQUESTS = Counter(
+    "librecorder_http_requests_total", "HTTP requests handled.", ("method", "endpoint", "status"))
+HTTP_SECONDS = Histogram(
+    "librecorder_http_request_duration_seconds", "Time to produce a response.", ("method", "endpoint", "status"))
+SPAN_SECONDS = Histogram(
+    "librecorder_span_seconds", "Time spent in hot paths.", ("span", "model"))
+MODEL_SECONDS = Summary(
+    "librecorder_model_latency_seconds", "Model run time per image.", ("model",))
+MODEL_ERRORS = Counter(
+    "librecorder_model_errors_total", "Images a model failed on.", ("model",))
+SANDBOX_RESTARTS = Counter(
+    "librecorder_sandbox_restarts_total", "Plugin workers replaced (sandbox.py).", ("reason",))
+STARTUP_SECONDS = Gauge(
+    "librecorder_startup_seconds", "Time spent starting up, by phase (slowest worker).", ("phase",))
+EVENT_STREAMS_REJECTED = Counter(
+    "librecorder_event_streams_rejected_total", "/events requests turned away over the stream cap (events.py).")
+CASES_PURGED = Counter(
+    "librecorder_cases_purged_total", "Cases deleted, by /purge or a retention policy.", ("policy",))
+
+
+def span(name, model=""):
+    return SPAN_SECONDS.time(span=name, model=model)
+
+
+def observe_model(model_id, entry):
+    """Record one per-image entry ({"latency_ms", "error"?}) of a model run."""
+    MODEL_SECONDS.observe(entry["latency_ms"] / 1000.0, model=model_id)
+    if "error" in entry:
+        MODEL_ERRORS.inc(model=model_id)
+
+
+def time_commits():
+    """Observe every SQLAlchemy session commit (flush included) as the db_commit span."""
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    @event.listens_for(Session, "before_commit")
+    def _start(session):
+        session.info["commit_t0"] = time.perf_counter()
+
+    @event.listens_for(Session, "after_commit")
+    def _done(session):
+        t0 = session.info.pop("commit_t0", None)
+        if t0 is not None:
+            SPAN_SECONDS.observe(time.perf_counter() - t0, span="db_commit", model="")
+
+    @event.listens_for(Session, "after_rollback")
+    def _rolled_back(session):
+        session.info.pop("commit_t0", None)
+
+
+# ----------------------------
+# Several worker processes
+# ----------------------------
+_flusher_pid = None
+
+
+def _started():
+    # lazily, in the process that observes: threads do not survive a fork
+    global _flusher_pid
+    if _flusher_pid == os.getpid() or not os.environ.get("LIBRECORDER_METRICS_DIR"):
+        return
+    _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True).start()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_SECONDS)
+        try:
+            _flush()
+        except OSError:
+            pass
+
+
+def _flush():
+    d = os.environ["LIBRECORDER_METRICS_DIR"]
+    os.makedirs(d, exist_ok=True)
+    path = os.path.join(d, f"{os.getpid()}.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(REGISTRY.snapshot(), f)
+    os.replace(tmp, path)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def _snapshots():
+    """This process's values, plus the latest snapshot of every other worker."""
+    snaps = [REGISTRY.snapshot()]
+    d = os.environ.get("LIBRECORDER_METRICS_DIR")
+    if not d or not os.path.isdir(d):
+        return snaps
+    for fname in os.listdir(d):
+        pid, ext = os.path.splitext(fname)
+        if ext != ".json" or not pid.isdigit() or int(pid) == os.getpid():
+            continue
+        try:
+            with open(os.path.join(d, fname), "r", encoding="utf-8") as f:
+                snap = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if not _alive(int(pid)):
+            # an exited worker still counts towards the totals, but its
+            # latency window is stale
+            for m in REGISTRY.metrics:
+                if isinstance(m, Summary) and m.name in snap:
+                    snap[m.name] = [[k, [[], v[1], v[2]]] for k, v in snap[m.name]]
+        snaps.append(snap)
+    return snaps
+
+
+def _merged(snaps):
+    out = {}
+    for m in REGISTRY.metrics:
+        values = {}
+        for snap in snaps:
+            for key, value in snap.get(m.name, []):
+                key = tuple(key)
+                values[key] = m._merge(values.get(key), value)
+        out[m.name] = values
+    return out
+
+
+def clear_dir():
+    """Remove the snapshots of a previous server run (gunicorn on_starting)."""
+    d = os.environ.get("LIBRECORDER_METRICS_DIR")
+    if not d or not os.path.isdir(d):
+        return
+    for fname in os.listdir(d):
+        if fname.endswith((".json", ".tmp")):
+            os.remove(os.path.join(d, fname))
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    merged = _merged(_snapshots())
+    lines = []
+    for m in REGISTRY.metrics:
+        lines.append(f"# HELP {m.name} {m.help}")
+        lines.append(f"# TYPE {m.name} {m.type}")
+        for key, value in sorted(merged[m.name].items()):
+            lines.extend(m._lines(key, value))
+    return "\n".join(lines) + "\n"
+
+
+def model_summary():
+    """{model_id: {count, errors, mean_ms, p50_ms, p90_ms, p95_ms, p99_ms}} over all workers."""
+    merged = _merged(_snapshots())
+    errors = {key[0]: n for key, n in merged[MODEL_ERRORS.name].items()}
+    out = {}
+    for (model_id,), value in sorted(merged[MODEL_SECONDS.name].items()):
+        s = MODEL_SECONDS.stats(value)
+        row = {
+            "count": s["count"],
+            "errors": errors.get(model_id, 0),
+            "mean_ms": round(s["sum"] / s["count"] * 1000, 3) if s["count"] else None,
+        }
+        for q, v in s["quantiles"].items():
+            row[f"p{int(q * 100)}_ms"] = round(v * 1000, 3)
+        out[model_id] = row
+    return out
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=REGISTRY.reset)
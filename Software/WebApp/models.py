@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from datetime import datetime
 
 db = SQLAlchemy()
@@ -8,11 +9,133 @@ class Case(db.Model):
     case_id = db.Column(db.String(64), unique=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     description = db.Column(db.String(255))
+    # case metadata (formerly meta.json / browser localStorage)
+    domain = db.Column(db.String(32), nullable=False, default="health", server_default="health", index=True)
+    level = db.Column(db.String(32), nullable=False, default="Not Analyzed", server_default="Not Analyzed", index=True)
+    state = db.Column(db.String(32), nullable=False, default="Intake", server_default="Intake")
+    columns = db.Column(db.Text)   # JSON: analysis-type -> status
+    notes = db.Column(db.Text)
+
+class CaseTag(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    case_id = db.Column(db.String(64), db.ForeignKey('case.case_id'), nullable=False, index=True)
+    tag = db.Column(db.String(64), nullable=False, index=True)
+
+    __table_args__ = (db.UniqueConstraint('case_id', 'tag'),)
 
 class TestResult(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    case_id = db.Column(db.String(64), db.ForeignKey('case.case_id'), nullable=False)
+    case_id = db.Column(db.String(64), db.ForeignKey('case.case_id'), nullable=False, index=True)
     test_name = db.Column(db.String(64))
-    result = db.Column(db.String(128))
+    result = db.Column(db.Text)     # a value, or a run summary as JSON (aggregation.py)
     units = db.Column(db.String(32))
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ImageResult(db.Model):
+    """One model's result for one file of a case."""
+    id = db.Column(db.Integer, primary_key=True)
+    case_id = db.Column(db.String(64), db.ForeignKey('case.case_id'), nullable=False, index=True)
+    model_id = db.Column(db.String(64), nullable=False)
+    file = db.Column(db.String(255), nullable=False)
+    # file identity when it was processed: a change in either means re-run
+    file_size = db.Column(db.BigInteger)
+    file_mtime_ns = db.Column(db.BigInteger)
+    options = db.Column(db.String(255), default="")   # run options (tile/segment) as JSON
+    result = db.Column(db.Text)                        # JSON
+    error = db.Column(db.Text)
+    # copied out of result so they can be filtered in SQL
+    classification = db.Column(db.String(64))
+    confidence = db.Column(db.Float)
+    latency_ms = db.Column(db.Float)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('case_id', 'model_id', 'file'),
+        db.Index('ix_image_result_model_class_conf', 'model_id', 'classification', 'confidence'),
+    )
+
+class Blob(db.Model):
+    """A stored object in the content-addressable store (see blobstore.py)."""
+    sha256 = db.Column(db.String(64), primary_key=True)   # of the uploaded bytes
+    size = db.Column(db.BigInteger, nullable=False)        # uploaded size
+    stored_size = db.Column(db.BigInteger, nullable=False) # size on disk
+    encoding = db.Column(db.String(16), default="")        # lossless recompression applied, if any
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class CaseFile(db.Model):
+    """Maps /cases/<case_id>/<filename> to the blob holding its content."""
+    id = db.Column(db.Integer, primary_key=True)
+    case_id = db.Column(db.String(64), db.ForeignKey('case.case_id'), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    sha256 = db.Column(db.String(64), db.ForeignKey('blob.sha256'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('case_id', 'filename'),)
+
+class RetentionPolicy(db.Model):
+    """Which old cases the retention sweeper deletes (see retention.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), unique=True, nullable=False)
+    max_age_days = db.Column(db.Integer, nullable=False)
+    # optional filters; a case must match every one that is set
+    domain = db.Column(db.String(32))
+    level = db.Column(db.String(32))
+    tag = db.Column(db.String(64))
+    archive = db.Column(db.Boolean, nullable=False, default=False)   # write a .tar.gz before deleting
+    enabled = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+def upgrade_schema():
+    """
+    db.create_all() only creates missing tables. Add the columns and indexes
+    introduced since a table was first created, and widen VARCHAR columns
+    that are now TEXT (additive changes only).
+    """
+    insp = db.inspect(db.engine)
+    quote = db.engine.dialect.identifier_preparer.quote
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not insp.has_table(table.name):
+                continue
+            existing = {c["name"]: c for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing:
+                    ddl = _widen_to_text(db.engine.dialect, table.name, col, existing[col.name]["type"])
+                    if ddl:
+                        conn.execute(db.text(ddl))
+                    continue
+                ddl = f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(col.name)} {col.type.compile(dialect=db.engine.dialect)}"
+                if col.server_default is not None:
+                    # existing rows get the default too
+                    default = str(col.server_default.arg).replace("'", "''")
+                    ddl += f" NOT NULL DEFAULT '{default}'" if not col.nullable else f" DEFAULT '{default}'"
+                conn.execute(db.text(ddl))
+            for idx in table.indexes:
+                idx.create(conn, checkfirst=True)
+
+def _widen_to_text(dialect, table, col, current):
+    """ALTER statement turning a VARCHAR(n) column into TEXT, or None (SQLite has no length limit)."""
+    if not isinstance(col.type, db.Text) or not getattr(current, "length", None) or dialect.name == "sqlite":
+        return None
+    quote = dialect.identifier_preparer.quote
+    if dialect.name in ("mysql", "mariadb"):
+        return f"ALTER TABLE {quote(table)} MODIFY {quote(col.name)} TEXT"
+    return f"ALTER TABLE {quote(table)} ALTER COLUMN {quote(col.name)} TYPE TEXT"
+
+def configure_sqlite(engine):
+    """
+    Set up SQLite for several worker processes: WAL lets readers run while
+    another process writes, and busy_timeout makes a writer wait for the
+    lock instead of failing with "database is locked".
+    """
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute("PRAGMA busy_timeout=30000")
+        cur.close()
@@ -0,0 +1,141 @@
+# ~/librecorder/Software/WebApp/pipeline.py
+"""
+Run a panel of models over a case with every image decoded only once.
+
+A pipeline is a list of model ids, or a small DAG:
+  ["mean_pixel_v1", "dark_light_v1", "malaria_cnn_v1"]
+  [{"id": "dark_light_v1"}, {"id": "malaria_cnn_v1", "after": ["dark_light_v1"]}]
+Models run in dependency order. A model is skipped for an image when a
+model it runs "after" failed on that image.
+
+Each image is decoded into one read-only RGB array that is shared by all
+models through run_array(array) or run_batch([array]). Models that only
+define run(image_path) still get the path.
+"""
+import os
+import time
+
+from metrics import span, observe_model
+
+
+def parse_pipeline(spec):
+    """
+    Validate a pipeline spec and return [(model_id, [after, ...]), ...]
+    in run order. Raises ValueError on bad input or cycles.
+    """
+    if not isinstance(spec, list) or not spec:
+        raise ValueError("models must be a non-empty list")
+
+    nodes = {}
+    for item in spec:
+        if isinstance(item, str):
+            mid, after = item, []
+        elif isinstance(item, dict):
+            mid, after = item.get("id"), item.get("after") or []
+        else:
+            raise ValueError("each model must be an id or {\"id\", \"after\"}")
+
+        mid = str(mid or "").strip()
+        if not mid:
+            raise ValueError("model id is required")
+        if mid in nodes:
+            raise ValueError(f"model '{mid}' listed twice")
+        if isinstance(after, str):
+            after = [after]
+        nodes[mid] = [str(a).strip() for a in after]
+
+    for mid, after in nodes.items():
+        for a in after:
+            if a not in nodes:
+                raise ValueError(f"model '{mid}' runs after unknown model '{a}'")
+
+    # topological order, keeping request order among models that are ready
+    order, done = [], set()
+    while len(order) < len(nodes):
+        ready = [m for m in nodes if m not in done and all(a in done for a in nodes[m])]
+        if not ready:
+            raise ValueError("pipeline has a cycle")
+        for m in ready:
+            order.append((m, nodes[m]))
+            done.add(m)
+    return order
+
+
+def uses_array(mod):
+    return hasattr(mod, "run_array") or hasattr(mod, "run_batch")
+
+
+def decode_rgb(image_path):
+    """Decode an image once into an RGB uint8 array."""
+    import numpy as np
+    from PIL import Image
+    with Image.open(image_path) as img:
+        rgb = img if img.mode == "RGB" else img.convert("RGB")
+        arr = np.asarray(rgb)
+    arr.flags.writeable = False  # shared between models
+    return arr
+
+
+def run_on_array(mod, arr, image_path):
+    if hasattr(mod, "run_array"):
+        return mod.run_array(arr)
+    if hasattr(mod, "run_batch"):
+        return mod.run_batch([arr])[0]
+    return mod.run(image_path)
+
+
+def run_file(order, modules, image_path):
+    """
+    Run every model in order on one image.
+    Returns {model_id: {"file", "result"|"error", "latency_ms"?}}.
+    """
+    fname = os.path.basename(image_path)
+    need_array = any(uses_array(modules[mid]) for mid, _ in order)
+    try:
+        if need_array:
+            with span("decode"):
+                arr = decode_rgb(image_path)
+        else:
+            arr = None
+    except Exception as e:
+        return {mid: {"file": fname, "error": f"decode failed: {e}"} for mid, _ in order}
+
+    out = {}
+    failed = set()
+    for mid, after in order:
+        upstream = [a for a in after if a in failed]
+        if upstream:
+            out[mid] = {"file": fname, "error": f"skipped: '{upstream[0]}' failed"}
+            failed.add(mid)
+            continue
+        t0 = time.perf_counter()
+        try:
+            out[mid] = {"file": fname, "result": run_on_array(modules[mid], arr, image_path)}
+        except Exception as e:
+            out[mid] = {"file": fname, "error": str(e)}
+            failed.add(mid)
+        out[mid]["latency_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+    return out
+
+
+def run_pipeline(order, modules, case_dir, files, on_image=None, runner=run_file):
+    """
+    Run every model in order on every file.
+    Returns {model_id: [{"file", "result"|"error"}, ...]}.
+    on_image(done, file, {model_id: entry}) is called after each file.
+    runner(order, modules, image_path) runs one file (run_file, or
+    sandbox.run_file_sandboxed to run it in a plugin worker).
+    """
+    per_model = {mid: [] for mid, _ in order}
+
+    for done, fname in enumerate(files, 1):
+        entries = runner(order, modules, os.path.join(case_dir, fname))
+        for mid, _ in order:
+            per_model[mid].append(entries[mid])
+            if "latency_ms" in entries[mid]:
+                observe_model(mid, entries[mid])
+
+        if on_image:
+            on_image(done, fname, entries)
+
+    return per_model
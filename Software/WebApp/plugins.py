@@ -0,0 +1,104 @@
+# ~/librecorder/Software/WebApp/plugins.py
+"""
+Discovery and loading of the processing plugins (../processing/*.py).
+
+  load_plugin(path)       import the module (cached until the file changes)
+  describe_plugin(path)   what the web process needs, read from the source
+
+The web process only needs a plugin's literal constants (MODEL_ID,
+MODEL_NAME, AGGREGATES, POSITIVE_CLASS, ...) and which of run / run_array /
+run_batch / warm_up it defines. describe_plugin() gets these by parsing
+the file, so listing models or starting a run does not import torch or
+OpenCV into the web process when the models run in the sandbox
+(sandbox.py). It returns None when a constant is not a plain literal, and
+the plugin is then imported.
+"""
+import ast
+import importlib.util
+import os
+import threading
+import types
+
+from metrics import span
+
+PROC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "processing")
+FUNCTIONS = ("run", "run_array", "run_batch", "warm_up")
+# constants the web process reads; if one of these is not a literal, the plugin is imported
+CONTRACT = ("MODEL_ID", "MODEL_NAME", "AGGREGATES", "HEATMAP_KEY", "POSITIVE_CLASS", "INPUT_SIZE")
+
+_modules = {}       # path -> (mtime_ns, module)
+_described = {}     # path -> (mtime_ns, namespace or None)
+_lock = threading.Lock()
+
+
+def plugin_paths():
+    return [
+        os.path.join(PROC_DIR, f) for f in sorted(os.listdir(PROC_DIR))
+        if f.endswith(".py") and not f.startswith("_")
+    ]
+
+
+def load_plugin(path):
+    """
+    Import a processing module, reusing the loaded one until its file
+    changes, so what a plugin keeps in memory (e.g. CNN weights) is loaded
+    once per process instead of on every run.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    with _lock:
+        hit = _modules.get(path)
+        if hit and hit[0] == mtime:
+            return hit[1]
+        name = os.path.splitext(os.path.basename(path))[0]
+        with span("plugin_load", name):
+            spec = importlib.util.spec_from_file_location(name, path)
+            mod = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(mod)
+        _modules[path] = (mtime, mod)
+        return mod
+
+
+def _not_loaded(*args, **kwargs):
+    raise RuntimeError("plugin described but not imported; it runs in the sandbox")
+
+
+def _describe(path):
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    desc = types.SimpleNamespace(__file__=path, __name__=name)
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name in FUNCTIONS:
+            setattr(desc, node.name, _not_loaded)
+            continue
+        if isinstance(node, ast.Assign) and len(node.targets) == 1:
+            target, value = node.targets[0], node.value
+        elif isinstance(node, ast.AnnAssign) and node.value is not None:
+            target, value = node.target, node.value
+        else:
+            continue
+        if not isinstance(target, ast.Name) or not target.id.isupper():
+            continue
+        try:
+            setattr(desc, target.id, ast.literal_eval(value))
+        except (ValueError, TypeError, SyntaxError, RecursionError):
+            if target.id in CONTRACT:
+                return None
+    return desc
+
+
+def describe_plugin(path):
+    """A namespace with the plugin's literal constants and function names, or None."""
+    mtime = os.stat(path).st_mtime_ns
+    with _lock:
+        hit = _described.get(path)
+        if hit and hit[0] == mtime:
+            return hit[1]
+    try:
+        desc = _describe(path)
+    except (SyntaxError, UnicodeDecodeError):
+        desc = None
+    with _lock:
+        _described[path] = (mtime, desc)
+    return desc
@@ -0,0 +1,296 @@
+# ~/librecorder/Software/WebApp/retention.py
+"""
+Retention policies and bulk purging of old cases.
+
+A policy (models.RetentionPolicy) selects cases by age and, optionally,
+domain, level and tag:
+  {"name": "unanalyzed-90d", "max_age_days": 90, "level": "Not Analyzed"}
+  {"name": "training-1y", "max_age_days": 365, "tag": "training", "archive": true}
+A case matches when it was created more than max_age_days ago and every
+other field that is set matches. Cases tagged "retain" (HOLD_TAG) are
+never deleted by a policy.
+
+  report()                                   what a sweep would delete (dry run)
+  sweep(storage, upload_dir, archive_dir)    delete the matching cases
+  purge_cases(storage, upload_dir, case_ids, archive_dir=None)
+
+Cases are purged in batches of LIBRECORDER_RETENTION_BATCH: the rows of a
+batch are deleted with one statement per table and committed together,
+then the blobs no longer used and the case directories are removed (a
+batch that fails to commit keeps all its files) at no more than
+LIBRECORDER_RETENTION_MAX_MB_S, with a pause between batches, so a large
+sweep does not take the disk away from uploads and model runs. A policy
+with archive writes each case to <archive_dir>/<case_id>.tar.gz (the
+export.py bundle) first; a case whose archive fails is kept.
+
+Each web process runs a sweeper thread every LIBRECORDER_RETENTION_INTERVAL
+seconds (0, the default, turns it off). The processes take turns on a
+file lock and skip a sweep another one has just done.
+
+  python retention.py report
+  python retention.py sweep
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from models import db, Blob, Case, CaseFile, CaseTag, ImageResult, RetentionPolicy, TestResult
+from case_meta import filter_cases
+from blobstore import ensure_case_local, release_case, delete_blobs
+from export import stream_case
+from search_index import remove_case
+from events import broker
+from metrics import CASES_PURGED
+
+INTERVAL = float(os.environ.get("LIBRECORDER_RETENTION_INTERVAL", 0))
+BATCH = int(os.environ.get("LIBRECORDER_RETENTION_BATCH", 50))
+MAX_MB_S = float(os.environ.get("LIBRECORDER_RETENTION_MAX_MB_S", 50))
+BATCH_PAUSE = float(os.environ.get("LIBRECORDER_RETENTION_PAUSE", 1.0))
+HOLD_TAG = "retain"
+REPORT_SAMPLE = 20              # case ids listed per policy in a report
+
+log = logging.getLogger(__name__)
+
+
+# ----------------------------
+# Policies
+# ----------------------------
+def policy_json(p):
+    return {
+        "name": p.name,
+        "max_age_days": p.max_age_days,
+        "domain": p.domain,
+        "level": p.level,
+        "tag": p.tag,
+        "archive": p.archive,
+        "enabled": p.enabled,
+    }
+
+
+def save_policy(data):
+    """Create or update (by name) a policy from a dict; raises ValueError. Does not commit."""
+    name = str(data.get("name") or "").strip()[:64]
+    if not name:
+        raise ValueError("name is required")
+    try:
+        days = int(data["max_age_days"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("max_age_days must be an integer")
+    if days < 1:
+        raise ValueError("max_age_days must be at least 1")
+
+    p = RetentionPolicy.query.filter_by(name=name).first()
+    if p is None:
+        p = RetentionPolicy(name=name)
+        db.session.add(p)
+    p.max_age_days = days
+    p.domain = str(data["domain"])[:32] if data.get("domain") else None
+    p.level = str(data["level"])[:32] if data.get("level") else None
+    p.tag = str(data["tag"])[:64] if data.get("tag") else None
+    p.archive = bool(data.get("archive", False))
+    p.enabled = bool(data.get("enabled", True))
+    return p
+
+
+def enabled_policies(name=None):
+    q = RetentionPolicy.query.filter_by(enabled=True)
+    if name:
+        q = q.filter_by(name=name)
+    return q.order_by(RetentionPolicy.id).all()
+
+
+def matching_cases(policy, now=None):
+    """A select of the ids of the cases a policy would delete, oldest first."""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=policy.max_age_days)
+    held = db.select(CaseTag.case_id).where(CaseTag.tag == HOLD_TAG)
+    q = db.select(Case.case_id).where(Case.created_at < cutoff, Case.case_id.not_in(held))
+    return filter_cases(q, policy.domain, policy.level, policy.tag).order_by(Case.created_at)
+
+
+def report(name=None, now=None):
+    """Per policy: the number of matching cases, their stored bytes and a sample of ids."""
+    out = []
+    for p in enabled_policies(name):
+        ids = matching_cases(p, now)
+        count = db.session.scalar(db.select(db.func.count()).select_from(ids.subquery()))
+        size = db.session.query(db.func.sum(Blob.size)).select_from(CaseFile).join(
+            Blob, Blob.sha256 == CaseFile.sha256
+        ).filter(CaseFile.case_id.in_(ids.order_by(None))).scalar()
+        out.append({
+            **policy_json(p),
+            "cases": count,
+            "bytes": size or 0,
+            "sample": db.session.scalars(ids.limit(REPORT_SAMPLE)).all(),
+        })
+    return out
+
+
+# ----------------------------
+# Purging
+# ----------------------------
+class Throttle:
+    """Sleeps as needed to keep the bytes spent under a rate (bytes per second)."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.started = time.monotonic()
+        self.spent = 0
+
+    def spend(self, n):
+        if not self.rate:
+            return
+        self.spent += n
+        ahead = self.spent / self.rate - (time.monotonic() - self.started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+def _remove_tree(path, throttle):
+    """shutil.rmtree(path, ignore_errors=True), one file at a time through throttle."""
+    for root, dirs, files in os.walk(path, topdown=False):
+        for name in files:
+            fpath = os.path.join(root, name)
+            try:
+                size = os.path.getsize(fpath)
+                os.remove(fpath)
+            except OSError:
+                continue
+            throttle.spend(size)
+        for name in dirs:
+            try:
+                os.rmdir(os.path.join(root, name))
+            except OSError:
+                pass
+    try:
+        os.rmdir(path)
+    except OSError:
+        pass
+
+
+def archive_case(storage, upload_dir, case_id, archive_dir):
+    """Write <archive_dir>/<case_id>.tar.gz; returns its path."""
+    ensure_case_local(storage, upload_dir, case_id)
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{case_id}.tar.gz")
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            for chunk in stream_case(os.path.join(upload_dir, case_id), case_id, "tar.gz"):
+                f.write(chunk)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+
+def purge_cases(storage, upload_dir, case_ids, archive_dir=None, policy="",
+                batch=BATCH, max_mb_s=MAX_MB_S, pause=BATCH_PAUSE):
+    """
+    Delete cases (rows, search index, blobs no longer referenced and the
+    case directories) in batches. With archive_dir each case is archived
+    first. Returns {"purged", "archived", "freed_bytes", "errors"}.
+    """
+    throttle = Throttle(max_mb_s * 1024 * 1024)
+    out = {"purged": 0, "archived": 0, "freed_bytes": 0, "errors": {}}
+    case_ids = list(case_ids)
+    for start in range(0, len(case_ids), batch):
+        if start:
+            time.sleep(pause)
+        ids = case_ids[start:start + batch]
+        if archive_dir:
+            kept = []
+            for case_id in ids:
+                try:
+                    archive_case(storage, upload_dir, case_id, archive_dir)
+                    kept.append(case_id)
+                except Exception as e:
+                    out["errors"][case_id] = f"archive failed: {e}"
+            out["archived"] += len(kept)
+            ids = kept
+
+        orphans = []
+        try:
+            for case_id in ids:
+                orphans += release_case(case_id)
+                remove_case(case_id)
+            for model in (TestResult, ImageResult, CaseTag, Case):
+                model.query.filter(model.case_id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            out["errors"].update({case_id: str(e) for case_id in ids})
+            continue
+        # only once the rows are gone for good
+        out["freed_bytes"] += delete_blobs(storage, orphans)
+
+        for case_id in ids:
+            _remove_tree(os.path.join(upload_dir, case_id), throttle)
+            broker.publish("case_deleted", case_id=case_id)
+        CASES_PURGED.inc(len(ids), policy=policy)
+        out["purged"] += len(ids)
+    return out
+
+
+def sweep(storage, upload_dir, archive_dir, name=None, dry_run=False, now=None):
+    """
+    Apply the enabled policies (or only the one named). With dry_run it
+    only reports. Returns {policy name: result}.
+    """
+    if dry_run:
+        return {r["name"]: r for r in report(name, now)}
+    out = {}
+    for p in enabled_policies(name):
+        ids = db.session.scalars(matching_cases(p, now)).all()
+        out[p.name] = purge_cases(storage, upload_dir, ids, archive_dir if p.archive else None, policy=p.name)
+        out[p.name]["matched"] = len(ids)
+    broker.publish("retention_sweep", policies=out)
+    return out
+
+
+# ----------------------------
+# Sweeper thread
+# ----------------------------
+def start_sweeper(app, storage, upload_dir, archive_dir, lock, interval=INTERVAL):
+    """
+    Sweep every interval seconds in a daemon thread. lock is a
+    locks.FileLock shared by the worker processes; a stamp file next to it
+    records the last sweep, so the others skip theirs.
+    """
+    if interval <= 0:
+        return None
+    stamp = lock.path + ".last"
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                with lock:
+                    if os.path.exists(stamp) and time.time() - os.path.getmtime(stamp) < interval / 2:
+                        continue
+                    with app.app_context():
+                        sweep(storage, upload_dir, archive_dir)
+                    with open(stamp, "w") as f:
+                        f.write(datetime.utcnow().isoformat())
+            except Exception:
+                log.exception("retention sweep failed")
+
+    t = threading.Thread(target=loop, name="retention-sweeper", daemon=True)
+    t.start()
+    return t
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] not in (["report"], ["sweep"]):
+        sys.exit("usage: python retention.py report|sweep")
+    from app import app, storage, UPLOAD_DIR, ARCHIVE_DIR
+
+    with app.app_context():
+        if sys.argv[1] == "report":
+            print(json.dumps(report(), indent=2))
+        else:
+            print(json.dumps(sweep(storage, UPLOAD_DIR, ARCHIVE_DIR), indent=2))
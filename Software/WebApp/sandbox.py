@@ -0,0 +1,321 @@
+# ~/librecorder/Software/WebApp/sandbox.py
+"""
+Run processing plugins in supervised worker processes.
+
+A plugin that hangs on a corrupt image, leaks memory or crashes the
+interpreter (a segfault in a native decoder, the OOM killer) then only
+costs that image: the worker is killed or replaced and the image gets an
+error entry, while the web process carries on with the next one.
+
+  run_plugin(mod, image_path, tile=None, segment=None)   one model, one image
+  run_file_sandboxed(order, modules, image_path)          a pipeline step (pipeline.run_file)
+
+Each web process keeps a small pool of workers (`python sandbox.py`),
+talking pickled tasks and replies over stdin/stdout. A worker
+  - gets LIBRECORDER_SANDBOX_TIMEOUT seconds per image, then it is killed,
+  - is killed when its RSS goes above LIBRECORDER_SANDBOX_MAX_RSS_MB
+    (checked while it runs, Linux only),
+  - is replaced after LIBRECORDER_SANDBOX_MAX_TASKS images,
+  - is restarted on the next image after it dies.
+Workers import plugins themselves and keep them loaded between images.
+
+LIBRECORDER_SANDBOX=0 runs plugins in the web process instead (debugging).
+"""
+import atexit
+import importlib.util
+import os
+import pickle
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+from metrics import SANDBOX_RESTARTS
+
+ENABLED = os.environ.get("LIBRECORDER_SANDBOX", "1") not in ("0", "false", "no")
+POOL_SIZE = int(os.environ.get("LIBRECORDER_SANDBOX_WORKERS", 2))
+TIMEOUT = float(os.environ.get("LIBRECORDER_SANDBOX_TIMEOUT", 120))
+MAX_RSS = int(float(os.environ.get("LIBRECORDER_SANDBOX_MAX_RSS_MB", 4096)) * 1024 * 1024)
+MAX_TASKS = int(os.environ.get("LIBRECORDER_SANDBOX_MAX_TASKS", 500))
+CHECK_SECONDS = 0.5           # how often a running worker's memory is checked
+WARM_TIMEOUT = 600            # seconds for a new worker to load every plugin
+
+
+class SandboxError(Exception):
+    """A plugin failed on an image; reason is "error", "timeout", "memory" or "crash"."""
+
+    def __init__(self, message, reason="error"):
+        super().__init__(message)
+        self.reason = reason
+
+
+def _rss(pid):
+    """Resident memory of a process in bytes, or None where /proc is not available."""
+    try:
+        with open(f"/proc/{pid}/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+# ----------------------------
+# Web process side
+# ----------------------------
+class Worker:
+    def __init__(self):
+        self.proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        )
+        self.tasks = 0
+        self.rss = None
+        self._replies = queue.Queue()
+        threading.Thread(target=self._read, name="sandbox-reader", daemon=True).start()
+
+    def _read(self):
+        try:
+            while True:
+                self._replies.put(pickle.load(self.proc.stdout))
+        except Exception:
+            self._replies.put(None)  # the worker exited
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def call(self, task, timeout=TIMEOUT, max_rss=MAX_RSS):
+        """Send one task and wait for its reply; raises SandboxError if the worker fails."""
+        try:
+            pickle.dump(task, self.proc.stdin)
+            self.proc.stdin.flush()
+        except OSError:
+            raise SandboxError(f"plugin worker exited (code {self.proc.poll()})", "crash")
+
+        deadline = time.monotonic() + timeout
+        while True:
+            left = deadline - time.monotonic()
+            try:
+                reply = self._replies.get(timeout=max(0, min(CHECK_SECONDS, left)))
+            except queue.Empty:
+                if left <= 0:
+                    self.kill()
+                    raise SandboxError(f"timed out after {timeout:g}s", "timeout")
+                rss = _rss(self.proc.pid)
+                if max_rss and rss and rss > max_rss:
+                    self.kill()
+                    raise SandboxError(f"memory limit exceeded ({rss // (1024 * 1024)} MB)", "memory")
+                continue
+            if reply is None:
+                code = self.proc.wait()
+                raise SandboxError(f"plugin worker crashed (exit code {code})", "crash")
+            self.tasks += 1
+            self.rss = reply.get("rss")
+            return reply
+
+    def kill(self):
+        if self.alive():
+            self.proc.kill()
+        self.proc.wait()
+
+    def stop(self):
+        """Ask the worker to exit after its current task (EOF on stdin)."""
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+
+
+class SandboxPool:
+    def __init__(self, size=POOL_SIZE, timeout=TIMEOUT, max_rss=MAX_RSS, max_tasks=MAX_TASKS):
+        self.timeout = timeout
+        self.max_rss = max_rss
+        self.max_tasks = max_tasks
+        self.size = size
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+
+    def _take(self):
+        while True:
+            try:
+                w = self._idle.get_nowait()
+            except queue.Empty:
+                return Worker()
+            if w.alive():
+                return w
+            SANDBOX_RESTARTS.inc(reason="crash")  # died while idle
+
+    def call(self, task):
+        """Run a task in a worker and return its result; plugin errors raise SandboxError too."""
+        with self._slots:
+            w = self._take()
+            try:
+                reply = w.call(task, self.timeout, self.max_rss)
+            except SandboxError as e:
+                w.kill()
+                SANDBOX_RESTARTS.inc(reason=e.reason)
+                raise
+            if w.tasks >= self.max_tasks or (self.max_rss and w.rss and w.rss > self.max_rss):
+                w.stop()  # recycled: leaked memory goes with the process
+                SANDBOX_RESTARTS.inc(reason="recycled")
+            else:
+                self._idle.put(w)
+        if not reply["ok"]:
+            raise SandboxError(reply["error"])
+        return reply["result"]
+
+    def warm(self, paths):
+        """Start the workers and have them load the plugins before the first image."""
+        task = {"kind": "warm", "plugins": list(paths)}
+        errors = {}
+        for _ in range(self.size - self._idle.qsize()):
+            with self._slots:
+                w = Worker()
+                try:
+                    errors = w.call(task, max(self.timeout, WARM_TIMEOUT), self.max_rss)["result"]
+                except SandboxError as e:
+                    w.kill()
+                    SANDBOX_RESTARTS.inc(reason=e.reason)
+                    return {"sandbox": str(e)}
+                self._idle.put(w)
+        return errors
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                return
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """This process's pool (a forked web worker gets its own)."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = SandboxPool()
+            _pool_pid = os.getpid()
+        return _pool
+
+
+@atexit.register
+def _close_pool():
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.close()
+
+
+def run_plugin(mod, image_path, tile=None, segment=None):
+    """
+    Run one plugin on one image: run(), or run_tiled() with tile=(size,
+    overlap, batch), or run_segmented() with segment=options.
+    """
+    task = {"kind": "run", "plugin": mod.__file__, "image": image_path, "tile": tile, "segment": segment}
+    if not ENABLED:
+        return _execute(task, {mod.__file__: mod})
+    return get_pool().call(task)
+
+
+def warm_sandbox(plugin_paths):
+    """Start this process's plugin workers with the plugins loaded (see app.warm_up_plugins)."""
+    return get_pool().warm(plugin_paths)
+
+
+def run_file_sandboxed(order, modules, image_path):
+    """pipeline.run_file() in a worker; a crash or timeout fails every model for the image."""
+    from pipeline import run_file
+    if not ENABLED:
+        return run_file(order, modules, image_path)
+    task = {
+        "kind": "pipeline",
+        "order": order,
+        "plugins": {mid: mod.__file__ for mid, mod in modules.items()},
+        "image": image_path,
+    }
+    try:
+        return get_pool().call(task)
+    except SandboxError as e:
+        fname = os.path.basename(image_path)
+        return {mid: {"file": fname, "error": str(e)} for mid, _ in order}
+
+
+# ----------------------------
+# Worker process side
+# ----------------------------
+_loaded = {}    # plugin path -> (mtime_ns, module)
+
+
+def _load(path):
+    mtime = os.stat(path).st_mtime_ns
+    hit = _loaded.get(path)
+    if hit and hit[0] == mtime:
+        return hit[1]
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    _loaded[path] = (mtime, mod)
+    return mod
+
+
+def _execute(task, modules=None):
+    load = (lambda p: modules[p]) if modules else _load
+    if task["kind"] == "run":
+        mod = load(task["plugin"])
+        if task["tile"]:
+            from tiling import run_tiled
+            return run_tiled(mod, task["image"], *task["tile"])
+        if task["segment"]:
+            from segmentation import run_segmented
+            return run_segmented(mod, task["image"], **task["segment"])
+        return mod.run(task["image"])
+    if task["kind"] == "warm":
+        errors = {}
+        for path in task["plugins"]:
+            try:
+                mod = load(path)
+                if hasattr(mod, "warm_up"):
+                    mod.warm_up()
+            except Exception as e:
+                errors[os.path.basename(path)] = str(e)
+        return errors
+    if task["kind"] == "pipeline":
+        from pipeline import run_file
+        modules = {mid: load(path) for mid, path in task["plugins"].items()}
+        return run_file(task["order"], modules, task["image"])
+    raise ValueError(f"unknown task kind '{task['kind']}'")
+
+
+def _serve():
+    # replies go to the real stdout; anything a plugin prints goes to stderr
+    out = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+    inp = sys.stdin.buffer
+
+    while True:
+        try:
+            task = pickle.load(inp)
+        except EOFError:
+            return
+        try:
+            reply = {"ok": True, "result": _execute(task)}
+        except Exception as e:
+            reply = {"ok": False, "error": str(e) or type(e).__name__}
+        reply["rss"] = _rss(os.getpid())
+        try:
+            data = pickle.dumps(reply)
+        except Exception as e:
+            data = pickle.dumps({"ok": False, "error": f"result could not be returned: {e}", "rss": reply["rss"]})
+        try:
+            out.write(data)
+            out.flush()
+        except BrokenPipeError:
+            return  # the web process went away
+
+
+if __name__ == "__main__":
+    _serve()
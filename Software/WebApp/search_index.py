@@ -0,0 +1,178 @@
+# ~/librecorder/Software/WebApp/search_index.py
+"""
+Full-text search over cases with an SQLite FTS5 table (case_search).
+
+One row per case for its metadata (case id, description, tags, notes
+field) and one row per uploaded .txt note, so a hit can point at the note
+that matched. Rows are written when a case is created, its metadata is
+saved or a note is uploaded, and removed when the case is purged.
+
+FTS5 columns are not indexed for equality lookups, so case_search_doc
+maps (case_id, source) to the FTS rowid; updates and deletes go by rowid.
+Neither table is part of the SQLAlchemy models; they are created (and
+filled from existing cases and notes) by init_search_index(), from
+app.init_db().
+"""
+import os
+import re
+
+from models import db, Case
+from case_meta import tags_by_case
+
+NOTE_EXTENSIONS = (".txt",)
+NOTE_MAX_BYTES = 1024 * 1024     # only the first 1 MB of a note is indexed
+META_SOURCE = ""                 # "source" of the metadata row; notes use their filename
+
+# bm25 weights: case_id, source, description, tags, body
+_WEIGHTS = "4.0, 0.0, 3.0, 5.0, 1.0"
+
+_available = None
+
+
+def fts5_available():
+    """Whether the index exists; checked once when init_search_index() has not run in this process."""
+    global _available
+    if _available is None:
+        _available = db.session.get_bind().dialect.name == "sqlite" and db.session.execute(db.text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'case_search'"
+        )).first() is not None
+    return _available
+
+
+def init_search_index(upload_dir):
+    """Create the FTS5 table if missing, filling it from existing cases. Returns False without FTS5 (or SQLite)."""
+    global _available
+    if db.session.get_bind().dialect.name != "sqlite":
+        _available = False  # FTS5 is SQLite's; /search is off on a shared server database
+        return False
+    exists = db.session.execute(db.text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'case_search'"
+    )).first()
+    if not exists:
+        try:
+            db.session.execute(db.text(
+                "CREATE VIRTUAL TABLE case_search USING fts5("
+                "case_id, source UNINDEXED, description, tags, body, "
+                "tokenize = 'porter unicode61')"
+            ))
+        except Exception:
+            db.session.rollback()
+            _available = False
+            return False
+        db.session.execute(db.text(
+            "CREATE TABLE IF NOT EXISTS case_search_doc ("
+            "id INTEGER PRIMARY KEY, case_id TEXT NOT NULL, source TEXT NOT NULL, "
+            "UNIQUE (case_id, source))"
+        ))
+    _available = True
+    if not exists:
+        reindex_all(upload_dir)
+    db.session.commit()
+    return True
+
+
+def _read_note(path):
+    with open(path, "rb") as f:
+        return f.read(NOTE_MAX_BYTES).decode("utf-8", errors="replace")
+
+
+def _write_row(case_id, source, description, tags, body):
+    """Replace the FTS row for (case_id, source). Does not commit."""
+    key = {"case_id": case_id, "source": source}
+    db.session.execute(db.text(
+        "INSERT OR IGNORE INTO case_search_doc (case_id, source) VALUES (:case_id, :source)"
+    ), key)
+    rowid = db.session.execute(db.text(
+        "SELECT id FROM case_search_doc WHERE case_id = :case_id AND source = :source"
+    ), key).scalar()
+    db.session.execute(db.text("DELETE FROM case_search WHERE rowid = :rowid"), {"rowid": rowid})
+    db.session.execute(
+        db.text("INSERT INTO case_search (rowid, case_id, source, description, tags, body) "
+                "VALUES (:rowid, :case_id, :source, :description, :tags, :body)"),
+        {"rowid": rowid, **key, "description": description, "tags": tags, "body": body},
+    )
+
+
+def index_meta(c, tags):
+    """(Re)write the metadata row of a case. Does not commit."""
+    if fts5_available():
+        _write_row(c.case_id, META_SOURCE, c.description or "", " ".join(tags or []), c.notes or "")
+
+
+def index_note(case_id, path):
+    """(Re)write the row of one uploaded note file. Does not commit."""
+    if fts5_available() and path.lower().endswith(NOTE_EXTENSIONS):
+        _write_row(case_id, os.path.basename(path), "", "", _read_note(path))
+
+
+def remove_case(case_id):
+    """Does not commit."""
+    if not fts5_available():
+        return
+    key = {"case_id": case_id}
+    db.session.execute(db.text(
+        "DELETE FROM case_search WHERE rowid IN "
+        "(SELECT id FROM case_search_doc WHERE case_id = :case_id)"
+    ), key)
+    db.session.execute(db.text("DELETE FROM case_search_doc WHERE case_id = :case_id"), key)
+
+
+def reindex_all(upload_dir):
+    """Rebuild the whole index from the cases table and note files. Does not commit."""
+    if not fts5_available():
+        return
+    db.session.execute(db.text("DELETE FROM case_search"))
+    db.session.execute(db.text("DELETE FROM case_search_doc"))
+    tags = tags_by_case()
+    for c in Case.query.yield_per(500):
+        index_meta(c, tags.get(c.case_id, []))
+        case_dir = os.path.join(upload_dir, c.case_id)
+        if not os.path.isdir(case_dir):
+            continue
+        for fname in os.listdir(case_dir):
+            if fname.lower().endswith(NOTE_EXTENSIONS):
+                try:
+                    index_note(c.case_id, os.path.join(case_dir, fname))
+                except OSError:
+                    pass
+
+
+def match_query(q):
+    """
+    Turn free text into an FTS5 query: every word must match, as a prefix,
+    so FTS syntax characters in user input cannot cause errors.
+    """
+    words = re.findall(r"\w+", q or "")
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def search_cases(q, limit=50, offset=0):
+    """
+    Cases matching q, best first:
+    [{"case_id", "score", "source", "snippet"}, ...]
+    score is the bm25 rank (lower is better).
+    source is "" for a metadata hit or the note filename.
+    """
+    match = match_query(q)
+    if not match:
+        return []
+    rows = db.session.execute(db.text(
+        "SELECT case_id, source, score, snippet FROM ("
+        f"  SELECT case_id, source, bm25(case_search, {_WEIGHTS}) AS score,"
+        "         snippet(case_search, -1, '[', ']', '...', 12) AS snippet"
+        "  FROM case_search WHERE case_search MATCH :match"
+        ") ORDER BY score"
+    ), {"match": match})
+
+    # best row per case; rows arrive best first
+    seen, out = set(), []
+    for case_id, source, score, snippet in rows:
+        if case_id in seen:
+            continue
+        seen.add(case_id)
+        if len(seen) <= offset:
+            continue
+        out.append({"case_id": case_id, "score": score, "source": source, "snippet": snippet})
+        if len(out) >= limit:
+            break
+    return out
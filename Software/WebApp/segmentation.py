@@ -0,0 +1,127 @@
+# ~/librecorder/Software/WebApp/segmentation.py
+"""
+Cell segmentation stage for smear / field images.
+
+Instead of classifying a whole field as one image, cells are found with
+classical thresholding (Otsu on a blurred grayscale image + connected
+components), cropped, and sent to a model's run_batch(arrays) in batches.
+
+A model used here should define run_batch(arrays). It may also define:
+  INPUT_SIZE = (w, h)       crops are resized to this before run_batch
+  POSITIVE_CLASS = "..."    enables the parasitemia figure in the result
+"""
+import cv2
+import numpy as np
+
+DEFAULT_BATCH_SIZE = 256
+
+# Components far from the typical cell size are debris or clumps.
+MIN_AREA_FRACTION = 0.3
+MAX_AREA_FRACTION = 3.0
+
+
+def segment_options(opts):
+    """
+    Normalize the "segment" option of a /run_model request.
+    Accepts True or a dict: {"min_area", "max_area", "batch", "per_cell"}
+    """
+    opts = opts if isinstance(opts, dict) else {}
+    min_area = opts.get("min_area")
+    max_area = opts.get("max_area")
+    out = {
+        "min_area": int(min_area) if min_area is not None else None,
+        "max_area": int(max_area) if max_area is not None else None,
+        "batch": int(opts.get("batch", DEFAULT_BATCH_SIZE)),
+        "per_cell": bool(opts.get("per_cell", True)),
+    }
+    if out["batch"] <= 0:
+        raise ValueError("batch must be positive")
+    return out
+
+
+def find_cells(rgb, min_area=None, max_area=None):
+    """
+    Return an (N, 4) int array of cell boxes (x, y, w, h) in an RGB array.
+    If no area limits are given they are derived from the median component.
+    """
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    gray = cv2.GaussianBlur(gray, (5, 5), 0)
+    # stained cells are darker than the background
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+
+    n, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    stats = stats[1:]  # drop background
+    if len(stats) == 0:
+        return np.empty((0, 4), dtype=np.int64)
+
+    areas = stats[:, cv2.CC_STAT_AREA]
+    if min_area is None or max_area is None:
+        median = float(np.median(areas[areas >= 16])) if np.any(areas >= 16) else 0.0
+        if min_area is None:
+            min_area = max(16, int(median * MIN_AREA_FRACTION))
+        if max_area is None:
+            max_area = int(median * MAX_AREA_FRACTION) if median else areas.max()
+
+    keep = (areas >= min_area) & (areas <= max_area)
+    return stats[keep, :4].astype(np.int64)
+
+
+def crop_cells(rgb, boxes, size=None):
+    """
+    Cut a square crop centred on each box (clipped to the image).
+    If size=(w, h) is given every crop is resized to it.
+    """
+    h_img, w_img = rgb.shape[:2]
+    x, y, w, h = boxes.T
+    side = np.maximum(w, h)
+    x0 = np.clip(x + w // 2 - side // 2, 0, None)
+    y0 = np.clip(y + h // 2 - side // 2, 0, None)
+    x1 = np.minimum(x0 + side, w_img)
+    y1 = np.minimum(y0 + side, h_img)
+
+    crops = []
+    for a, b, c, d in zip(x0, y0, x1, y1):
+        crop = rgb[b:d, a:c]
+        if size is not None:
+            crop = cv2.resize(crop, tuple(size), interpolation=cv2.INTER_AREA)
+        crops.append(np.ascontiguousarray(crop))
+    return crops
+
+
+def run_segmented(mod, image_path, min_area=None, max_area=None,
+                  batch=DEFAULT_BATCH_SIZE, per_cell=True):
+    """Segment one field image and classify every cell with mod.run_batch."""
+    bgr = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    if bgr is None:
+        raise ValueError(f"Unable to read image: {image_path}")
+    rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+    del bgr
+
+    boxes = find_cells(rgb, min_area, max_area)
+    crops = crop_cells(rgb, boxes, getattr(mod, "INPUT_SIZE", None))
+
+    results = []
+    for i in range(0, len(crops), batch):
+        results.extend(mod.run_batch(crops[i:i + batch]))
+
+    return aggregate_cells(boxes, results, getattr(mod, "POSITIVE_CLASS", None), per_cell)
+
+
+def aggregate_cells(boxes, results, positive_class=None, per_cell=True):
+    counts = {}
+    for r in results:
+        c = r.get("classification") if isinstance(r, dict) else None
+        if c is not None:
+            counts[c] = counts.get(c, 0) + 1
+
+    out = {"cells": len(results), "cell_class_counts": counts}
+    if positive_class is not None:
+        out["positive_class"] = positive_class
+        out["parasitemia"] = round(counts.get(positive_class, 0) / len(results), 6) if results else 0.0
+    if per_cell:
+        out["per_cell"] = [
+            {"box": [int(v) for v in box], **r}
+            for box, r in zip(boxes, results)
+        ]
+    return out
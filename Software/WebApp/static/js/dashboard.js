@@ -5,6 +5,10 @@
    - Two-panel row: Datasets + Models
    - Select dataset + select model + Run
    - Models are auto-discovered via GET /models (processing/*.py)
+   - Live updates (cases, result counts, run progress) via GET /events (SSE)
+   - Case metadata lives on the server (GET /cases, POST /meta/<case_id>);
+     domain / level / tag filtering is done server-side
+   - Search text goes to GET /search (full-text, ranked, includes .txt notes)
 */
 
 (() => {
@@ -90,6 +94,9 @@
   let selectedCaseId  = null;
   let selectedModelId = null;
 
+  let currentRunId = null; // run started from this tab, for progress events
+  let liveEvents   = false; // true while the /events stream is connected
+
   // --------- Persistence ----------
   function loadUI() {
     try {
@@ -111,39 +118,58 @@
     localStorage.setItem(STORE_KEY, JSON.stringify(ui));
   }
 
-  // Metadata per case (still localStorage for now)
-  function metaKey(caseId) {
-    return `lr_meta_${caseId}`;
-  }
-
-  function loadMeta(caseId) {
-    try {
-      const raw = localStorage.getItem(metaKey(caseId));
-      if (!raw) return null;
-      return JSON.parse(raw);
-    } catch {
-      return null;
-    }
+  // Metadata per case comes from the server with /cases (c.meta)
+  function caseMeta(caseObj) {
+    const m = caseObj.meta || {};
+    return {
+      domain: m.domain || "health",
+      level: m.level || "Not Analyzed",
+      state: m.state || "Intake",
+      description: m.description || caseObj.description || "",
+      tags: Array.isArray(m.tags) ? m.tags.join(", ") : (m.tags || ""),
+      notes: m.notes || ""
+    };
   }
 
-  function saveMeta(caseId, meta) {
-    localStorage.setItem(metaKey(caseId), JSON.stringify(meta));
+  async function saveMeta(caseId, meta) {
+    const r = await fetch(`/meta/${encodeURIComponent(caseId)}`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(meta)
+    });
+    const data = await r.json().catch(() => ({}));
+    if (!r.ok) throw new Error(data.error || `Save failed (${r.status})`);
+    return data.meta;
   }
 
-  function ensureDefaultMeta(caseObj) {
-    const existing = loadMeta(caseObj.case_id);
-    if (existing) return existing;
-
-    const meta = {
-      domain: ui.activeDomain,
-      level: ui.activeLevel,
-      state: "Intake",
-      description: caseObj.description || "",
-      tags: "",
-      notes: ""
-    };
-    saveMeta(caseObj.case_id, meta);
-    return meta;
+  // One-time move of metadata older versions kept in this browser's localStorage
+  async function migrateLocalMeta() {
+    const items = [];
+    const keys = [];
+    for (let i = 0; i < localStorage.length; i++) {
+      const key = localStorage.key(i);
+      if (!key || !key.startsWith("lr_meta_")) continue;
+      try {
+        items.push({ case_id: key.slice("lr_meta_".length), ...JSON.parse(localStorage.getItem(key)) });
+        keys.push(key);
+      } catch {
+        keys.push(key);
+      }
+    }
+    if (!keys.length) return;
+
+    // only cases the server still knows about
+    const known = new Set((await fetchCases({})).map(c => c.case_id));
+    const payload = items.filter(x => known.has(x.case_id));
+    if (payload.length) {
+      const r = await fetch("/meta", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(payload)
+      });
+      if (!r.ok) return; // keep local copies, try again next load
+    }
+    keys.forEach(k => localStorage.removeItem(k));
   }
 
   // --------- UI Helpers ----------
@@ -193,7 +219,7 @@
         saveUI();
         setBodyDomain(ui.activeDomain);
         setRunStatus("");
-        renderAll();
+        reloadCases();
       });
 
       domainTabsEl.appendChild(b);
@@ -214,13 +240,62 @@
         ui.activeLevel = level;
         saveUI();
         setRunStatus("");
-        renderAll();
+        reloadCases();
       });
 
       levelTabsEl.appendChild(b);
     });
   }
 
+  // "tag:xyz" in the search box is sent to the server as a tag filter
+  function searchTag(q) {
+    const m = /(?:^|\s)tag:(\S+)/i.exec(q || "");
+    return m ? m[1] : "";
+  }
+
+  function searchText(q) {
+    return (q || "").replace(/(?:^|\s)tag:\S+/ig, " ").trim();
+  }
+
+  function matchesFilters(caseObj) {
+    const meta = caseMeta(caseObj);
+    if (meta.domain !== ui.activeDomain || meta.level !== ui.activeLevel) return false;
+    const tag = searchTag(ui.search);
+    return !tag || (caseObj.meta?.tags || []).includes(tag);
+  }
+
+  // Ranked full-text hits for the current search text: Map(case_id -> hit),
+  // or null to fall back to matching what is loaded
+  let searchHits = null;
+  let searchSeq = 0;
+  let searchTimer = null;
+
+  async function runSearch() {
+    const q = searchText(ui.search);
+    const seq = ++searchSeq;
+    if (!q) {
+      searchHits = null;
+      renderDatasets();
+      return;
+    }
+    try {
+      const r = await fetch(`/search?${new URLSearchParams({ q, limit: 500 })}`);
+      if (!r.ok) throw new Error(`search failed (${r.status})`);
+      const data = await r.json();
+      if (seq !== searchSeq) return; // a newer search is on its way
+      searchHits = new Map(data.results.map(h => [h.case_id, h]));
+    } catch (e) {
+      console.error(e);
+      if (seq === searchSeq) searchHits = null;
+    }
+    renderDatasets();
+  }
+
+  function scheduleSearch() {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(runSearch, 200);
+  }
+
   function matchesSearch(caseObj, meta, q) {
     if (!q) return true;
     const hay = [
@@ -232,17 +307,6 @@
     return hay.includes(q.toLowerCase());
   }
 
-  async function getResultCount(caseId) {
-    try {
-      const r = await fetch(`/results/${encodeURIComponent(caseId)}`);
-      if (!r.ok) return 0;
-      const arr = await r.json();
-      return Array.isArray(arr) ? arr.length : 0;
-    } catch {
-      return 0;
-    }
-  }
-
   function renderModels() {
     if (!modelsListEl) return;
     modelsListEl.innerHTML = "";
@@ -290,18 +354,19 @@
     if (!datasetsListEl) return;
     datasetsListEl.innerHTML = "";
 
-    const q = (ui.search || "").trim();
+    // domain / level / tag are already filtered by the server
+    const q = searchText(ui.search);
     const visible = [];
 
     for (const c of allCases) {
-      const meta = ensureDefaultMeta(c);
+      const meta = caseMeta(c);
+      if (q && searchHits) {
+        if (!searchHits.has(c.case_id)) continue;
+      } else if (!matchesSearch(c, meta, q)) continue;
 
-      if (meta.domain !== ui.activeDomain) continue;
-      if (meta.level !== ui.activeLevel) continue;
-      if (!matchesSearch(c, meta, q)) continue;
-
-      visible.push({ c, meta });
+      visible.push({ c, meta, hit: searchHits?.get(c.case_id) });
     }
+    if (q && searchHits) visible.sort((a, b) => a.hit.score - b.hit.score);
 
     if (datasetsCountEl) datasetsCountEl.textContent = String(visible.length);
 
@@ -315,7 +380,7 @@
       if (emptyEl) emptyEl.style.display = "none";
     }
 
-    for (const { c, meta } of visible) {
+    for (const { c, meta, hit } of visible) {
       const card = document.createElement("div");
       card.className = "item-card dataset";
       card.setAttribute("data-case", c.case_id);
@@ -331,9 +396,10 @@
           <div class="item-lines">
             <div class="muted">${escapeHtml((meta.description || c.description || "—").trim())}</div>
             <div><span class="k">Created:</span> ${new Date(c.created_at).toLocaleString()}</div>
+            ${hit ? `<div class="muted">${hit.source ? `${escapeHtml(hit.source)}: ` : ""}${escapeHtml(hit.snippet)}</div>` : ``}
             <div class="meta-row">
               <span class="muted">${escapeHtml(meta.tags || "")}</span>
-              <span class="muted resCount">Results: …</span>
+              <span class="muted resCount">Results: ${Number(c.result_count) || 0}</span>
             </div>
           </div>
 
@@ -368,12 +434,6 @@
       }
 
       datasetsListEl.appendChild(card);
-
-      // fill result count async
-      getResultCount(c.case_id).then(n => {
-        const el = card.querySelector(".resCount");
-        if (el) el.textContent = `Results: ${n}`;
-      });
     }
 
     if (selectedDatasetLabelEl) selectedDatasetLabelEl.textContent = selectedCaseId || "None";
@@ -394,7 +454,7 @@
     const c = allCases.find(x => x.case_id === caseId);
     if (!c) return;
 
-    const meta = ensureDefaultMeta(c);
+    const meta = caseMeta(c);
 
     m_case.value = c.case_id;
     m_case.disabled = true;
@@ -437,7 +497,7 @@
   }
 
   if (btnSaveModal) {
-    btnSaveModal.addEventListener("click", () => {
+    btnSaveModal.addEventListener("click", async () => {
       const caseId = (m_case.value || "").trim();
       if (!caseId) {
         alert("Case ID is required. Upload a dataset first, or type an existing case id.");
@@ -453,10 +513,15 @@
         notes: (m_notes.value || "").trim()
       };
 
-      saveMeta(caseId, meta);
+      try {
+        await saveMeta(caseId, meta);
+      } catch (e) {
+        alert(e.message);
+        return;
+      }
       closeModal();
       setRunStatus("");
-      renderAll();
+      await reloadCases();
     });
   }
 
@@ -471,14 +536,20 @@
         btnRunModel.disabled = true;
         setRunStatus("Running…");
 
+        // progress for this run arrives on /events as run_progress
+        currentRunId = `run-${Date.now()}-${Math.random().toString(36).slice(2, 8)}`;
+
         const r = await fetch("/run_model", {
           method: "POST",
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify({
             case_id: selectedCaseId,
-            model_id: selectedModelId
+            model_id: selectedModelId,
+            run_id: currentRunId,
+            per_image: false
           })
         });
+        currentRunId = null;
 
         const data = await r.json().catch(() => ({}));
         if (!r.ok) {
@@ -497,8 +568,9 @@
           setRunStatus("Done.");
         }
 
-        // refresh dataset list so "Results: N" updates
-        renderDatasets();
+        // "Results: N" is updated by the result_logged event; without the
+        // event stream, refetch the case list instead
+        if (!liveEvents) await init();
         setRunEnabled();
       } catch (e) {
         console.error(e);
@@ -509,8 +581,13 @@
   }
 
   // --------- Data ----------
-  async function fetchCases() {
-    const r = await fetch("/cases");
+  async function fetchCases(filters) {
+    const params = new URLSearchParams(filters || {
+      domain: ui.activeDomain,
+      level: ui.activeLevel,
+      ...(searchTag(ui.search) ? { tag: searchTag(ui.search) } : {})
+    });
+    const r = await fetch(`/cases?${params}`);
     if (!r.ok) throw new Error("Failed to fetch /cases");
     const arr = await r.json();
     return Array.isArray(arr) ? arr : [];
@@ -523,6 +600,67 @@
     return Array.isArray(arr) ? arr : [];
   }
 
+  // --------- Live updates (SSE) ----------
+  function setResultCount(caseId, n) {
+    const card = datasetsListEl && datasetsListEl.querySelector(`[data-case="${CSS.escape(caseId)}"]`);
+    const el = card && card.querySelector(".resCount");
+    if (el) el.textContent = `Results: ${n}`;
+  }
+
+  function connectEvents() {
+    if (!window.EventSource) return;
+    const es = new EventSource("/events");
+
+    es.onopen = () => { liveEvents = true; };
+    es.onerror = () => { liveEvents = false; }; // EventSource reconnects by itself
+
+    const on = (type, fn) => es.addEventListener(type, (e) => {
+      try { fn(JSON.parse(e.data)); } catch (err) { console.error(err); }
+    });
+
+    on("case_created", ({ case: c }) => {
+      if (!c || allCases.some(x => x.case_id === c.case_id)) return;
+      if (!matchesFilters(c)) return;
+      allCases.push(c);
+      renderDatasets();
+    });
+
+    on("case_updated", ({ case_id, meta }) => {
+      if (!meta) return;
+      const c = allCases.find(x => x.case_id === case_id);
+      if (!c) {
+        // may have moved into the current view
+        if (matchesFilters({ case_id, meta })) reloadCases();
+        return;
+      }
+      c.meta = meta;
+      c.description = meta.description;
+      if (!matchesFilters(c)) allCases = allCases.filter(x => x !== c);
+      clearSelectionsIfMissing();
+      renderDatasets();
+    });
+
+    on("case_deleted", ({ case_id }) => {
+      const before = allCases.length;
+      allCases = allCases.filter(x => x.case_id !== case_id);
+      if (allCases.length === before) return;
+      clearSelectionsIfMissing();
+      renderDatasets();
+    });
+
+    on("result_logged", ({ case_id }) => {
+      const c = allCases.find(x => x.case_id === case_id);
+      if (!c) return;
+      c.result_count = (Number(c.result_count) || 0) + 1;
+      setResultCount(case_id, c.result_count);
+    });
+
+    on("run_progress", (p) => {
+      if (!currentRunId || p.run_id !== currentRunId) return;
+      setRunStatus(`Running… ${p.done}/${p.total}`);
+    });
+  }
+
   // --------- Events ----------
   if (btnRefresh) {
     btnRefresh.addEventListener("click", async () => {
@@ -533,10 +671,14 @@
   if (searchEl) {
     searchEl.value = ui.search || "";
     searchEl.addEventListener("input", () => {
+      const tagChanged = searchTag(searchEl.value) !== searchTag(ui.search);
+      const textChanged = searchText(searchEl.value) !== searchText(ui.search);
       ui.search = searchEl.value;
       saveUI();
       setRunStatus("");
-      renderAll();
+      if (tagChanged) reloadCases();
+      else renderAll();
+      if (textChanged) scheduleSearch();
     });
   }
 
@@ -570,6 +712,16 @@
   }
 
   // --------- Init ----------
+  async function reloadCases() {
+    try {
+      allCases = await fetchCases();
+      clearSelectionsIfMissing();
+      renderAll();
+    } catch (e) {
+      console.error(e);
+    }
+  }
+
   async function init() {
     try {
       // Fetch both in parallel
@@ -581,6 +733,7 @@
       clearSelectionsIfMissing();
 
       renderAll();
+      if (searchText(ui.search)) runSearch();
     } catch (e) {
       console.error(e);
       if (emptyEl) {
@@ -590,7 +743,8 @@
     }
   }
 
-  init();
+  migrateLocalMeta().catch(console.error).finally(init);
+  connectEvents();
 })();
 
 // Scroll hint (kept from your prior version)
@@ -0,0 +1,198 @@
+/* WebApp/static/js/render_case.js
+   Case page (/render/<case_id>)
+   - Images come from GET /cases/<case_id>/images a page at a time; the grid is
+     virtualized so only rows near the viewport are in the DOM, and <img> tags
+     load lazily
+   - Notes come from GET /cases/<case_id>/notes and are appended a page at a
+     time as the end of the list scrolls into view
+*/
+
+(() => {
+  const view = document.getElementById("caseView");
+  if (!view) return;
+
+  const caseId = view.dataset.caseId;
+  const base = `/cases/${encodeURIComponent(caseId)}`;
+
+  const IMAGE_PAGE = 120;
+  const NOTE_PAGE = 20;
+
+  // must match .grid / .vgrid in render_case.css
+  const MIN_COL = 260;
+  const GAP = 12;
+  const PAD = 14;
+  const OVERSCAN_ROWS = 3;
+
+  function escapeHtml(s) {
+    return String(s ?? "")
+      .replaceAll("&", "&amp;")
+      .replaceAll("<", "&lt;")
+      .replaceAll(">", "&gt;")
+      .replaceAll('"', "&quot;")
+      .replaceAll("'", "&#039;");
+  }
+
+  // --------- Images ----------
+  const grid = document.getElementById("imageGrid");
+  const win = document.getElementById("imageWindow");
+  const imageCount = Number(view.dataset.imageCount) || 0;
+
+  const images = new Array(imageCount); // filled in as pages arrive
+  const requested = new Set();          // pages loaded or loading
+  let rowH = 280;
+  let cols = 1;
+  let drawn = "";
+
+  async function loadImagePage(page) {
+    if (requested.has(page)) return;
+    requested.add(page);
+    try {
+      const r = await fetch(`${base}/images?offset=${page * IMAGE_PAGE}&limit=${IMAGE_PAGE}`);
+      if (!r.ok) throw new Error(`images failed (${r.status})`);
+      const data = await r.json();
+      data.items.forEach((item, i) => { images[data.offset + i] = item; });
+    } catch (e) {
+      console.error(e);
+      requested.delete(page); // try again on the next scroll
+      return;
+    }
+    drawn = "";
+    drawImages();
+  }
+
+  function imageCard(item) {
+    if (!item) return `<figure class="card placeholder"></figure>`;
+    const url = escapeHtml(item.url);
+    const name = escapeHtml(item.file);
+    return `
+      <figure class="card">
+        <a href="${url}" target="_blank" class="imglink">
+          <img src="${url}" alt="${name}" loading="lazy" decoding="async">
+        </a>
+        <figcaption>
+          <div class="fname">${name}</div>
+          <div class="links">
+            <a href="${url}" target="_blank">Open</a>
+            <a href="/process" onclick="return false;" class="mutedlink" title="Processing from UI can be added later">Process</a>
+          </div>
+        </figcaption>
+      </figure>`;
+  }
+
+  function layoutImages() {
+    rowH = parseFloat(getComputedStyle(grid).getPropertyValue("--row-h")) || rowH;
+    const inner = grid.clientWidth - 2 * PAD;
+    cols = Math.max(1, Math.floor((inner + GAP) / (MIN_COL + GAP)));
+    const rows = Math.ceil(imageCount / cols);
+    grid.style.height = `${rows * rowH - GAP + 2 * PAD}px`;
+    drawn = "";
+  }
+
+  function drawImages() {
+    const rect = grid.getBoundingClientRect();
+    const rows = Math.ceil(imageCount / cols);
+    const top = Math.max(0, -rect.top - PAD);
+    const bottom = Math.max(0, window.innerHeight - rect.top - PAD);
+    const first = Math.max(0, Math.floor(top / rowH) - OVERSCAN_ROWS);
+    const last = Math.min(rows, Math.ceil(bottom / rowH) + OVERSCAN_ROWS);
+
+    const key = `${first}:${last}:${cols}`;
+    if (key === drawn) return;
+    drawn = key;
+
+    const start = first * cols;
+    const end = Math.min(imageCount, last * cols);
+    if (end <= start) {
+      win.innerHTML = "";
+      return;
+    }
+
+    for (let p = Math.floor(start / IMAGE_PAGE); p <= Math.floor((end - 1) / IMAGE_PAGE); p++) {
+      loadImagePage(p);
+    }
+
+    const cards = [];
+    for (let i = start; i < end; i++) cards.push(imageCard(images[i]));
+    win.style.transform = `translateY(${first * rowH}px)`;
+    win.innerHTML = cards.join("");
+  }
+
+  if (grid && win && imageCount > 0) {
+    let frame = 0;
+    const schedule = () => {
+      if (frame) return;
+      frame = requestAnimationFrame(() => {
+        frame = 0;
+        drawImages();
+      });
+    };
+    window.addEventListener("scroll", schedule, { passive: true });
+    window.addEventListener("resize", () => {
+      layoutImages();
+      schedule();
+    });
+    layoutImages();
+    drawImages();
+  }
+
+  // --------- Notes ----------
+  const noteList = document.getElementById("noteList");
+  const noteMore = document.getElementById("noteMore");
+  const noteCount = Number(view.dataset.noteCount) || 0;
+  let notesLoaded = 0;
+  let notesBusy = false;
+
+  function noteCard(item) {
+    const url = escapeHtml(item.url);
+    const more = item.truncated
+      ? `\n\n… truncated, open the file for the rest`
+      : "";
+    return `
+      <div class="textcard">
+        <div class="texthead">
+          <div class="fname">${escapeHtml(item.file)}</div>
+          <a href="${url}" target="_blank">Open</a>
+        </div>
+        <pre>${escapeHtml(item.text + more)}</pre>
+      </div>`;
+  }
+
+  function nearViewport(el) {
+    return el.getBoundingClientRect().top < window.innerHeight + 600;
+  }
+
+  async function loadNotes() {
+    if (notesBusy || notesLoaded >= noteCount) return;
+    notesBusy = true;
+    try {
+      const r = await fetch(`${base}/notes?offset=${notesLoaded}&limit=${NOTE_PAGE}`);
+      if (!r.ok) throw new Error(`notes failed (${r.status})`);
+      const data = await r.json();
+      noteList.insertAdjacentHTML("beforeend", data.items.map(noteCard).join(""));
+      // files removed since the page was rendered: stop at what exists
+      notesLoaded = data.items.length ? notesLoaded + data.items.length : noteCount;
+    } catch (e) {
+      console.error(e);
+      noteMore.textContent = "Failed to load notes. Scroll to retry.";
+      return;
+    } finally {
+      notesBusy = false;
+    }
+
+    if (notesLoaded >= noteCount) {
+      noteMore.remove();
+      return;
+    }
+    noteMore.textContent = `${notesLoaded} of ${noteCount} loaded…`;
+    if (nearViewport(noteMore)) loadNotes();
+  }
+
+  if (noteList && noteMore && noteCount > 0) {
+    if ("IntersectionObserver" in window) {
+      new IntersectionObserver(entries => {
+        if (entries.some(e => e.isIntersecting)) loadNotes();
+      }, { rootMargin: "600px" }).observe(noteMore);
+    }
+    loadNotes();
+  }
+})();
@@ -0,0 +1,187 @@
+# ~/librecorder/Software/WebApp/storage.py
+"""
+Object storage for blob contents (see blobstore.py).
+
+  LocalStorage(root)   files under one directory (the default, uploads_blobs/)
+  S3Storage(bucket)    any S3-compatible service: AWS S3, MinIO, Ceph RGW, ...
+
+Both take keys like "ab/cd/abcd..." and stream data: writes go
+file -> object in parts, reads go object -> file or to a file-like body.
+Nothing is read fully into memory.
+
+S3 lets several app nodes share one image store. The nodes must also share
+the database (LIBRECORDER_DATABASE_URL, see app.py), which maps case files
+to blobs. Each node keeps its uploads/<case_id>/ working copies and fetches
+missing files from the store on demand (blobstore.ensure_case_local). Downloads are redirected
+to presigned URLs, so file bytes do not pass through the app.
+
+Configured from the environment by make_storage():
+  LIBRECORDER_STORAGE=s3                  (default: local)
+  LIBRECORDER_S3_BUCKET=librecorder
+  LIBRECORDER_S3_PREFIX=blobs/
+  LIBRECORDER_S3_ENDPOINT=http://localhost:9000   (MinIO or another stand-in)
+  LIBRECORDER_S3_PRESIGN=0                (stream through the app instead,
+                                           when browsers cannot reach the store)
+Credentials and region come from the usual AWS_* variables. boto3 is only
+needed for S3.
+"""
+import os
+import shutil
+import uuid
+
+PRESIGN_SECONDS = 3600
+
+
+class StorageError(Exception):
+    pass
+
+
+class LocalStorage:
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise StorageError(f"bad key: {key}")
+        return path
+
+    def local_path(self, key):
+        """A path the object can be read (or hard-linked) from, or None."""
+        return self._path(key)
+
+    def exists(self, key):
+        return os.path.isfile(self._path(key))
+
+    def size(self, key):
+        return os.path.getsize(self._path(key))
+
+    def put_file(self, key, path):
+        """Store a local file under key; returns False if key already existed."""
+        dest = self._path(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        try:
+            os.link(path, dest)
+        except FileExistsError:
+            return False
+        except OSError:
+            tmp = f"{dest}.{uuid.uuid4().hex}.tmp"
+            shutil.copy2(path, tmp)
+            try:
+                os.link(tmp, dest)
+            except FileExistsError:
+                return False
+            finally:
+                os.remove(tmp)
+        return True
+
+    def fetch(self, key, path):
+        """Write the object to a local path (a hard link when possible)."""
+        src = self._path(key)
+        try:
+            os.link(src, path)
+        except FileExistsError:
+            raise
+        except OSError:
+            shutil.copy2(src, path)
+
+    def open(self, key):
+        return open(self._path(key), "rb")
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def url(self, key, filename=None, expires=PRESIGN_SECONDS):
+        """Direct download URL, or None when the app serves the file itself."""
+        return None
+
+
+class S3Storage:
+    def __init__(self, bucket, prefix="", endpoint_url=None, presign=True, client=None):
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise StorageError("S3 storage needs boto3 (pip install boto3)")
+            client = boto3.client("s3", endpoint_url=endpoint_url or None)
+        self.s3 = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.presign = presign
+
+    def _key(self, key):
+        return self.prefix + key
+
+    def local_path(self, key):
+        return None
+
+    def _head(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            return self.s3.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def exists(self, key):
+        return self._head(key) is not None
+
+    def size(self, key):
+        head = self._head(key)
+        if head is None:
+            raise FileNotFoundError(key)
+        return head["ContentLength"]
+
+    def put_file(self, key, path):
+        if self.exists(key):
+            return False
+        # upload_file streams from disk, in parts for large files
+        self.s3.upload_file(path, self.bucket, self._key(key))
+        return True
+
+    def fetch(self, key, path):
+        if os.path.exists(path):
+            raise FileExistsError(path)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            self.s3.download_file(self.bucket, self._key(key), tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def open(self, key):
+        return self.s3.get_object(Bucket=self.bucket, Key=self._key(key))["Body"]
+
+    def delete(self, key):
+        self.s3.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def url(self, key, filename=None, expires=PRESIGN_SECONDS):
+        if not self.presign:
+            return None
+        params = {"Bucket": self.bucket, "Key": self._key(key)}
+        if filename:
+            params["ResponseContentDisposition"] = f'inline; filename="{filename}"'
+        return self.s3.generate_presigned_url("get_object", Params=params, ExpiresIn=expires)
+
+
+def make_storage(local_root):
+    kind = os.environ.get("LIBRECORDER_STORAGE", "local").lower()
+    if kind == "local":
+        return LocalStorage(local_root)
+    if kind == "s3":
+        bucket = os.environ.get("LIBRECORDER_S3_BUCKET")
+        if not bucket:
+            raise StorageError("LIBRECORDER_S3_BUCKET is required for S3 storage")
+        return S3Storage(
+            bucket,
+            prefix=os.environ.get("LIBRECORDER_S3_PREFIX", "blobs/"),
+            endpoint_url=os.environ.get("LIBRECORDER_S3_ENDPOINT"),
+            presign=os.environ.get("LIBRECORDER_S3_PRESIGN", "1") not in ("0", "false", "no"),
+        )
+    raise StorageError(f"unknown LIBRECORDER_STORAGE '{kind}'")
@@ -0,0 +1,68 @@
+# ~/librecorder/Software/WebApp/tests/conftest.py
+"""
+Tests for the WebApp:
+
+  cd Software/WebApp
+  python -m pytest tests
+
+The app is imported once, against a scratch data directory (database,
+uploads, blobs, locks) set up by app.init_db(), with plugins run
+in-process. The S3 tests need moto and are skipped without it.
+"""
+import io
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+WEBAPP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, WEBAPP_DIR)
+
+os.environ["LIBRECORDER_DATA_DIR"] = tempfile.mkdtemp(prefix="librecorder-tests-")
+os.environ["LIBRECORDER_WARMUP"] = "off"
+os.environ["LIBRECORDER_SANDBOX"] = "0"
+for _name in ("LIBRECORDER_DATABASE_URL", "LIBRECORDER_STORAGE", "LIBRECORDER_EVENTS", "LIBRECORDER_METRICS_DIR"):
+    os.environ.pop(_name, None)
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    import app
+    app.init_db()
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def app_ctx(app_module):
+    with app_module.app.app_context():
+        yield
+
+
+@pytest.fixture
+def case_id():
+    return f"test-{uuid.uuid4().hex[:12]}"
+
+
+def jpeg_bytes(size=(64, 48), color=(200, 80, 120)):
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, format="JPEG", quality=95)
+    return buf.getvalue()
+
+
+def upload(client, case_id, name="image.jpg", data=None):
+    """POST /upload one file; returns the stored filename."""
+    r = client.post(
+        "/upload",
+        data={"case_id": case_id, "file": (io.BytesIO(data or jpeg_bytes()), name)},
+        content_type="multipart/form-data",
+    )
+    assert r.status_code == 200, r.get_json()
+    return r.get_json()["filename"]
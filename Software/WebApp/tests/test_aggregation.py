@@ -0,0 +1,94 @@
+# ~/librecorder/Software/WebApp/tests/test_aggregation.py
+import types
+
+import numpy as np
+import pytest
+
+from aggregation import Histogram, P2Quantile, Quantiles, RunningStats, aggregate
+
+
+def test_running_stats_match_numpy_on_large_offsets():
+    # the naive sum-of-squares variance loses every digit here
+    xs = 1e9 + np.random.default_rng(0).normal(0, 0.5, 10000)
+    s = RunningStats()
+    for x in xs:
+        s.add(float(x))
+    out = s.summary()
+    assert out["n"] == len(xs)
+    assert out["mean"] == pytest.approx(xs.mean(), abs=1e-5)
+    assert out["std"] == pytest.approx(xs.std(ddof=1), rel=1e-4)
+    assert (out["min"], out["max"]) == (round(xs.min(), 6), round(xs.max(), 6))
+    assert RunningStats().summary() == {"n": 0}
+
+
+@pytest.mark.parametrize("dist", ["uniform", "normal", "exponential"])
+@pytest.mark.parametrize("p", [0.5, 0.9, 0.99])
+def test_p2_estimates_are_close_to_exact_quantiles(dist, p):
+    rng = np.random.default_rng(1)
+    xs = {"uniform": rng.uniform(0, 1, 50000), "normal": rng.normal(0, 1, 50000),
+          "exponential": rng.exponential(1, 50000)}[dist]
+    est = P2Quantile(p)
+    for x in xs:
+        est.add(float(x))
+    exact = np.quantile(xs, p)
+    # within 1% of the spread between the 1st and 99th percentiles
+    assert abs(est.value() - exact) < 0.01 * (np.quantile(xs, 0.99) - np.quantile(xs, 0.01))
+
+
+def test_p2_is_exact_for_the_first_values():
+    est = P2Quantile(0.5)
+    assert est.value() is None
+    for x in (5.0, 1.0, 3.0):
+        est.add(x)
+    assert est.value() == 3.0
+
+
+def test_quantiles_are_exact_until_the_buffer_limit(monkeypatch):
+    xs = np.random.default_rng(2).uniform(0, 100, 500)
+    q = Quantiles(q=[0.25, 0.5, 0.9])
+    for x in xs:
+        q.add(float(x))
+    assert q.summary() == {f"p{p * 100:g}": round(float(np.quantile(xs, p)), 6) for p in (0.25, 0.5, 0.9)}
+
+    monkeypatch.setattr(Quantiles, "EXACT_LIMIT", 100)
+    q = Quantiles(q=[0.5])
+    for x in xs:
+        q.add(float(x))
+    assert q.buffer is None
+    assert q.summary()["p50"] == pytest.approx(np.quantile(xs, 0.5), abs=5)
+
+
+def test_histogram_clamps_to_the_edge_bins():
+    h = Histogram(range=(0, 1), bins=4)
+    for x in (-1, 0, 0.3, 0.5, 0.99, 1, 7):
+        h.add(x)
+    assert h.summary() == {"edges": [0.0, 0.25, 0.5, 0.75, 1.0], "counts": [2, 1, 1, 3]}
+    with pytest.raises(ValueError):
+        Histogram(range=(1, 1))
+
+
+def test_case_summary():
+    mod = types.SimpleNamespace(
+        POSITIVE_CLASS="Infected",
+        AGGREGATES={"confidence": ["stats", "histogram"], "label": "counts",
+                    "p": {"quantiles": {"q": [0.5]}}},
+    )
+    entries = [
+        {"file": "a", "result": {"mean_pixel": 10, "classification": "Infected", "confidence": 0.9,
+                                 "label": "x", "p": 1.0, "cell_class_counts": {"Infected": 1, "Uninfected": 3}}},
+        {"file": "b", "result": {"mean_pixel": 20, "classification": "Uninfected", "confidence": 0.5,
+                                 "label": "x", "p": 3.0, "cell_class_counts": {"Uninfected": 4}}},
+        {"file": "c", "error": "boom"},
+    ]
+    agg = aggregate(iter(entries), mod)
+    assert agg["mean_pixel_avg"] == 15.0
+    assert agg["class_counts"] == {"Infected": 1, "Uninfected": 1}
+    assert agg["cells"] == 8 and agg["parasitemia"] == 0.125
+    assert agg["stats"]["confidence"]["mean"] == 0.7
+    assert sum(agg["histogram"]["confidence"]["counts"]) == 2
+    assert agg["counts"]["label"] == {"x": 2}
+    assert agg["quantiles"]["p"] == {"p50": 2.0}
+    assert agg["errors"] == 1
+
+    with pytest.raises(ValueError, match="Unknown aggregator"):
+        aggregate([], types.SimpleNamespace(AGGREGATES={"x": ["median"]}))
@@ -0,0 +1,78 @@
+# ~/librecorder/Software/WebApp/tests/test_analytics.py
+"""GET /analytics/images and /analytics/cases."""
+import io
+import json
+import uuid
+from datetime import datetime
+
+import pyarrow.parquet as pq
+import pytest
+from sqlalchemy.dialects import postgresql
+
+import analytics
+from models import ImageResult
+
+
+@pytest.fixture
+def model(app_ctx):
+    """A model with results in two cases over two months; its id keeps other tests' rows out."""
+    from models import db, Case, TestResult
+    model_id = f"m-{uuid.uuid4().hex[:8]}"
+    for case_id, level, month, confidences in (("a", "Reviewed", 1, [0.2, 0.4, 0.6]), ("b", "New", 2, [0.9])):
+        case_id = f"{model_id}-{case_id}"
+        db.session.add(Case(case_id=case_id, level=level))
+        for i, conf in enumerate(confidences):
+            db.session.add(ImageResult(
+                case_id=case_id, model_id=model_id, file=f"{i}.jpg", confidence=conf,
+                classification="Infected" if conf > 0.5 else "Uninfected",
+                result=json.dumps({"stats": {"p": conf * 10}}), timestamp=datetime(2026, month, 3),
+            ))
+        db.session.add(TestResult(
+            case_id=case_id, test_name=f"model:{model_id}", timestamp=datetime(2026, month, 3),
+            result=json.dumps({"stats": {"mean": sum(confidences) / len(confidences)}}),
+        ))
+    db.session.commit()
+    return model_id
+
+
+def test_images_grouped_by_month(client, model):
+    r = client.get(f"/analytics/images?model={model}&group_by=month&metric=confidence&positive=Infected")
+    assert r.status_code == 200
+    rows = r.get_json()["rows"]
+    assert [row["month"] for row in rows] == ["2026-01", "2026-02"]
+    jan = rows[0]
+    assert jan["n"] == jan["count"] == 3 and jan["errors"] == 0
+    assert jan["mean"] == pytest.approx(0.4) and jan["p50"] == pytest.approx(0.4)
+    assert jan["positive_rate"] == pytest.approx(1 / 3)
+
+
+def test_images_metric_from_the_result_json(client, model):
+    rows = client.get(f"/analytics/images?model={model}&group_by=day,level&metric=stats.p").get_json()["rows"]
+    assert [(r["day"], r["level"], r["max"]) for r in rows] == [
+        ("2026-01-03", "Reviewed", pytest.approx(6.0)), ("2026-02-03", "New", pytest.approx(9.0))]
+
+
+def test_cases_use_the_logged_summaries(client, model):
+    r = client.get(f"/analytics/cases?model={model}&group_by=level&metric=stats.mean&to=2026-01-31")
+    rows = r.get_json()["rows"]
+    assert rows == [dict(rows[0], level="Reviewed", n=1, count=1, mean=pytest.approx(0.4))]
+
+
+def test_csv_and_parquet(client, model):
+    text = client.get(f"/analytics/images?model={model}&group_by=month&format=csv").get_data(as_text=True)
+    assert text.splitlines()[0] == "month,n,errors"
+    data = client.get(f"/analytics/cases?model={model}&group_by=month&format=parquet").get_data()
+    assert pq.read_table(io.BytesIO(data)).column("month").to_pylist() == ["2026-01", "2026-02"]
+
+
+@pytest.mark.parametrize("query", ["group_by=weekday", "metric=1;drop", "from=yesterday", "format=xml"])
+def test_bad_queries(client, query):
+    assert client.get(f"/analytics/images?{query}").status_code == 400
+
+
+def test_postgres_expressions():
+    dialect = postgresql.dialect()
+    month = str(analytics._date_key(ImageResult.timestamp, "month", "postgresql").compile(dialect=dialect))
+    assert month.startswith("to_char(")
+    value = str(analytics._json_value(ImageResult.result, "stats.p", "postgresql").compile(dialect=dialect))
+    assert "jsonb_extract_path_text(CAST(image_result.result AS JSONB)" in value
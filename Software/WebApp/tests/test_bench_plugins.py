@@ -0,0 +1,96 @@
+# ~/librecorder/Software/WebApp/tests/test_bench_plugins.py
+"""Plugin regression checks on small generated images (see bench_plugins.py)."""
+import json
+import os
+import tracemalloc
+
+import numpy as np
+import pytest
+
+import bench_plugins
+from bench_app import make_image, image_bytes
+from pipeline import decode_rgb
+
+SIZES = [(50, 50), (300, 200)]
+
+
+@pytest.fixture(scope="module")
+def plugins():
+    return {n: m for n, m in bench_plugins.load_plugins().items() if not isinstance(m, Exception)}
+
+
+@pytest.fixture(scope="module")
+def images(tmp_path_factory):
+    """Lossless (png) images, so run(path) and run_array(decode) see the same pixels."""
+    rng = np.random.default_rng(7)
+    tmp = tmp_path_factory.mktemp("bench")
+    out = []
+    for w, h in SIZES:
+        path = str(tmp / f"{w}x{h}.png")
+        with open(path, "wb") as f:
+            f.write(image_bytes(make_image(w, h, rng), "png"))
+        out.append(path)
+    return out
+
+
+def test_timings_are_not_traced():
+    traced = []
+    samples, peak = bench_plugins.timed(lambda: traced.append(tracemalloc.is_tracing()), 5)
+    assert len(samples) == 5 and peak >= 0
+    # warm-up and timed calls untraced, then one traced call for the peak
+    assert traced == [False] * 6 + [True]
+
+
+def test_run_matches_compute_on_the_decoded_image(plugins, images):
+    checked = 0
+    for name, mod in plugins.items():
+        if not (hasattr(mod, "run_array") or hasattr(mod, "run_batch")):
+            continue
+        for path in images:
+            assert bench_plugins.same_output(
+                json.loads(json.dumps(mod.run(path))),
+                json.loads(json.dumps(bench_plugins.compute(mod, decode_rgb(path)))),
+                rel=1e-4,
+            ), f"{name} on {os.path.basename(path)}"
+            checked += 1
+    assert checked
+
+
+def test_batches_match_single_crops(plugins):
+    rng = np.random.default_rng(3)
+    crops = [np.asarray(make_image(50, 50, rng)) for _ in range(16)]
+    for name, mod in plugins.items():
+        if hasattr(mod, "run_batch"):
+            assert mod.run_batch(crops) == [mod.run_batch([c])[0] for c in crops], name
+
+
+def test_baseline_flags_slowdowns_and_changed_results(plugins, tmp_path, capsys):
+    names = [n for n in ("mean_pixel", "dark_light") if n in plugins]
+    if not names:
+        pytest.skip("no plugin that runs here")
+    baseline = str(tmp_path / "baseline.json")
+    args = ["--plugins", *names, "--formats", "png", "--sizes", "64x48", "--repeat", "3", "--cells", "0"]
+    assert bench_plugins.main(args + ["--json", baseline]) == 0
+
+    # the same code against its own baseline (timing noise aside) passes
+    assert bench_plugins.main(["--baseline", baseline, "--threshold", "10000"]) == 0
+
+    with open(baseline, "r", encoding="utf-8") as f:
+        stored = json.load(f)
+    for s in stored["steps"].values():
+        if s.get("count"):
+            s["p50_ms"] = s["p95_ms"] = 1e-6
+    with open(baseline, "w", encoding="utf-8") as f:
+        json.dump(stored, f)
+    assert bench_plugins.main(["--baseline", baseline]) == 1
+
+    step = next(k for k in stored["steps"] if k.endswith("/run"))
+    stored["steps"][step]["output"] = {"changed": True}
+    for s in stored["steps"].values():
+        if s.get("count"):
+            s["p50_ms"] = s["p95_ms"] = 1e9
+    with open(baseline, "w", encoding="utf-8") as f:
+        json.dump(stored, f)
+    capsys.readouterr()
+    assert bench_plugins.main(["--baseline", baseline]) == 1
+    assert "result changed" in capsys.readouterr().out
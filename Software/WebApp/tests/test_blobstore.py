@@ -0,0 +1,101 @@
+# ~/librecorder/Software/WebApp/tests/test_blobstore.py
+import os
+import uuid
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import blobstore
+from storage import LocalStorage
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalStorage(str(tmp_path / "blobs"))
+
+
+def noise(path, fmt="JPEG", **save):
+    """An image no other test stored (a new blob)."""
+    arr = np.random.default_rng().integers(0, 256, (32, 48, 3), dtype=np.uint8)
+    Image.fromarray(arr).save(path, format=fmt, **save)
+    return arr
+
+
+def add(store, upload_dir, case_id, src, name):
+    dest = os.path.join(upload_dir, case_id, name)
+    info = blobstore.store_file(store, str(src), dest)
+    blobstore.add_case_file(case_id, name, info)
+    return dest, info
+
+
+def test_same_bytes_are_stored_once_and_released_with_the_last_case(app_ctx, store, tmp_path):
+    from models import db, Blob
+    src = tmp_path / "scan.jpg"
+    noise(str(src))
+    uploads = str(tmp_path / "uploads")
+    a, b = f"test-{uuid.uuid4().hex[:12]}", f"test-{uuid.uuid4().hex[:12]}"
+
+    path_a, info_a = add(store, uploads, a, src, "x.jpg")
+    path_b, info_b = add(store, uploads, b, src, "y.jpg")
+    db.session.commit()
+    key = blobstore.blob_key(info_a["sha256"])
+    assert info_a["new"] and not info_b["new"]
+    assert db.session.get(Blob, info_a["sha256"]).refcount == 2
+    # both working copies are links to the one stored object
+    assert os.stat(path_a).st_ino == os.stat(path_b).st_ino == os.stat(store.local_path(key)).st_ino
+    assert blobstore.case_file_blob(a, "x.jpg") == key and blobstore.case_file_blob(a, "y.jpg") is None
+
+    assert blobstore.release_case(a) == []
+    db.session.commit()
+    assert db.session.get(Blob, info_a["sha256"]).refcount == 1
+
+    orphans = blobstore.release_case(b)
+    db.session.commit()
+    assert orphans == [(key, info_a["stored_size"])]
+    assert db.session.get(Blob, info_a["sha256"]) is None
+    assert store.exists(key)        # only deleted once the purge has committed
+    assert blobstore.delete_blobs(store, orphans) == info_a["stored_size"]
+    assert not store.exists(key)
+
+
+def test_later_edits_to_the_source_do_not_change_the_blob(store, tmp_path):
+    src = tmp_path / "scan.jpg"
+    noise(str(src))
+    before = src.read_bytes()
+    info = blobstore.store_file(store, str(src), str(tmp_path / "case" / "scan.jpg"))
+    src.write_bytes(b"edited")
+    with open(store.local_path(blobstore.blob_key(info["sha256"])), "rb") as f:
+        assert f.read() == before
+
+
+@pytest.mark.parametrize("fmt, ext, save, encoding", [
+    ("PNG", ".png", {"compress_level": 0}, "png-opt"),
+    ("TIFF", ".tif", {"compression": "raw", "tiffinfo": {270: "smear 7"}}, "deflate"),
+])
+def test_images_are_recompressed_without_changing_pixels(store, tmp_path, fmt, ext, save, encoding):
+    src = tmp_path / f"scan{ext}"
+    arr = np.zeros((64, 64, 3), np.uint8)
+    arr[:, :32] = np.random.default_rng().integers(0, 256, (64, 32, 3), dtype=np.uint8)
+    Image.fromarray(arr).save(str(src), format=fmt, **save)
+
+    info = blobstore.store_file(store, str(src), str(tmp_path / "case" / f"scan{ext}"))
+    assert info["encoding"] == encoding and info["stored_size"] < info["size"]
+    with Image.open(store.local_path(blobstore.blob_key(info["sha256"]))) as img:
+        assert np.array_equal(np.asarray(img), arr)
+        if fmt == "TIFF":
+            assert img.tag_v2[270] == "smear 7"
+
+
+def test_migrate_stores_existing_case_files_once(app_ctx, store, tmp_path):
+    case_id = f"test-{uuid.uuid4().hex[:12]}"
+    case_dir = tmp_path / "uploads" / case_id
+    case_dir.mkdir(parents=True)
+    noise(str(case_dir / "a.jpg"))
+    (case_dir / "b.jpg").write_bytes((case_dir / "a.jpg").read_bytes())
+    (case_dir / "c.jpg.1234.tmp").write_bytes(b"partial")
+
+    assert blobstore.migrate(store, str(tmp_path / "uploads")) == 2
+    assert blobstore.migrate(store, str(tmp_path / "uploads")) == 0
+    assert blobstore.case_file_blob(case_id, "a.jpg") == blobstore.case_file_blob(case_id, "b.jpg")
+    assert blobstore.case_file_blob(case_id, "c.jpg.1234.tmp") is None
@@ -0,0 +1,43 @@
+# ~/librecorder/Software/WebApp/tests/test_case_files.py
+"""Serving case files stored before the blob store (not migrated)."""
+import os
+
+import pytest
+
+from conftest import jpeg_bytes, upload
+
+
+@pytest.fixture
+def legacy_case(app_module, app_ctx, case_id):
+    """A case with one file in uploads/<case_id>/ and no CaseFile row, as before the blob store."""
+    from models import db, Case
+    db.session.add(Case(case_id=case_id))
+    db.session.commit()
+    case_dir = os.path.join(app_module.UPLOAD_DIR, case_id)
+    os.makedirs(case_dir)
+    with open(os.path.join(case_dir, "old.jpg"), "wb") as f:
+        f.write(jpeg_bytes(color=(3, 141, 59)))
+    return case_id
+
+
+def test_legacy_file_still_served_after_a_new_upload(client, legacy_case):
+    assert client.get(f"/cases/{legacy_case}/old.jpg").status_code == 200
+    new = upload(client, legacy_case, data=jpeg_bytes(color=(3, 141, 60)))
+    assert client.get(f"/cases/{legacy_case}/old.jpg").status_code == 200
+    assert client.get(f"/cases/{legacy_case}/{new}").status_code == 200
+    assert "old.jpg" in client.get(f"/cases/{legacy_case}").get_json()
+
+
+def test_legacy_file_not_served_once_the_case_is_purged(app_module, client, legacy_case):
+    from retention import purge_cases
+    purge_cases(app_module.storage, app_module.UPLOAD_DIR, [legacy_case], pause=0)
+    # a copy left behind (e.g. on another node) is not served either
+    case_dir = os.path.join(app_module.UPLOAD_DIR, legacy_case)
+    os.makedirs(case_dir, exist_ok=True)
+    with open(os.path.join(case_dir, "old.jpg"), "wb") as f:
+        f.write(b"left over")
+    assert client.get(f"/cases/{legacy_case}/old.jpg").status_code == 404
+
+
+def test_unknown_file_is_404(client, legacy_case):
+    assert client.get(f"/cases/{legacy_case}/missing.jpg").status_code == 404
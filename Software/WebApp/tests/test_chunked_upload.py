@@ -0,0 +1,88 @@
+# ~/librecorder/Software/WebApp/tests/test_chunked_upload.py
+import hashlib
+import io
+import os
+import time
+
+import pytest
+
+import chunked_upload
+from conftest import jpeg_bytes
+
+
+@pytest.fixture
+def scan():
+    return jpeg_bytes(color=(20, 140, 60)) + os.urandom(3000)
+
+
+def start(client, case_id, data):
+    r = client.post("/uploads", json={"filename": "slide.jpg", "size": len(data), "case_id": case_id})
+    assert r.status_code == 201, r.get_json()
+    return f"/uploads/{r.get_json()['upload_id']}"
+
+
+def put(client, url, offset, body):
+    return client.put(url, query_string={"offset": offset}, data=body)
+
+
+def test_dropped_chunk_is_resumed_from_the_server_offset(app_module, client, case_id, scan):
+    url = start(client, case_id, scan)
+    assert put(client, url, 0, scan[:1000]).get_json()["offset"] == 1000
+
+    # the connection drops 500 bytes into the next chunk: those bytes are kept
+    with pytest.raises(chunked_upload.UploadError) as e:
+        chunked_upload.write_chunk(app_module.STAGING_DIR, url.rsplit("/", 1)[1], 1000,
+                                   io.BytesIO(scan[1000:1500]), 1000)
+    assert e.value.extra == {"offset": 1500}
+    assert client.get(url).get_json()["offset"] == 1500
+
+    # a client that missed this and resends from 1000 is told where to continue
+    r = put(client, url, 1000, scan[1000:2000])
+    assert r.status_code == 409 and r.get_json()["offset"] == 1500
+
+    r = put(client, url, 1500, scan[1500:])
+    assert r.get_json()["complete"]
+    r = client.post(f"{url}/finalize", json={"sha256": hashlib.sha256(scan).hexdigest()})
+    assert r.status_code == 200, r.get_json()
+    name = r.get_json()["filename"]
+    assert client.get(f"/cases/{case_id}/{name}").get_data() == scan
+    assert client.get(url).status_code == 404
+
+
+def test_finalize_checks_size_and_checksum(client, case_id, scan):
+    url = start(client, case_id, scan)
+    put(client, url, 0, scan[:100])
+    r = client.post(f"{url}/finalize", json={"sha256": hashlib.sha256(scan).hexdigest()})
+    assert r.status_code == 409 and r.get_json()["offset"] == 100
+
+    assert put(client, url, 100, scan[100:] + b"extra").status_code == 400
+    put(client, url, 100, scan[100:])
+    r = client.post(f"{url}/finalize", json={"sha256": "0" * 64})
+    assert r.status_code == 422 and r.get_json()["sha256"] == hashlib.sha256(scan).hexdigest()
+    # the session is kept after a mismatch, until it is aborted
+    assert client.get(url).get_json()["complete"]
+    assert client.delete(url).status_code == 200
+    assert client.get(url).status_code == 404
+
+
+@pytest.mark.parametrize("body", [
+    {"filename": "slide.png", "size": 10},
+    {"filename": "slide.jpg", "size": -1},
+    {"filename": "slide.jpg", "size": "10"},
+    {"filename": "slide.jpg", "size": 10, "case_id": "../x"},
+])
+def test_bad_sessions_are_refused(client, body):
+    assert client.post("/uploads", json=body).status_code == 400
+
+
+def test_ids_cannot_leave_the_staging_dir(client):
+    assert client.get("/uploads/..").status_code == 404
+    assert client.get("/uploads/" + "g" * 32).status_code == 404
+
+
+def test_stale_sessions_are_dropped(tmp_path):
+    old = chunked_upload.start_upload(str(tmp_path), "a.jpg", 10, "c")["upload_id"]
+    past = time.time() - chunked_upload.STALE_SECONDS - 60
+    os.utime(tmp_path / old / "data", (past, past))
+    new = chunked_upload.start_upload(str(tmp_path), "b.jpg", 10, "c")["upload_id"]
+    assert os.listdir(tmp_path) == [new]
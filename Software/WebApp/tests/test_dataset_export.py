@@ -0,0 +1,41 @@
+# ~/librecorder/Software/WebApp/tests/test_dataset_export.py
+import json
+import os
+import re
+
+import numpy as np
+
+from conftest import WEBAPP_DIR, jpeg_bytes, upload
+
+import dataset_export
+
+TRAINER = os.path.join(WEBAPP_DIR, "..", "malaria_classifier", "train_malaria_model.py")
+
+
+def test_npy_names_are_the_ones_the_trainer_loads():
+    with open(TRAINER, "r", encoding="utf-8") as f:
+        loaded = re.findall(r"np\.load\(['\"]([^'\"]+)['\"]\)", f.read())
+    assert loaded == [dataset_export.CELLS_FILE, dataset_export.LABELS_FILE]
+
+
+def test_export_with_tensors_round_trips_to_training_arrays(app_module, client, app_ctx, case_id, tmp_path):
+    from models import db, ImageResult
+    names = [upload(client, case_id, name=f"{i}.jpg", data=jpeg_bytes(color=(40 * i, 90, 30))) for i in range(3)]
+    for i, name in enumerate(names):
+        label = "Infected" if i else "Uninfected"
+        db.session.add(ImageResult(
+            case_id=case_id, model_id="test_model", file=name, classification=label, confidence=0.9,
+            result=json.dumps({"classification": label, "confidence": 0.9, "p_infected": 0.5}),
+        ))
+    db.session.commit()
+
+    out = str(tmp_path / "export")
+    manifest = dataset_export.export_dataset(out, app_module.UPLOAD_DIR, tensors=True, size=(20, 10), case_id=case_id)
+    assert manifest["rows"] == 3 and manifest["unreadable_images"] == 0
+
+    npy = str(tmp_path / "npy")
+    assert dataset_export.main(["npy", out, "--positive", "Infected", "--out", npy]) == 0
+    cells = np.load(os.path.join(npy, dataset_export.CELLS_FILE))
+    labels = np.load(os.path.join(npy, dataset_export.LABELS_FILE))
+    assert cells.shape == (3, 10, 20, 3) and cells.dtype == np.float32 and cells.max() <= 1.0
+    assert sorted(labels.tolist()) == [0, 1, 1]
@@ -0,0 +1,71 @@
+# ~/librecorder/Software/WebApp/tests/test_events.py
+"""The /events stream cap and lifetime (events.py)."""
+import os
+import time
+
+from events import EventBroker
+
+from conftest import WEBAPP_DIR
+
+
+def test_streams_over_the_cap_are_refused():
+    broker = EventBroker(max_streams=2, max_seconds=60)
+    a, b = broker.subscribe(), broker.subscribe()
+    assert broker.subscribe() is None
+    a.close()        # never read: still frees its slot
+    c = broker.subscribe()
+    assert c is not None and broker.subscriber_count == 2
+    b.close(), c.close()
+    assert broker.subscriber_count == 0
+
+
+def test_stream_delivers_events_and_ends_after_its_lifetime():
+    broker = EventBroker(max_streams=1, max_seconds=0.3)
+    stream = broker.subscribe()
+    assert next(stream).startswith("retry:")
+    broker.publish("case_created", case_id="c1")
+    assert "event: case_created" in next(stream)
+    t0 = time.monotonic()
+    assert list(stream) == []
+    assert time.monotonic() - t0 < 1
+    assert broker.subscriber_count == 0
+
+
+def test_close_ends_streams():
+    broker = EventBroker()
+    stream = broker.subscribe()
+    next(stream)
+    broker.close()
+    assert list(stream) == []
+    assert broker.subscribe() is None
+
+
+def test_events_route_answers_503_over_the_cap(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, "broker", EventBroker(max_streams=1, max_seconds=60))
+    first = client.get("/events")
+    assert first.status_code == 200 and first.mimetype == "text/event-stream"
+    second = client.get("/events")
+    assert second.status_code == 503 and second.headers["Retry-After"]
+    assert "librecorder_event_streams_rejected_total 1" in client.get("/metrics").get_data(as_text=True)
+    first.close()
+    third = client.get("/events")
+    assert third.status_code == 200
+    third.close()
+
+
+def test_shared_log_and_metrics_default_to_the_data_dir(tmp_path, monkeypatch):
+    import runpy
+    import events
+    monkeypatch.setenv("LIBRECORDER_DATA_DIR", str(tmp_path))
+    monkeypatch.setenv("LIBRECORDER_EVENTS", "shared")
+    monkeypatch.delenv("LIBRECORDER_EVENTS_DB", raising=False)
+    broker = events.make_broker()
+    try:
+        assert broker.path == str(tmp_path / "events.db")
+    finally:
+        broker.close()
+
+    # gunicorn.conf.py sets several defaults; keep them out of the other tests
+    monkeypatch.setattr(os, "environ", {k: v for k, v in os.environ.items() if k != "LIBRECORDER_METRICS_DIR"})
+    runpy.run_path(os.path.join(WEBAPP_DIR, "gunicorn.conf.py"))
+    assert os.environ["LIBRECORDER_METRICS_DIR"] == str(tmp_path / "metrics")
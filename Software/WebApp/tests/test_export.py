@@ -0,0 +1,68 @@
+# ~/librecorder/Software/WebApp/tests/test_export.py
+"""Case bundles (export.py): results files written row by row."""
+import csv
+import io
+import json
+import tarfile
+import zipfile
+
+import pytest
+
+import export
+from conftest import jpeg_bytes, upload
+
+
+@pytest.fixture
+def case_with_results(app_module, client, app_ctx, case_id):
+    from models import db, ImageResult, TestResult
+    name = upload(client, case_id, data=jpeg_bytes(color=(17, 171, 71)))
+    db.session.add_all([TestResult(case_id=case_id, test_name=f"t{i}", result=str(i), units="%") for i in range(3)])
+    db.session.add_all([
+        ImageResult(case_id=case_id, model_id=f"m{i}", file=name, classification=f"c{i}", confidence=i / 10,
+                    result=json.dumps({"cells": [i, i + 1], "note": "a,\"quoted\"\nline"}))
+        for i in range(1200)
+    ])
+    db.session.commit()
+    return case_id, name
+
+
+def expected_results(case_id):
+    from models import ImageResult, TestResult
+    from image_results import image_result_json
+    return {
+        "results": [export.recorded_result_json(r) for r in TestResult.query.filter_by(case_id=case_id).order_by(TestResult.id)],
+        "image_results": [image_result_json(r) for r in ImageResult.query.filter_by(case_id=case_id).order_by(ImageResult.id)],
+    }
+
+
+def read_bundle(data, fmt):
+    if fmt == "zip":
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            return {n: zf.read(n) for n in zf.namelist()}
+    with tarfile.open(fileobj=io.BytesIO(data), mode="r:*") as tf:
+        return {m.name: tf.extractfile(m).read() for m in tf.getmembers()}
+
+
+@pytest.mark.parametrize("fmt", ["zip", "tar.gz"])
+def test_results_files_match_the_database(app_module, case_with_results, monkeypatch, fmt):
+    case_id, name = case_with_results
+    monkeypatch.setattr(export, "SPOOL_BYTES", 4096)    # roll over to disk
+    case_dir = f"{app_module.UPLOAD_DIR}/{case_id}"
+    files = read_bundle(b"".join(export.stream_case(case_dir, case_id, fmt)), fmt)
+
+    expected = expected_results(case_id)
+    assert files[f"{case_id}/results.json"] == json.dumps(expected, indent=2, default=str).encode("utf-8")
+    tests = list(csv.DictReader(io.StringIO(files[f"{case_id}/results.csv"].decode("utf-8"))))
+    assert [r["test_name"] for r in tests] == ["t0", "t1", "t2"]
+    images = list(csv.DictReader(io.StringIO(files[f"{case_id}/image_results.csv"].decode("utf-8"))))
+    assert len(images) == 1200
+    assert json.loads(images[7]["result"]) == expected["image_results"][7]["result"]
+    assert f"{case_id}/files/{name}" in files
+
+
+def test_results_of_an_empty_case(app_module, app_ctx, case_id):
+    names = ("results.json", "results.csv", "image_results.csv")
+    files = read_bundle(b"".join(export.stream_case("/nonexistent", case_id, "tar")), "tar")
+    assert sorted(files) == sorted([f"{case_id}/meta.json"] + [f"{case_id}/{n}" for n in names])
+    assert json.loads(files[f"{case_id}/results.json"]) == {"results": [], "image_results": []}
+    assert files[f"{case_id}/image_results.csv"].decode("utf-8").startswith("model_id,file,")
@@ -0,0 +1,104 @@
+# ~/librecorder/Software/WebApp/tests/test_image_results.py
+"""Per-image result rows (image_results.py) and GET /image_results."""
+import json
+import threading
+
+import pytest
+
+from image_results import save_image_results, stale_files, stored_results
+
+
+@pytest.fixture
+def results(app_ctx, case_id):
+    from models import db, ImageResult
+    db.session.add_all([
+        ImageResult(case_id=case_id, model_id=f"m{i}", file="a.jpg", classification="Infected",
+                    confidence=0.5, result=json.dumps({"classification": "Infected"}))
+        for i in range(5)
+    ])
+    db.session.commit()
+    return case_id
+
+
+@pytest.mark.parametrize("query", ["limit=-1", "limit=0", "offset=-1", "limit=x", "min_confidence=high"])
+def test_bad_paging_is_rejected(client, results, query):
+    assert client.get(f"/image_results?case_id={results}&{query}").status_code == 400
+
+
+def test_limit_and_offset(client, results):
+    every = [r["model_id"] for r in client.get(f"/image_results?case_id={results}").get_json()]
+    rows = client.get(f"/image_results?case_id={results}&limit=2&offset=1").get_json()
+    assert [r["model_id"] for r in rows] == every[1:3]
+    assert len(client.get(f"/image_results?case_id={results}&limit=100000").get_json()) == 5
+
+
+@pytest.fixture
+def segmented(app_ctx, case_id):
+    """Six segmented rows; only the odd ones have an Infected cell."""
+    from models import db, ImageResult
+    for i in range(6):
+        cells = [{"classification": "Uninfected", "confidence": 0.99}]
+        if i % 2:
+            cells.append({"classification": "Infected", "confidence": i / 10})
+        db.session.add(ImageResult(case_id=case_id, model_id=f"s{i}", file="a.jpg",
+                                   result=json.dumps({"cell_count": len(cells), "per_cell": cells})))
+    db.session.commit()
+    return case_id
+
+
+def test_cells_are_paged_after_the_cell_filter(client, segmented):
+    url = f"/image_results?case_id={segmented}&cells=1&classification=Infected"
+    every = client.get(url).get_json()
+    assert sorted(r["model_id"] for r in every) == ["s1", "s3", "s5"]
+    assert [r["model_id"] for r in client.get(url + "&limit=2").get_json()] == [r["model_id"] for r in every[:2]]
+    assert [r["model_id"] for r in client.get(url + "&limit=2&offset=2").get_json()] == [every[2]["model_id"]]
+
+
+def test_cells_max_confidence(client, segmented):
+    url = f"/image_results?case_id={segmented}&cells=1&classification=Infected"
+    rows = client.get(url + "&min_confidence=0.2&max_confidence=0.4").get_json()
+    assert [(r["model_id"], [c["confidence"] for c in r["cells"]]) for r in rows] == [("s3", [0.3])]
+
+
+def per_image(label, files=("a.jpg", "b.jpg")):
+    return [{"file": f, "result": {"classification": label, "confidence": 0.7}, "latency_ms": 1.0} for f in files]
+
+
+IDENTITIES = {"a.jpg": (10, 1), "b.jpg": (20, 2)}
+
+
+def test_save_updates_rows_stored_after_the_snapshot(app_ctx, case_id):
+    from models import db, ImageResult
+    stale = stored_results(case_id, "m")
+    save_image_results(case_id, "m", per_image("first"), IDENTITIES, {})
+    db.session.commit()
+    save_image_results(case_id, "m", per_image("second"), IDENTITIES, stale)
+    db.session.commit()
+    rows = ImageResult.query.filter_by(case_id=case_id, model_id="m").all()
+    assert sorted((r.file, r.classification) for r in rows) == [("a.jpg", "second"), ("b.jpg", "second")]
+    assert stale_files(list(IDENTITIES), IDENTITIES, stored_results(case_id, "m")) == []
+
+
+def test_concurrent_runs_of_a_case_do_not_conflict(app_module, case_id):
+    from models import db, ImageResult
+    both_read = threading.Barrier(2)
+    errors = []
+
+    def run(label):
+        with app_module.app.app_context():
+            try:
+                stored = stored_results(case_id, "m")
+                both_read.wait(timeout=10)
+                save_image_results(case_id, "m", per_image(label), IDENTITIES, stored)
+                db.session.commit()
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(label,)) for label in ("x", "y")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    with app_module.app.app_context():
+        assert ImageResult.query.filter_by(case_id=case_id, model_id="m").count() == 2
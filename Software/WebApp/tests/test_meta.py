@@ -0,0 +1,63 @@
+# ~/librecorder/Software/WebApp/tests/test_meta.py
+"""POST /meta: metadata of many cases at once."""
+import pytest
+
+
+@pytest.fixture
+def cases(app_ctx):
+    from models import db, Case
+    ids = ["101", "meta-a"]
+    for case_id in ids:
+        if not Case.query.filter_by(case_id=case_id).first():
+            db.session.add(Case(case_id=case_id))
+    db.session.commit()
+    return ids
+
+
+def test_updates_every_case(client, cases):
+    r = client.post("/meta", json=[{"case_id": 101, "level": "Reviewed"}, {"case_id": "meta-a", "tags": ["x"]}])
+    assert r.status_code == 200, r.get_json()
+    assert r.get_json()["updated"] == 2
+    assert client.get("/meta/101").get_json()["level"] == "Reviewed"
+    assert client.get("/meta/meta-a").get_json()["tags"] == ["x"]
+
+
+@pytest.mark.parametrize("items", [
+    [{"case_id": "meta-a"}, "meta-a"],
+    [{"case_id": "meta-a"}, {"level": "Reviewed"}],
+    [{"case_id": ["meta-a"]}],
+    [None],
+])
+def test_malformed_items_are_rejected(client, cases, items):
+    r = client.post("/meta", json=items)
+    assert r.status_code == 400
+    assert r.get_json()["malformed"] == [len(items) - 1]
+
+
+def test_unknown_cases_are_reported(client, cases):
+    r = client.post("/meta", json=[{"case_id": "meta-a", "level": "X"}, {"case_id": "no-such-case"}])
+    assert r.status_code == 404
+    assert r.get_json()["missing"] == ["no-such-case"]
+    assert client.get("/meta/meta-a").get_json()["level"] != "X"
+
+
+def test_legacy_meta_json_is_imported_at_startup(app_module, client, app_ctx, case_id):
+    import json
+    import os
+    from models import db, Case
+    db.session.add(Case(case_id=case_id))
+    db.session.commit()
+    path = os.path.join(app_module.UPLOAD_DIR, case_id, "meta.json")
+    os.makedirs(os.path.dirname(path))
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"level": "Analyzed", "tags": ["zebrafish"], "description": "imported from disk"}, f)
+
+    assert app_module.init_db() >= 1
+    meta = client.get(f"/meta/{case_id}").get_json()
+    assert meta["level"] == "Analyzed" and meta["tags"] == ["zebrafish"]
+    assert case_id in [c["case_id"] for c in client.get("/cases?tag=zebrafish").get_json()]
+    assert os.path.exists(path + ".imported") and not os.path.exists(path)
+    r = client.get("/search?q=zebrafish")
+    if r.status_code != 503:
+        assert case_id in [hit["case_id"] for hit in r.get_json()["results"]]
+    assert app_module.init_db() == 0
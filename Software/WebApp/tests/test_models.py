@@ -0,0 +1,30 @@
+# ~/librecorder/Software/WebApp/tests/test_models.py
+"""Schema upgrades (models.upgrade_schema)."""
+import json
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+import models
+from models import db, _widen_to_text
+
+
+def test_result_column_is_widened_to_text():
+    col = models.TestResult.__table__.c.result
+    old = sa.String(128)
+    assert _widen_to_text(postgresql.dialect(), "test_result", col, old) == \
+        "ALTER TABLE test_result ALTER COLUMN result TYPE TEXT"
+    assert _widen_to_text(mysql.dialect(), "test_result", col, old) == "ALTER TABLE test_result MODIFY result TEXT"
+    assert _widen_to_text(sqlite.dialect(), "test_result", col, old) is None
+    # already TEXT, or not a TEXT column in the model
+    assert _widen_to_text(postgresql.dialect(), "test_result", col, sa.Text()) is None
+    assert _widen_to_text(postgresql.dialect(), "test_result", models.TestResult.__table__.c.units, sa.String(16)) is None
+
+
+def test_run_summaries_longer_than_the_old_limit_are_stored(app_ctx, case_id):
+    from models import Case, TestResult
+    summary = json.dumps({"confidence": {"histogram": list(range(200))}})
+    db.session.add(Case(case_id=case_id))
+    db.session.add(TestResult(case_id=case_id, test_name="run", result=summary))
+    db.session.commit()
+    assert TestResult.query.filter_by(case_id=case_id).one().result == summary
@@ -0,0 +1,81 @@
+# ~/librecorder/Software/WebApp/tests/test_pipeline.py
+import types
+
+import pytest
+
+import pipeline
+from conftest import jpeg_bytes, upload
+
+
+def test_models_run_in_dependency_order():
+    order = pipeline.parse_pipeline([
+        {"id": "c", "after": ["a", "b"]}, {"id": "b", "after": "a"}, "a", "d",
+    ])
+    assert order == [("a", []), ("d", []), ("b", ["a"]), ("c", ["a", "b"])]
+
+
+@pytest.mark.parametrize("spec, error", [
+    ([], "non-empty"),
+    (["a", "a"], "listed twice"),
+    ([{"id": "a", "after": ["x"]}], "unknown model 'x'"),
+    ([{"id": "a", "after": ["b"]}, {"id": "b", "after": ["a"]}], "cycle"),
+    ([{"after": ["a"]}], "id is required"),
+])
+def test_bad_pipelines_are_rejected(spec, error):
+    with pytest.raises(ValueError, match=error):
+        pipeline.parse_pipeline(spec)
+
+
+def test_image_is_decoded_once_and_failures_skip_dependents(tmp_path, monkeypatch):
+    path = tmp_path / "a.jpg"
+    path.write_bytes(jpeg_bytes(color=(100, 100, 100)))
+    decoded = []
+    decode = pipeline.decode_rgb
+    monkeypatch.setattr(pipeline, "decode_rgb", lambda p: decoded.append(p) or decode(p))
+
+    seen = []
+
+    def boom(arr):
+        raise RuntimeError("boom")
+
+    modules = {
+        "array": types.SimpleNamespace(run_array=lambda a: seen.append(a) or {"v": float(a.mean())}),
+        "batch": types.SimpleNamespace(run_batch=lambda arrs: seen.extend(arrs) or [{"n": len(arrs)}]),
+        "path": types.SimpleNamespace(run=lambda p: {"path": p}),
+        "fails": types.SimpleNamespace(run_array=boom),
+        "after_fail": types.SimpleNamespace(run_array=lambda a: {}),
+    }
+    order = pipeline.parse_pipeline(["array", "batch", "path", "fails", {"id": "after_fail", "after": ["fails"]}])
+    out = pipeline.run_file(order, modules, str(path))
+
+    assert decoded == [str(path)]
+    assert seen[0] is seen[1] and not seen[0].flags.writeable
+    assert out["batch"]["result"] == {"n": 1} and out["path"]["result"] == {"path": str(path)}
+    assert out["fails"]["error"] == "boom"
+    assert out["after_fail"]["error"] == "skipped: 'fails' failed" and "latency_ms" not in out["after_fail"]
+
+
+def test_unreadable_image_fails_every_model(tmp_path):
+    path = tmp_path / "bad.jpg"
+    path.write_bytes(b"not a jpeg")
+    modules = {"a": types.SimpleNamespace(run_array=lambda a: {}), "b": types.SimpleNamespace(run=lambda p: {})}
+    out = pipeline.run_file(pipeline.parse_pipeline(["a", "b"]), modules, str(path))
+    assert out["a"]["error"].startswith("decode failed") and out["b"]["error"].startswith("decode failed")
+
+
+def test_run_pipeline_route(client, case_id):
+    for i in range(2):
+        upload(client, case_id, name=f"{i}.jpg", data=jpeg_bytes(color=(40 + 150 * i,) * 3))
+    body = {"case_id": case_id, "models": ["mean_pixel_v1", {"id": "dark_light_v1", "after": ["mean_pixel_v1"]}]}
+    r = client.post("/run_pipeline", json=body)
+    assert r.status_code == 200, r.get_json()
+    out = r.get_json()
+    assert out["models"] == ["mean_pixel_v1", "dark_light_v1"] and out["processed"] == 2
+    assert [set(img["results"]) for img in out["per_image"]] == [{"mean_pixel_v1", "dark_light_v1"}] * 2
+    assert {"mean_pixel_v1", "dark_light_v1"} <= set(out["aggregate"])
+
+    again = client.post("/run_pipeline", json={**body, "incremental": True}).get_json()
+    assert again["processed"] == 0 and again["skipped"] == 2
+
+    assert client.post("/run_pipeline", json={**body, "models": ["nope_v1"]}).status_code == 400
+    assert client.post("/run_pipeline", json={**body, "case_id": "no-such-case"}).status_code == 404
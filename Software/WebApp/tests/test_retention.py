@@ -0,0 +1,58 @@
+# ~/librecorder/Software/WebApp/tests/test_retention.py
+import os
+
+from conftest import jpeg_bytes, upload
+
+
+def _case(client, case_id, color):
+    name = upload(client, case_id, data=jpeg_bytes(color=color))
+    from blobstore import case_file_blob
+    return name, case_file_blob(case_id, name)
+
+
+def test_purge_deletes_rows_blobs_and_files(app_module, client, app_ctx, case_id):
+    from retention import purge_cases
+    from models import Case, CaseFile
+    name, key = _case(client, case_id, (3, 4, 5))
+
+    out = purge_cases(app_module.storage, app_module.UPLOAD_DIR, [case_id], max_mb_s=0)
+    assert out["purged"] == 1 and not out["errors"] and out["freed_bytes"] > 0
+    assert not Case.query.filter_by(case_id=case_id).first()
+    assert not CaseFile.query.filter_by(case_id=case_id).first()
+    assert not app_module.storage.exists(key)
+    assert not os.path.exists(os.path.join(app_module.UPLOAD_DIR, case_id))
+
+
+def test_failed_batch_keeps_its_blobs(app_module, client, app_ctx, monkeypatch):
+    import retention
+    from models import db, CaseFile
+    ids = [f"{n}-{os.urandom(4).hex()}" for n in ("keep-a", "keep-b")]
+    keys = [_case(client, case_id, (6 + i, 7, 8))[1] for i, case_id in enumerate(ids)]
+
+    def fail():
+        raise RuntimeError("database went away")
+
+    # the blobs of the first case are released before the commit fails
+    monkeypatch.setattr(db.session, "commit", fail)
+    out = retention.purge_cases(app_module.storage, app_module.UPLOAD_DIR, ids, max_mb_s=0)
+    monkeypatch.undo()
+
+    assert out["purged"] == 0 and set(out["errors"]) == set(ids)
+    for case_id, key in zip(ids, keys):
+        assert CaseFile.query.filter_by(case_id=case_id).first()
+        assert app_module.storage.exists(key)
+
+
+def test_hold_tag_is_never_matched(app_ctx, case_id):
+    from datetime import datetime, timedelta
+    from models import db, Case, CaseTag, RetentionPolicy
+    from retention import matching_cases, HOLD_TAG
+    old = datetime.utcnow() - timedelta(days=30)
+    db.session.add_all([
+        Case(case_id=case_id, created_at=old),
+        Case(case_id=case_id + "-held", created_at=old),
+        CaseTag(case_id=case_id + "-held", tag=HOLD_TAG),
+    ])
+    db.session.commit()
+    ids = db.session.scalars(matching_cases(RetentionPolicy(name="t", max_age_days=7))).all()
+    assert case_id in ids and case_id + "-held" not in ids
@@ -0,0 +1,151 @@
+# ~/librecorder/Software/WebApp/tests/test_sandbox.py
+"""Plugin workers (sandbox.py) against plugins that hang, hog memory, leak or exit."""
+import os
+import time
+import types
+
+import pytest
+
+import sandbox
+from metrics import SANDBOX_RESTARTS
+
+PLUGINS = {
+    "ok": "import os\ndef run(path):\n    return {'pid': os.getpid(), 'image': path}\n",
+    "fails": "def run(path):\n    raise ValueError('bad image')\n",
+    "hangs": "import time\ndef run(path):\n    time.sleep(60)\n",
+    "hogs": (
+        "import time\n"
+        "def run(path):\n"
+        "    blocks = []\n"
+        "    while True:\n"
+        "        blocks.append(b'x' * (16 * 1024 * 1024))\n"
+        "        time.sleep(0.02)\n"
+    ),
+    "leaks": (
+        "import os\n"
+        "KEPT = []\n"
+        "def run(path):\n"
+        "    KEPT.append(b'x' * (64 * 1024 * 1024))\n"
+        "    return {'pid': os.getpid()}\n"
+    ),
+    "exits": "import os\ndef run(path):\n    os._exit(3)\n",
+}
+
+
+@pytest.fixture
+def plugins(tmp_path):
+    paths = {}
+    for name, source in PLUGINS.items():
+        paths[name] = str(tmp_path / f"{name}.py")
+        with open(paths[name], "w") as f:
+            f.write(source)
+    return paths
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def make(**kw):
+        kw.setdefault("size", 1)
+        kw.setdefault("timeout", 30)
+        kw.setdefault("max_rss", 0)
+        kw.setdefault("max_tasks", 100)
+        pools.append(sandbox.SandboxPool(**kw))
+        return pools[-1]
+
+    yield make
+    for p in pools:
+        p.close()
+
+
+def task(path):
+    return {"kind": "run", "plugin": path, "image": "image.jpg", "tile": None, "segment": None}
+
+
+def restarts(reason):
+    return SANDBOX_RESTARTS._values.get((reason,), 0)
+
+
+def fails_with(pool, path, reason):
+    before = restarts(reason)
+    with pytest.raises(sandbox.SandboxError) as e:
+        pool.call(task(path))
+    assert e.value.reason == reason
+    if reason != "error":
+        assert restarts(reason) == before + 1
+    return e.value
+
+
+def test_plugin_errors_keep_the_worker(make_pool, plugins):
+    pool = make_pool()
+    pid = pool.call(task(plugins["ok"]))["pid"]
+    counts = dict(SANDBOX_RESTARTS._values)
+    assert "bad image" in str(fails_with(pool, plugins["fails"], "error"))
+    assert pool.call(task(plugins["ok"]))["pid"] == pid
+    assert dict(SANDBOX_RESTARTS._values) == counts
+
+
+def test_a_hanging_plugin_is_killed_at_the_timeout(make_pool, plugins):
+    pool = make_pool(timeout=1)
+    pid = pool.call(task(plugins["ok"]))["pid"]
+    t0 = time.monotonic()
+    fails_with(pool, plugins["hangs"], "timeout")
+    assert time.monotonic() - t0 < 5
+    with pytest.raises(ProcessLookupError):
+        os.kill(pid, 0)
+    assert pool.call(task(plugins["ok"]))["pid"] != pid
+
+
+@pytest.mark.skipif(sandbox._rss(os.getpid()) is None, reason="needs /proc")
+def test_a_worker_over_the_memory_limit_is_killed(make_pool, plugins):
+    pool = make_pool(max_rss=200 * 1024 * 1024)
+    t0 = time.monotonic()
+    assert "memory limit exceeded" in str(fails_with(pool, plugins["hogs"], "memory"))
+    assert time.monotonic() - t0 < 10
+    assert pool.call(task(plugins["ok"]))["image"] == "image.jpg"
+
+
+def test_a_crashed_worker_is_replaced(make_pool, plugins):
+    pool = make_pool()
+    assert "exit code 3" in str(fails_with(pool, plugins["exits"], "crash"))
+    pid = pool.call(task(plugins["ok"]))["pid"]
+
+    # a worker that dies while idle is replaced on the next image
+    before = restarts("crash")
+    os.kill(pid, 9)
+    time.sleep(0.2)
+    assert pool.call(task(plugins["ok"]))["pid"] != pid
+    assert restarts("crash") == before + 1
+
+
+def test_workers_are_recycled_after_max_tasks(make_pool, plugins):
+    pool = make_pool(max_tasks=2)
+    before = restarts("recycled")
+    pids = [pool.call(task(plugins["ok"]))["pid"] for _ in range(3)]
+    assert pids[0] == pids[1] != pids[2]
+    assert restarts("recycled") == before + 1
+
+
+@pytest.mark.skipif(sandbox._rss(os.getpid()) is None, reason="needs /proc")
+def test_workers_that_leak_are_recycled(make_pool, plugins):
+    pool = make_pool(max_rss=100 * 1024 * 1024)
+    before = restarts("recycled")
+    first = pool.call(task(plugins["leaks"]))["pid"]      # ~64 MB kept
+    second = pool.call(task(plugins["leaks"]))["pid"]     # over 100 MB: finishes, then recycled
+    assert first == second
+    assert restarts("recycled") == before + 1
+    assert pool.call(task(plugins["leaks"]))["pid"] != first
+
+
+def test_pipeline_steps_report_a_crash_per_model(make_pool, plugins, monkeypatch):
+    pool = make_pool()
+    monkeypatch.setattr(sandbox, "ENABLED", True)
+    monkeypatch.setattr(sandbox, "get_pool", lambda: pool)
+    mod = types.SimpleNamespace(__file__=plugins["exits"])
+    out = sandbox.run_file_sandboxed([("a", []), ("b", ["a"])], {"a": mod, "b": mod}, "/data/image.jpg")
+    assert out["a"]["file"] == out["b"]["file"] == "image.jpg"
+    assert "crashed" in out["a"]["error"]
+
+    ok = types.SimpleNamespace(__file__=plugins["ok"])
+    assert sandbox.run_plugin(ok, "image.jpg")["image"] == "image.jpg"
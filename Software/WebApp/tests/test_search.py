@@ -0,0 +1,68 @@
+# ~/librecorder/Software/WebApp/tests/test_search.py
+import uuid
+
+import pytest
+
+from conftest import upload
+
+
+@pytest.fixture
+def word():
+    """A word no other test's cases contain."""
+    return "zq" + uuid.uuid4().hex[:10]
+
+
+def hits(client, q, **params):
+    r = client.get("/search", query_string={"q": q, **params})
+    assert r.status_code == 200, r.get_json()
+    return r.get_json()["results"]
+
+
+def test_metadata_is_searchable_by_prefix(client, case_id, word):
+    upload(client, case_id)
+    client.post(f"/meta/{case_id}", json={"description": f"thin smear {word}", "tags": ["giemsa"]})
+    found = hits(client, word[:8])
+    assert [h["case_id"] for h in found] == [case_id]
+    assert found[0]["source"] == "" and f"[{word}]" in found[0]["snippet"]
+    # every word has to match
+    assert hits(client, f"{word} nosuchword") == []
+
+
+def test_tags_rank_above_notes(client, word):
+    tagged, noted = f"test-{uuid.uuid4().hex[:12]}", f"test-{uuid.uuid4().hex[:12]}"
+    for case_id in (noted, tagged):
+        upload(client, case_id)
+    client.post(f"/meta/{noted}", json={"notes": f"mentions {word} in passing"})
+    client.post(f"/meta/{tagged}", json={"tags": [word]})
+    assert [h["case_id"] for h in hits(client, word)] == [tagged, noted]
+    assert [h["case_id"] for h in hits(client, word, offset=1)] == [noted]
+    assert [h["case_id"] for h in hits(client, word, limit=1)] == [tagged]
+
+
+def test_uploaded_notes_are_indexed_and_purged(client, case_id, word):
+    name = upload(client, case_id, name="report.txt", data=f"ring forms seen, {word}\n".encode())
+    found = hits(client, word)
+    assert [(h["case_id"], h["source"]) for h in found] == [(case_id, name)]
+
+    assert client.delete(f"/purge/{case_id}").status_code == 200
+    assert hits(client, word) == []
+
+
+def test_reindex_rebuilds_from_cases_and_notes(app_module, client, app_ctx, case_id, word):
+    from models import db
+    import search_index
+    upload(client, case_id, name="n.txt", data=word.encode())
+    db.session.execute(db.text("DELETE FROM case_search"))
+    assert hits(client, word) == []
+    search_index.reindex_all(app_module.UPLOAD_DIR)
+    db.session.commit()
+    assert [h["case_id"] for h in hits(client, word)] == [case_id]
+
+
+@pytest.mark.parametrize("q", ['"', "NEAR(a b", "a* OR", "-x", ""])
+def test_query_syntax_in_user_input_is_harmless(client, q):
+    assert isinstance(hits(client, q), list)
+
+
+def test_bad_paging_is_rejected(client):
+    assert client.get("/search?q=x&limit=ten").status_code == 400
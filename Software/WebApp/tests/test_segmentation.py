@@ -0,0 +1,74 @@
+# ~/librecorder/Software/WebApp/tests/test_segmentation.py
+import types
+
+import cv2
+import numpy as np
+import pytest
+
+import segmentation
+
+CENTRES = [(40, 40), (120, 40), (200, 40), (40, 140), (120, 140)]
+
+
+def _field(path=None):
+    """Five dark 'cells' of radius 15 on a light background, plus a speck and a clump."""
+    rgb = np.full((200, 300, 3), 230, np.uint8)
+    for cx, cy in CENTRES:
+        cv2.circle(rgb, (cx, cy), 15, (120, 60, 140), -1)
+    cv2.circle(rgb, (270, 180), 2, (120, 60, 140), -1)              # debris
+    cv2.rectangle(rgb, (180, 110), (260, 190), (120, 60, 140), -1)  # clump
+    if path:
+        cv2.imwrite(path, cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))
+    return rgb
+
+
+def test_cells_are_found_without_debris_or_clumps():
+    boxes = segmentation.find_cells(_field())
+    centres = sorted((int(x + w // 2), int(y + h // 2)) for x, y, w, h in boxes)
+    assert len(centres) == len(CENTRES)
+    for (cx, cy), (ex, ey) in zip(centres, sorted(CENTRES)):
+        assert abs(cx - ex) <= 1 and abs(cy - ey) <= 1
+
+
+def test_crops_are_square_clipped_and_resized():
+    rgb = _field()
+    boxes = np.array([[0, 0, 10, 20], [290, 190, 10, 10]])
+    a, b = segmentation.crop_cells(rgb, boxes)
+    assert a.shape == (20, 20, 3) and b.shape == (10, 10, 3)
+    assert [c.shape for c in segmentation.crop_cells(rgb, boxes, size=(8, 6))] == [(6, 8, 3)] * 2
+
+
+def test_cells_are_classified_in_batches(tmp_path):
+    path = str(tmp_path / "field.png")
+    _field(path)
+    batches = []
+
+    def run_batch(crops):
+        batches.append([c.shape for c in crops])
+        return [{"classification": "Infected" if i == 0 else "Uninfected"} for i in range(len(crops))]
+
+    mod = types.SimpleNamespace(run_batch=run_batch, INPUT_SIZE=(24, 24), POSITIVE_CLASS="Infected")
+    out = segmentation.run_segmented(mod, path, batch=2)
+    assert [len(b) for b in batches] == [2, 2, 1]
+    assert all(shape == (24, 24, 3) for b in batches for shape in b)
+    assert out["cells"] == 5 and out["cell_class_counts"] == {"Infected": 3, "Uninfected": 2}
+    assert out["parasitemia"] == 0.6
+    assert len(out["per_cell"]) == 5 and len(out["per_cell"][0]["box"]) == 4
+
+    out = segmentation.run_segmented(mod, path, per_cell=False)
+    assert "per_cell" not in out
+
+
+def test_field_without_cells_has_no_parasitemia():
+    out = segmentation.aggregate_cells(np.empty((0, 4)), [], positive_class="Infected")
+    assert out == {"cells": 0, "cell_class_counts": {}, "positive_class": "Infected",
+                   "parasitemia": 0.0, "per_cell": []}
+
+
+def test_segment_options():
+    assert segmentation.segment_options(True) == {
+        "min_area": None, "max_area": None, "batch": segmentation.DEFAULT_BATCH_SIZE, "per_cell": True,
+    }
+    assert segmentation.segment_options({"min_area": "50", "per_cell": 0})["min_area"] == 50
+    with pytest.raises(ValueError):
+        segmentation.segment_options({"batch": 0})
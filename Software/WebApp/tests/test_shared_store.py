@@ -0,0 +1,87 @@
+# ~/librecorder/Software/WebApp/tests/test_shared_store.py
+"""Two app nodes sharing one database and one S3 store, each with its own uploads/."""
+import os
+
+import pytest
+
+from conftest import jpeg_bytes, upload
+
+moto = pytest.importorskip("moto")
+
+
+@pytest.fixture
+def s3():
+    import boto3
+    from storage import S3Storage
+    with moto.mock_aws():
+        client = boto3.client(
+            "s3", region_name="us-east-1", aws_access_key_id="test", aws_secret_access_key="test",
+        )
+        client.create_bucket(Bucket="librecorder")
+        yield S3Storage("librecorder", prefix="blobs/", client=client)
+
+
+@pytest.fixture
+def node(app_module, s3, tmp_path, monkeypatch):
+    """node("a") / node("b") points the app at that node's uploads directory."""
+    monkeypatch.setattr(app_module, "storage", s3)
+
+    def switch(name):
+        upload_dir = tmp_path / name / "uploads"
+        upload_dir.mkdir(parents=True, exist_ok=True)
+        monkeypatch.setattr(app_module, "UPLOAD_DIR", str(upload_dir))
+        return str(upload_dir)
+
+    return switch
+
+
+def test_file_uploaded_on_one_node_is_served_by_another(client, node, s3, case_id):
+    data = jpeg_bytes()
+    node("a")
+    name = upload(client, case_id, data=data)
+
+    upload_b = node("b")
+    r = client.get(f"/cases/{case_id}/{name}")
+    assert r.status_code == 302
+    assert "librecorder" in r.headers["Location"] and "Signature" in r.headers["Location"]
+
+    s3.presign = False
+    r = client.get(f"/cases/{case_id}/{name}")
+    assert r.status_code == 200 and r.data == data
+
+    # listing the case fetches the working copy onto this node
+    r = client.get(f"/cases/{case_id}/images")
+    assert r.get_json()["total"] == 1
+    with open(os.path.join(upload_b, case_id, name), "rb") as f:
+        assert f.read() == data
+
+
+def test_case_purged_on_one_node_is_not_served_by_another(client, node, s3, app_ctx, case_id):
+    from blobstore import case_file_blob
+    node("a")
+    name = upload(client, case_id, data=jpeg_bytes(color=(1, 2, 3)))   # bytes no other test stores
+    key = case_file_blob(case_id, name)
+
+    upload_b = node("b")
+    assert client.get(f"/cases/{case_id}/images").get_json()["total"] == 1
+
+    node("a")
+    assert client.delete(f"/purge/{case_id}").status_code == 200
+    assert not s3.exists(key)
+
+    node("b")
+    assert os.path.exists(os.path.join(upload_b, case_id, name))   # stale working copy
+    assert client.get(f"/cases/{case_id}/{name}").status_code == 404
+
+
+def test_same_bytes_from_two_nodes_share_one_blob(client, node, app_ctx, case_id):
+    from models import db, Blob, CaseFile
+    data = jpeg_bytes(color=(10, 20, 30))
+    node("a")
+    first = upload(client, case_id, name="one.jpg", data=data)
+    node("b")
+    second = upload(client, case_id, name="two.jpg", data=data)
+
+    shas = {cf.filename: cf.sha256 for cf in CaseFile.query.filter_by(case_id=case_id)}
+    assert shas[first] == shas[second]
+    assert db.session.get(Blob, shas[first]).refcount == 2
@@ -0,0 +1,33 @@
+# ~/librecorder/Software/WebApp/tests/test_startup.py
+import json
+import os
+import subprocess
+import sys
+
+from conftest import WEBAPP_DIR
+
+PROBE = """
+import json, sys, threading
+import app, sandbox
+print(json.dumps({
+    "pool": sandbox._pool is not None,
+    "threads": sorted(t.name for t in threading.enumerate()),
+    "heavy": sorted(m for m in ("torch", "cv2", "numpy") if m in sys.modules),
+}))
+"""
+
+
+def test_importing_the_app_starts_nothing(tmp_path):
+    env = {k: v for k, v in os.environ.items() if not k.startswith("LIBRECORDER_")}
+    env["LIBRECORDER_DATA_DIR"] = str(tmp_path)
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=WEBAPP_DIR, env=env,
+                         capture_output=True, text=True, timeout=120, check=True)
+    probe = json.loads(out.stdout.strip().splitlines()[-1])
+    assert probe == {"pool": False, "threads": ["MainThread"], "heavy": []}
+    assert not os.path.exists(tmp_path / "openlims.db")   # no schema work either
+
+
+def test_init_db_command(app_module):
+    result = app_module.app.test_cli_runner().invoke(args=["init-db"])
+    assert result.exit_code == 0, result.output
+    assert "database ready" in result.output
@@ -0,0 +1,54 @@
+# ~/librecorder/Software/WebApp/tests/test_tiling.py
+import types
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import tiling
+
+
+def _model():
+    return types.SimpleNamespace(
+        HEATMAP_KEY="mean",
+        run_batch=lambda tiles: [{"mean": float(t.mean()), "shape": list(t.shape)} for t in tiles],
+    )
+
+
+def test_tiles_cover_the_image_with_a_heatmap(tmp_path):
+    path = str(tmp_path / "field.png")
+    arr = np.zeros((100, 130, 3), np.uint8)
+    arr[:50, :] = 200
+    Image.fromarray(arr).save(path)
+
+    out = tiling.run_tiled(_model(), path, size=50, overlap=10, batch_size=4)
+    assert out["tile_grid"] == [3, 3] and out["tiles"] == 9
+    assert out["heatmap"][0][0] == 200.0 and out["heatmap"][-1][-1] == 0.0
+
+
+def test_grayscale_tiles_are_rgb(tmp_path):
+    path = str(tmp_path / "gray.png")
+    Image.new("L", (64, 64), 90).save(path)
+    seen = []
+    mod = types.SimpleNamespace(run_array=lambda t: seen.append(t.shape) or {"v": float(t[0, 0, 0])})
+    out = tiling.run_tiled(mod, path, size=32)
+    assert seen == [(32, 32, 3)] * 4 and out["v"] == 90.0
+
+
+@pytest.mark.parametrize("fmt", ["png", "jpeg", "tiff"])
+def test_tiled_runs_have_their_own_pixel_limit(tmp_path, monkeypatch, fmt):
+    path = str(tmp_path / f"big.{fmt}")
+    Image.new("RGB", (120, 100), (10, 20, 30)).save(path, format=fmt)
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)   # the image is over twice this
+    seen = []
+    mod = types.SimpleNamespace(run_batch=lambda tiles: seen.append(Image.MAX_IMAGE_PIXELS) or [{}] * len(tiles))
+
+    assert tiling.run_tiled(mod, path, size=30)["tiles"] == 16
+    # the global limit, which other threads' Image.open use, never changed
+    assert set(seen) == {1000} and Image.MAX_IMAGE_PIXELS == 1000
+    with pytest.raises(Image.DecompressionBombError):
+        Image.open(path)
+
+    monkeypatch.setattr(tiling, "MAX_TILED_PIXELS", 10000)
+    with pytest.raises(Image.DecompressionBombError):
+        tiling.run_tiled(mod, path, size=30)
@@ -0,0 +1,152 @@
+# ~/librecorder/Software/WebApp/tests/test_upload_cli.py
+import io
+import json
+import os
+from urllib.parse import urlsplit
+
+import pytest
+
+requests = pytest.importorskip("requests")
+import upload_cli
+from upload_cli import UploadState, Uploader
+
+from conftest import jpeg_bytes
+
+SERVER = "http://lims.example"
+
+
+class Response:
+    def __init__(self, resp):
+        self.status_code = resp.status_code
+        self.text = resp.get_data(as_text=True)
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class AppSession:
+    """
+    A requests.Session stand-in that sends to the Flask test client. faults
+    maps (method, path prefix) to exceptions, raised one per matching request
+    after the app has handled it (the answer is lost), or before when the
+    exception is a ConnectTimeout (never sent).
+    """
+
+    def __init__(self, client, faults=None):
+        self.client = client
+        self.faults = faults or {}
+        self.calls = []
+
+    def _fault(self, method, path):
+        for (m, prefix), errors in self.faults.items():
+            if m == method and path.startswith(prefix) and errors:
+                return errors.pop(0)
+        return None
+
+    def _send(self, method, url, params=None, json=None, data=None, files=None, timeout=None):
+        path = urlsplit(url).path
+        self.calls.append((method, path))
+        fault = self._fault(method, path)
+        if isinstance(fault, requests.ConnectTimeout):
+            raise fault
+        if files:
+            data = dict(data or {})
+            for field, (name, f) in files.items():
+                data[field] = (io.BytesIO(f.read()), name)
+        resp = self.client.open(path, method=method, query_string=params, json=json, data=data)
+        if isinstance(fault, Exception):
+            raise fault
+        if isinstance(fault, int):      # a proxy answering with an error after the app stored it
+            resp.status_code = fault
+        return Response(resp)
+
+    def get(self, url, **kw):
+        return self._send("GET", url, **kw)
+
+    def post(self, url, **kw):
+        return self._send("POST", url, **kw)
+
+    def put(self, url, **kw):
+        return self._send("PUT", url, **kw)
+
+
+@pytest.fixture
+def uploader(client, case_id):
+    def make(faults=None):
+        up = Uploader(SERVER, case_id, retries=3, backoff=0)
+        up.session = AppSession(client, faults)
+        return up
+    return make
+
+
+def stored_files(client, case_id):
+    r = client.get(f"/cases/{case_id}")
+    return r.get_json() if r.status_code == 200 else []
+
+
+def scan(tmp_path, name="scan.jpg", color=(50, 60, 70)):
+    path = tmp_path / name
+    path.write_bytes(jpeg_bytes(color=color))
+    return str(path), upload_cli.sha256_file(str(path))
+
+
+def test_state_is_kept_per_case(tmp_path):
+    path = str(tmp_path / "state.jsonl")
+    state = UploadState(path, SERVER)
+    state.add("case-1", "ab" * 32, __file__, {"filename": "x.jpg"})
+    assert state.get("case-1", "ab" * 32)["filename"] == "x.jpg"
+
+    reloaded = UploadState(path, SERVER)
+    assert reloaded.get("case-1", "ab" * 32)
+    # the same file sent to another case must be uploaded again
+    assert reloaded.get("case-2", "ab" * 32) is None
+    assert UploadState(path, "http://other.example").get("case-1", "ab" * 32) is None
+
+
+@pytest.mark.parametrize("lost", [requests.ReadTimeout("no answer"), requests.ConnectionError("reset"), 502])
+def test_upload_whose_answer_was_lost_is_not_stored_twice(client, uploader, case_id, tmp_path, lost):
+    path, sha256 = scan(tmp_path, color=(50, 61, 70))
+    up = uploader({("POST", "/upload"): [lost]})
+    resp = up.upload(path, sha256)
+    assert stored_files(client, case_id) == [resp["filename"]]
+    assert up.session.calls.count(("POST", "/upload")) == 1
+
+
+def test_upload_that_never_arrived_is_sent_again(client, uploader, case_id, tmp_path):
+    path, sha256 = scan(tmp_path, color=(50, 62, 70))
+    up = uploader({("POST", "/upload"): [requests.ConnectTimeout("down"), 503]})
+    # the first attempt never reached the app; the second did, but its answer was replaced by a 503
+    resp = up.upload(path, sha256)
+    assert stored_files(client, case_id) == [resp["filename"]]
+    assert up.session.calls.count(("POST", "/upload")) == 2
+
+
+def test_chunked_upload_resumes_after_a_dropped_chunk(client, uploader, case_id, tmp_path, monkeypatch):
+    import chunked_upload
+    monkeypatch.setattr(chunked_upload, "CHUNK_SIZE", 1000)
+    monkeypatch.setattr(upload_cli, "CHUNKED_ABOVE", 0)
+    path = tmp_path / "scan.jpg"
+    path.write_bytes(jpeg_bytes(color=(50, 63, 70)) + os.urandom(3500))   # trailing bytes after the JPEG
+    sha256 = upload_cli.sha256_file(str(path))
+    # the second chunk is stored, but the connection drops before the answer
+    up = uploader({("PUT", "/uploads/"): [None, requests.ConnectionError("dropped")]})
+    resp = up.upload(str(path), sha256)
+    assert resp["sha256"] == sha256
+    assert client.get(f"/cases/{case_id}/{resp['filename']}").get_data() == path.read_bytes()
+    # each chunk was sent once: the retry asked for the offset and skipped the stored one
+    puts = [c for c in up.session.calls if c[0] == "PUT"]
+    assert len(puts) == -(-path.stat().st_size // 1000)
+
+
+def test_failures_that_are_not_transient_are_not_retried(client, uploader, case_id, tmp_path):
+    path = tmp_path / "scan.png"
+    path.write_bytes(b"png")
+    up = uploader()
+    with pytest.raises(upload_cli.UploadFailed, match="only .jpg"):
+        up.upload(str(path), "00" * 32)
+    assert up.session.calls == [("POST", "/upload")]
+
+
+def test_lookup_rejects_bad_digests(client, case_id):
+    assert client.get(f"/cases/{case_id}/files?sha256=xyz").status_code == 400
+    assert client.get(f"/cases/{case_id}/files?sha256={'0' * 64}").status_code == 404
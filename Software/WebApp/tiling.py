@@ -0,0 +1,203 @@
+# ~/librecorder/Software/WebApp/tiling.py
+"""
+Tiled processing for large microscope / whole-slide images.
+
+Normally a model gets the path of one image: run(image_path). For large
+captures the image is instead cut into fixed-size tiles (optionally
+overlapping) which are handed to the model in batches. A model supports
+tiling if it defines one of:
+  run_batch(arrays) -> list of results   (preferred, one call per batch)
+  run_array(array)  -> result            (called once per tile)
+Tiles are RGB uint8 NumPy arrays of shape (H, W, 3).
+
+Memory: PIL cannot decode part of a JPEG or of a compressed TIFF, so the
+image is decoded once, in full, when the first tile is cropped. Tiles are
+then cropped out of it and converted to RGB one at a time; there is no
+full-size RGB copy. Peak memory is therefore one decoded image in its own
+mode (e.g. 3 bytes per pixel for RGB, 1 for grayscale) plus one batch of
+tiles, instead of the several full-resolution copies a plugin's own
+Image.open(...).convert(...) / np.array(...) makes. A 40000 x 30000 RGB
+scan still needs about 3.6 GB, so size LIBRECORDER_SANDBOX_MAX_RSS_MB
+for the largest captures.
+"""
+import math
+import os
+
+import numpy as np
+from PIL import Image, ImageFile, JpegImagePlugin, PngImagePlugin, TiffImagePlugin
+
+DEFAULT_TILE_SIZE = 512
+DEFAULT_OVERLAP = 0
+DEFAULT_BATCH_SIZE = 32
+
+# Slide scans are legitimately larger than PIL's decompression-bomb limit
+# (about 89 Mpx). run_tiled() opens images with this limit instead; the
+# process-wide Image.MAX_IMAGE_PIXELS, and so every other Image.open, is
+# left alone.
+MAX_TILED_PIXELS = int(float(os.environ.get("LIBRECORDER_TILE_MAX_PIXELS", 2e9)))
+
+
+class _LargeTiffImageFile(TiffImagePlugin.TiffImageFile):
+    """A TIFF whose load() does not repeat PIL's global pixel check (open_large makes its own)."""
+
+    def load_prepare(self):
+        if self._im is None:
+            self.im = Image.core.new(self.mode, self._tile_size)
+        ImageFile.ImageFile.load_prepare(self)
+
+
+# the upload formats, opened through their PIL plugin so Image.open's own check is skipped
+_TILED_FORMATS = (_LargeTiffImageFile, JpegImagePlugin.JpegImageFile, PngImagePlugin.PngImageFile)
+
+
+def open_large(image_path, max_pixels=None):
+    """
+    Image.open() with max_pixels (default MAX_TILED_PIXELS) as the
+    decompression-bomb limit, for this image only. Formats other than TIFF,
+    JPEG and PNG keep PIL's limit.
+    """
+    max_pixels = max_pixels or MAX_TILED_PIXELS
+    for image_file in _TILED_FORMATS:
+        try:
+            img = image_file(image_path)
+        except SyntaxError:
+            continue    # not this format
+        if img.width * img.height > max_pixels:
+            img.close()
+            raise Image.DecompressionBombError(
+                f"Image size ({img.width * img.height} pixels) exceeds limit of {max_pixels} pixels "
+                "(LIBRECORDER_TILE_MAX_PIXELS)"
+            )
+        return img
+    return Image.open(image_path)
+
+
+def supports_tiling(mod):
+    return hasattr(mod, "run_batch") or hasattr(mod, "run_array")
+
+
+def tile_options(opts):
+    """
+    Normalize the "tile" option of a /run_model request.
+    Accepts True or a dict: {"size": 512, "overlap": 0, "batch": 32}
+    """
+    opts = opts if isinstance(opts, dict) else {}
+    size = int(opts.get("size", DEFAULT_TILE_SIZE))
+    overlap = int(opts.get("overlap", DEFAULT_OVERLAP))
+    batch = int(opts.get("batch", DEFAULT_BATCH_SIZE))
+    if size <= 0 or batch <= 0:
+        raise ValueError("tile size and batch must be positive")
+    if overlap < 0 or overlap >= size:
+        raise ValueError("tile overlap must be in [0, size)")
+    return size, overlap, batch
+
+
+def _starts(length, size, stride):
+    if length <= size:
+        return [0]
+    starts = list(range(0, length - size + 1, stride))
+    if starts[-1] + size < length:
+        starts.append(length - size)  # last tile flush with the edge
+    return starts
+
+
+def tile_grid(width, height, size, overlap=0):
+    """Return (xs, ys): the left / top offsets of the tile columns and rows."""
+    stride = size - overlap
+    return _starts(width, size, stride), _starts(height, size, stride)
+
+
+def iter_tiles(img, size, overlap=0):
+    """
+    Yield (row, col, box, tile) for every tile of an opened PIL image, as
+    RGB arrays whatever the image mode. box is (x0, y0, x1, y1) in pixels.
+    """
+    xs, ys = tile_grid(img.width, img.height, size, overlap)
+    for row, y0 in enumerate(ys):
+        for col, x0 in enumerate(xs):
+            box = (x0, y0, min(x0 + size, img.width), min(y0 + size, img.height))
+            tile = img.crop(box)
+            yield row, col, box, np.asarray(tile if tile.mode == "RGB" else tile.convert("RGB"))
+
+
+def _run_batch(mod, tiles):
+    if hasattr(mod, "run_batch"):
+        out = list(mod.run_batch(tiles))
+        if len(out) != len(tiles):
+            raise RuntimeError("run_batch returned a different number of results")
+        return out
+    return [mod.run_array(t) for t in tiles]
+
+
+def run_tiled(mod, image_path, size=DEFAULT_TILE_SIZE, overlap=DEFAULT_OVERLAP,
+              batch_size=DEFAULT_BATCH_SIZE):
+    """Run a model over the tiles of one image and aggregate per image."""
+    with open_large(image_path) as img:
+        xs, ys = tile_grid(img.width, img.height, size, overlap)
+
+        tile_results = []
+        batch, where = [], []
+        for row, col, box, tile in iter_tiles(img, size, overlap):
+            batch.append(tile)
+            where.append((row, col))
+            if len(batch) >= batch_size:
+                tile_results.extend(zip(where, _run_batch(mod, batch)))
+                batch, where = [], []
+        if batch:
+            tile_results.extend(zip(where, _run_batch(mod, batch)))
+
+    return aggregate_tiles(
+        tile_results, len(ys), len(xs),
+        heatmap_key=getattr(mod, "HEATMAP_KEY", None),
+        tile={"size": size, "overlap": overlap},
+    )
+
+
+def _is_number(v):
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def aggregate_tiles(tile_results, n_rows, n_cols, heatmap_key=None, tile=None):
+    """
+    Combine [((row, col), result), ...] into one per-image result.
+      - numeric keys are averaged over tiles (same key names as run())
+      - "classification" becomes class_counts plus the majority class
+      - heatmap is an n_rows x n_cols grid of heatmap_key (None where missing)
+    """
+    sums, counts, classes = {}, {}, {}
+    for _, r in tile_results:
+        if not isinstance(r, dict):
+            continue
+        for k, v in r.items():
+            if _is_number(v):
+                sums[k] = sums.get(k, 0.0) + float(v)
+                counts[k] = counts.get(k, 0) + 1
+        if "classification" in r:
+            c = r["classification"]
+            classes[c] = classes.get(c, 0) + 1
+
+    out = {k: round(sums[k] / counts[k], 6) for k in sums}
+    if classes:
+        out["classification"] = max(classes, key=classes.get)
+        out["class_counts"] = classes
+
+    if heatmap_key is None:
+        heatmap_key = next(iter(sums), None)
+
+    heatmap = np.full((n_rows, n_cols), np.nan)
+    if heatmap_key is not None:
+        for (row, col), r in tile_results:
+            v = r.get(heatmap_key) if isinstance(r, dict) else None
+            if _is_number(v):
+                heatmap[row, col] = float(v)
+
+    out["tiles"] = len(tile_results)
+    out["tile_grid"] = [n_rows, n_cols]
+    if tile:
+        out["tile"] = tile
+    out["heatmap_key"] = heatmap_key
+    out["heatmap"] = [
+        [None if math.isnan(v) else round(v, 6) for v in row]
+        for row in heatmap.tolist()
+    ]
+    return out
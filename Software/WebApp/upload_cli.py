@@ -0,0 +1,308 @@
+# ~/librecorder/Software/WebApp/upload_cli.py
+"""
+Headless uploader for acquisition stations (replaces the Tk upload_pic.py flow).
+
+  python upload_cli.py /data/scans "/data/more/*.jpg" --case-id case-42 \
+      --workers 8 --run mean_pixel_v1 --run malaria_cnn_v1
+
+- Directories are walked recursively; globs and single files are accepted.
+- Files are uploaded concurrently over one pooled HTTP session.
+- Large files use the chunked, resumable /uploads protocol, so a dropped
+  connection resumes where it stopped instead of starting over.
+- Failed requests are retried with exponential backoff. A whole-file
+  POST /upload may have been stored even though no answer came back, so
+  before sending it again the case is asked (GET /cases/<id>/files?sha256=)
+  whether the file arrived.
+- Files already uploaded to the same case on the same server are skipped
+  by sha256 (resume an interrupted run with the --case-id it printed). The
+  hashes are kept in a local state file.
+- --run triggers /run_pipeline on the case once everything is uploaded.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_SERVER = os.environ.get("LIBRECORDER_SERVER", "http://microlab.parccommons.org")
+DEFAULT_STATE = os.path.join(os.path.expanduser("~"), ".librecorder_uploads.jsonl")
+UPLOAD_EXTENSIONS = (".jpg", ".jpeg", ".txt")   # what the server accepts
+CHUNKED_ABOVE = 16 * 1024 * 1024                # bytes; larger files use /uploads
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+HASH_BLOCK = 1024 * 1024
+
+
+class UploadFailed(Exception):
+    pass
+
+
+class RetryableError(Exception):
+    pass
+
+
+# ----------------------------
+# Files
+# ----------------------------
+def collect_files(paths):
+    """Expand directories (recursively) and globs into a sorted list of uploadable files."""
+    out = set()
+    for p in paths:
+        matches = glob.glob(p, recursive=True) if glob.has_magic(p) else [p]
+        for m in matches:
+            if os.path.isdir(m):
+                for root, _, names in os.walk(m):
+                    out.update(os.path.join(root, n) for n in names)
+            elif os.path.isfile(m):
+                out.add(m)
+    return sorted(f for f in out if f.lower().endswith(UPLOAD_EXTENSIONS))
+
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# ----------------------------
+# State (what has been uploaded already)
+# ----------------------------
+class UploadState:
+    """Append-only JSON-lines record of uploaded files, keyed by (server, case_id, sha256)."""
+
+    def __init__(self, path, server):
+        self.path = path
+        self.server = server
+        self.lock = threading.Lock()
+        self.done = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by a crash
+                    if rec.get("server") == server:
+                        self.done[(rec.get("case_id"), rec["sha256"])] = rec
+
+    def get(self, case_id, sha256):
+        return self.done.get((case_id, sha256))
+
+    def add(self, case_id, sha256, src, resp):
+        rec = {
+            "server": self.server,
+            "sha256": sha256,
+            "src": os.path.abspath(src),
+            "case_id": case_id,
+            "filename": resp.get("filename"),
+            "time": datetime.now().isoformat(timespec="seconds"),
+        }
+        with self.lock:
+            self.done[(case_id, sha256)] = rec
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(rec) + "\n")
+
+
+# ----------------------------
+# HTTP
+# ----------------------------
+def make_session(workers):
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+
+def with_retries(fn, retries, backoff, what):
+    """Call fn(), retrying RetryableError and connection errors with exponential backoff."""
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except (RetryableError, requests.ConnectionError, requests.Timeout) as e:
+            if attempt == retries:
+                raise UploadFailed(f"{what}: {e}")
+            delay = backoff * (2 ** attempt) * (0.5 + random.random())
+            time.sleep(min(delay, 60))
+
+
+def check(r, ok=(200, 201)):
+    if r.status_code in ok:
+        return r.json()
+    if r.status_code in RETRY_STATUS:
+        raise RetryableError(f"HTTP {r.status_code}")
+    try:
+        msg = r.json().get("error", r.text)
+    except ValueError:
+        msg = r.text
+    raise UploadFailed(f"HTTP {r.status_code}: {msg}")
+
+
+class Uploader:
+    def __init__(self, server, case_id, workers=4, retries=5, backoff=1.0, timeout=60):
+        self.server = server.rstrip("/")
+        self.case_id = case_id
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = make_session(workers)
+
+    def _retry(self, fn, what):
+        return with_retries(fn, self.retries, self.backoff, what)
+
+    def find_uploaded(self, sha256):
+        """The server's response-like record of this case's file with these bytes, or None."""
+        r = self.session.get(f"{self.server}/cases/{self.case_id}/files",
+                             params={"sha256": sha256}, timeout=self.timeout)
+        if r.status_code == 404:
+            return None     # not even the case yet
+        items = check(r)["items"]
+        if not items:
+            return None
+        return {"ok": True, "case_id": self.case_id, "filename": items[0]["file"], "url": items[0]["url"]}
+
+    def upload_small(self, path, sha256):
+        attempts = []
+
+        def send():
+            # POST /upload is not idempotent: an attempt that got no answer may have stored the file
+            if attempts:
+                found = self.find_uploaded(sha256)
+                if found:
+                    return found
+            attempts.append(1)
+            with open(path, "rb") as f:
+                r = self.session.post(
+                    f"{self.server}/upload",
+                    files={"file": (os.path.basename(path), f)},
+                    data={"case_id": self.case_id},
+                    timeout=self.timeout,
+                )
+            return check(r)
+        return self._retry(send, path)
+
+    def upload_chunked(self, path, sha256):
+        size = os.path.getsize(path)
+        start = self._retry(lambda: check(self.session.post(
+            f"{self.server}/uploads",
+            json={"filename": os.path.basename(path), "size": size, "case_id": self.case_id},
+            timeout=self.timeout,
+        )), path)
+        url = f"{self.server}/uploads/{start['upload_id']}"
+        chunk = start["chunk_size"]
+
+        def send_rest():
+            # ask the server where to continue, so a dropped chunk is resumed
+            offset = check(self.session.get(url, timeout=self.timeout))["offset"]
+            with open(path, "rb") as f:
+                f.seek(offset)
+                while offset < size:
+                    data = f.read(chunk)
+                    r = self.session.put(url, params={"offset": offset}, data=data, timeout=self.timeout)
+                    if r.status_code == 409:
+                        raise RetryableError("offset out of sync")
+                    offset = check(r)["offset"]
+
+        self._retry(send_rest, path)
+        return self._retry(lambda: check(self.session.post(
+            f"{url}/finalize", json={"sha256": sha256}, timeout=max(self.timeout, 300),
+        )), path)
+
+    def upload(self, path, sha256):
+        if os.path.getsize(path) > CHUNKED_ABOVE:
+            return self.upload_chunked(path, sha256)
+        return self.upload_small(path, sha256)
+
+    def run_models(self, models):
+        return self._retry(lambda: check(self.session.post(
+            f"{self.server}/run_pipeline",
+            json={"case_id": self.case_id, "models": models, "incremental": True},
+            timeout=None,
+        )), "run_pipeline")
+
+
+# ----------------------------
+# Main
+# ----------------------------
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Upload images and notes to a LibreRecorder server.")
+    p.add_argument("paths", nargs="+", help="files, directories or glob patterns")
+    p.add_argument("--server", default=DEFAULT_SERVER, help="server URL (env LIBRECORDER_SERVER)")
+    p.add_argument("--case-id", help="case to upload into (default: a new case)")
+    p.add_argument("--workers", type=int, default=4, help="concurrent uploads")
+    p.add_argument("--retries", type=int, default=5, help="retries per request")
+    p.add_argument("--backoff", type=float, default=1.0, help="first retry delay in seconds")
+    p.add_argument("--state", default=DEFAULT_STATE, help="file recording uploaded hashes")
+    p.add_argument("--force", action="store_true", help="upload files even if already uploaded")
+    p.add_argument("--run", action="append", default=[], metavar="MODEL_ID",
+                   help="run this model on the case afterwards (repeatable)")
+    p.add_argument("--dry-run", action="store_true", help="only list what would be uploaded")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    files = collect_files(args.paths)
+    if not files:
+        print("No .jpg/.jpeg/.txt files found.")
+        return 1
+
+    # one case for the whole batch; concurrent uploads must not each create their own
+    case_id = args.case_id or datetime.now().strftime("case-%Y%m%d-%H%M%S-%f")
+    state = UploadState(args.state, args.server.rstrip("/"))
+    uploader = Uploader(args.server, case_id, workers=args.workers,
+                        retries=args.retries, backoff=args.backoff)
+    print(f"{len(files)} file(s) -> {args.server} case {case_id}")
+
+    def work(path):
+        sha256 = sha256_file(path)
+        prev = state.get(case_id, sha256)
+        if prev and not args.force:
+            return "skipped", prev
+        if args.dry_run:
+            return "would upload", {}
+        resp = uploader.upload(path, sha256)
+        state.add(case_id, sha256, path, resp)
+        return "uploaded", resp
+
+    counts = {"uploaded": 0, "skipped": 0, "would upload": 0, "failed": 0}
+    t0 = time.time()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(work, f): f for f in files}
+        for n, fut in enumerate(as_completed(futures), 1):
+            path = futures[fut]
+            try:
+                status, info = fut.result()
+            except (UploadFailed, OSError) as e:
+                status, info = "failed", {"error": str(e)}
+            counts[status] += 1
+            detail = info.get("filename") or info.get("case_id") or info.get("error") or ""
+            print(f"[{n}/{len(files)}] {status}: {path} {detail}".rstrip())
+
+    elapsed = time.time() - t0
+    print(", ".join(f"{v} {k}" for k, v in counts.items() if v) + f" in {elapsed:.1f}s")
+
+    if args.run and not args.dry_run and counts["uploaded"]:
+        try:
+            resp = uploader.run_models(args.run)
+            print(f"Ran {', '.join(args.run)} on {case_id}: {resp.get('processed', '?')} image(s)")
+        except UploadFailed as e:
+            print(f"Model run failed: {e}")
+            return 1
+
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,13 +3,22 @@ import numpy as np
 
 MODEL_ID = "dark_light_v1"
 MODEL_NAME = "Dark/Light (sigmoid)"
+HEATMAP_KEY = "sigmoid_score"
+AGGREGATES = {"sigmoid_score": {"histogram": {"range": [0, 1], "bins": 10}}}
 
 def run(image_path: str):
     """Sigmoidal dark/light classifier for one image."""
     img = Image.open(image_path).convert("L")
-    arr = np.array(img, dtype=np.float32)
-    mean_val = float(np.mean(arr))
+    arr = np.asarray(img, dtype=np.float32)
+    return _classify(float(np.mean(arr)))
 
+def run_array(arr):
+    """Same as run() for an RGB array (used for tiles)."""
+    # mean of ITU-R 601-2 luma (as PIL's convert("L")) from the channel means
+    r, g, b = arr.reshape(-1, 3).mean(axis=0)
+    return _classify(float(r * 0.299 + g * 0.587 + b * 0.114))
+
+def _classify(mean_val):
     sig_val = 1 / (1 + np.exp(-(mean_val - 128.0) / 16.0))
     label = "Dark" if sig_val < 0.5 else "Light"
 
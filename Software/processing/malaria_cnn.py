@@ -8,6 +8,13 @@ import torch.nn as nn
 
 MODEL_ID = "malaria_cnn_v1"
 MODEL_NAME = "Malaria CNN (Infected vs Uninfected)"
+HEATMAP_KEY = "p_infected"
+INPUT_SIZE = (50, 50)         # crops from the segmentation stage come at this size
+POSITIVE_CLASS = "Infected"   # counted for parasitemia
+AGGREGATES = {                # extra case-level summaries (see WebApp/aggregation.py)
+    "confidence": ["stats", "histogram"],
+    "p_infected": ["quantiles"],
+}
 
 # ---- model definition (copied from your predictMalaria.py) ----
 class CNNModel(nn.Module):
@@ -81,6 +88,10 @@ def _load_model():
     _MODEL = model
     return _MODEL
 
+def warm_up():
+    """Load the weights ahead of the first run (WebApp preload_models)."""
+    _load_model()
+
 def _preprocess(image_path):
     """
     Match your training/inference:
@@ -94,25 +105,41 @@ def _preprocess(image_path):
     t = torch.from_numpy(arr).permute(2, 0, 1).unsqueeze(0)  # (1,C,H,W)
     return t
 
-def run(image_path):
+def _preprocess_batch(arrays):
+    """Same as _preprocess for a list of RGB arrays -> tensor (N,3,50,50)."""
+    batch = np.empty((len(arrays), 50, 50, 3), dtype=np.float32)
+    for i, arr in enumerate(arrays):
+        if arr.shape[:2] != (50, 50):
+            arr = np.asarray(Image.fromarray(arr).resize((50, 50)))
+        batch[i] = arr
+    batch /= 255.0
+    return torch.from_numpy(batch).permute(0, 3, 1, 2)
+
+def _predict(x):
+    """Run the CNN on a (N,3,50,50) tensor and return one result dict per row."""
     model = _load_model()
-
-    x = _preprocess(image_path)
     with torch.no_grad():
         logits = model(x)
-        probs = torch.softmax(logits, dim=1).cpu().numpy()[0]  # [p0, p1]
+        probs = torch.softmax(logits, dim=1).cpu().numpy()  # rows of [p0, p1]
 
     # Label mapping consistent with your script:
     # 0 = Uninfected, 1 = Infected
-    p_uninfected = float(probs[0])
-    p_infected = float(probs[1])
-    pred_idx = int(np.argmax(probs))
-    classification = "Infected" if pred_idx == 1 else "Uninfected"
-    confidence = float(probs[pred_idx])
-
-    return {
-        "classification": classification,
-        "confidence": round(confidence, 6),
-        "p_uninfected": round(p_uninfected, 6),
-        "p_infected": round(p_infected, 6),
-    }
+    out = []
+    for p in probs:
+        pred_idx = int(np.argmax(p))
+        out.append({
+            "classification": "Infected" if pred_idx == 1 else "Uninfected",
+            "confidence": round(float(p[pred_idx]), 6),
+            "p_uninfected": round(float(p[0]), 6),
+            "p_infected": round(float(p[1]), 6),
+        })
+    return out
+
+def run(image_path):
+    return _predict(_preprocess(image_path))[0]
+
+def run_batch(arrays):
+    """Classify a list of RGB arrays (tiles / cell crops) in one forward pass."""
+    if not arrays:
+        return []
+    return _predict(_preprocess_batch(arrays))
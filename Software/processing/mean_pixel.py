@@ -4,9 +4,13 @@ from PIL import Image
 
 MODEL_ID = "mean_pixel_v1"
 MODEL_NAME = "Mean pixel value (v1)"
+AGGREGATES = {"mean_pixel": ["stats", "quantiles"]}
 
 def run(image_path):
     img = Image.open(image_path).convert("RGB")
-    arr = np.array(img)
+    return run_array(np.asarray(img))
+
+def run_array(arr):
+    """Same as run() for an RGB array (used for tiles)."""
     mean_pixel = float(arr.mean())
     return {"mean_pixel": mean_pixel}
@@ -0,0 +1,202 @@
+# ~/librecorder/Software/processing/rgb_prototype.py
+"""
+Nearest-prototype classifier on mean RGB (the basic_classifier approach).
+
+Each class is one prototype, the mean RGB of its training images; an image
+goes to the class whose prototype is nearest. A batch is classified with
+one broadcast distance computation against the prototype matrix.
+
+Prototypes are learned from labelled folders, one per class:
+  python rgb_prototype.py fit ../basic_classifier/data        # writes PROTOTYPES_PATH
+  python rgb_prototype.py evaluate ../basic_classifier/data   # confusion matrix
+Until a file is fitted the hand-set prototypes of basic_classifier/main.py
+are used.
+
+confidence is the posterior of the predicted class if every class were an
+isotropic Gaussian around its prototype with the spread seen in training.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+MODEL_ID = "rgb_prototype_v1"
+MODEL_NAME = "Nearest RGB prototype"
+AGGREGATES = {"confidence": ["stats", "histogram"], "distance": ["quantiles"]}
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+PROTOTYPES_PATH = os.environ.get(
+    "LIBRECORDER_RGB_PROTOTYPES",
+    os.path.join(HERE, "..", "basic_classifier", "prototypes.npz"),
+)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff")
+
+# basic_classifier/main.py class_means, used until prototypes are fitted
+DEFAULT_CLASSES = ["cardiac", "stomach", "tongue2", "urinary2"]
+DEFAULT_PROTOTYPES = [[180, 50, 50], [160, 120, 100], [200, 60, 70], [220, 200, 150]]
+DEFAULT_SCALE = 20.0          # per-channel spread, in 0-255 units
+
+# ---- lazy-loaded prototypes (reloaded when the file changes) ----
+_MODEL = None
+_MTIME = None
+
+
+def _load_model():
+    global _MODEL, _MTIME
+    mtime = os.path.getmtime(PROTOTYPES_PATH) if os.path.exists(PROTOTYPES_PATH) else None
+    if _MODEL is not None and mtime == _MTIME:
+        return _MODEL
+    if mtime is None:
+        _MODEL = (list(DEFAULT_CLASSES), np.asarray(DEFAULT_PROTOTYPES, dtype=np.float64), DEFAULT_SCALE)
+    else:
+        with np.load(PROTOTYPES_PATH) as f:
+            _MODEL = ([str(c) for c in f["classes"]], f["prototypes"].astype(np.float64), float(f["scale"]))
+    _MTIME = mtime
+    return _MODEL
+
+
+def warm_up():
+    _load_model()
+
+
+def features(arrays):
+    """Mean R, G, B of each RGB array -> (N, 3)."""
+    if len(arrays) > 1 and len({a.shape for a in arrays}) == 1:
+        # equal-sized crops/tiles: sum the pixels of the whole batch in one matrix product
+        batch = np.stack(arrays).reshape(len(arrays), -1, arrays[0].shape[-1])[:, :, :3]
+        n = batch.shape[1]
+        return (np.ones(n, dtype=np.float32) @ batch.astype(np.float32)).astype(np.float64) / n
+    out = np.empty((len(arrays), 3), dtype=np.float64)
+    for i, arr in enumerate(arrays):
+        out[i] = arr.reshape(-1, arr.shape[-1])[:, :3].mean(axis=0)
+    return out
+
+
+def classify(feats):
+    """One result dict per row of an (N, 3) feature matrix."""
+    classes, protos, scale = _load_model()
+    # (N, 1, 3) - (1, K, 3) -> (N, K) squared distances in one pass
+    d2 = ((feats[:, None, :] - protos[None, :, :]) ** 2).sum(axis=2)
+    best = d2.argmin(axis=1)
+    logits = -d2 / (2.0 * scale * scale)
+    logits -= logits.max(axis=1, keepdims=True)
+    post = np.exp(logits)
+    post /= post.sum(axis=1, keepdims=True)
+    dist = np.sqrt(d2)
+
+    rows = np.arange(len(feats))
+    return [{
+        "classification": classes[k],
+        "confidence": round(float(c), 6),
+        "distance": round(float(d), 3),
+        "mean_rgb": [round(float(v), 2) for v in f],
+    } for k, c, d, f in zip(best, post[rows, best], dist[rows, best], feats)]
+
+
+def run(image_path):
+    img = Image.open(image_path).convert("RGB")
+    return run_array(np.asarray(img))
+
+
+def run_array(arr):
+    """Same as run() for an RGB array (used for tiles)."""
+    return classify(features([arr]))[0]
+
+
+def run_batch(arrays):
+    """Classify a list of RGB arrays (tiles / cell crops) against the prototypes at once."""
+    if not arrays:
+        return []
+    return classify(features(arrays))
+
+
+# ----------------------------
+# Fitting from labelled folders
+# ----------------------------
+def labelled_images(data_dir, classes=None):
+    """(class name, image path) for <data_dir>/<class>/<image>."""
+    if classes is None:
+        classes = sorted(d for d in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, d)))
+    for name in classes:
+        folder = os.path.join(data_dir, name)
+        for fname in sorted(os.listdir(folder)):
+            if fname.lower().endswith(IMAGE_EXTENSIONS):
+                yield name, os.path.join(folder, fname)
+
+
+def _folder_features(data_dir, classes=None):
+    names, feats = [], []
+    for name, path in labelled_images(data_dir, classes):
+        try:
+            with Image.open(path) as img:
+                arr = np.asarray(img.convert("RGB"))
+        except OSError:
+            print(f"Failed to load: {path}", file=sys.stderr)
+            continue
+        names.append(name)
+        feats.append(features([arr])[0])
+    return names, np.asarray(feats, dtype=np.float64).reshape(-1, 3)
+
+
+def fit(data_dir, out_path=PROTOTYPES_PATH, classes=None):
+    """Learn one prototype per class folder and save them; returns (classes, prototypes, scale)."""
+    names, feats = _folder_features(data_dir, classes)
+    labels = sorted(set(names))
+    if not labels:
+        raise ValueError(f"no labelled images under {data_dir}")
+    idx = np.asarray([labels.index(n) for n in names])
+    counts = np.bincount(idx, minlength=len(labels))
+    protos = np.zeros((len(labels), 3))
+    np.add.at(protos, idx, feats)
+    protos /= counts[:, None]
+    # pooled per-channel spread around the prototypes
+    scale = float(np.sqrt(((feats - protos[idx]) ** 2).mean())) or DEFAULT_SCALE
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    tmp = out_path + ".tmp.npz"
+    np.savez(tmp, classes=np.asarray(labels), prototypes=protos, scale=scale, counts=counts)
+    os.replace(tmp, out_path)
+    return labels, protos, scale
+
+
+def evaluate(data_dir, classes=None):
+    """(classes, confusion matrix) of the current prototypes on labelled folders; rows are true classes."""
+    known = _load_model()[0]
+    names, feats = _folder_features(data_dir, classes)
+    predicted = [r["classification"] for r in classify(feats)] if len(feats) else []
+    labels = sorted(set(names) | set(predicted), key=lambda c: (c not in known, known.index(c) if c in known else c))
+    cm = np.zeros((len(labels), len(labels)), dtype=np.int64)
+    np.add.at(cm, ([labels.index(n) for n in names], [labels.index(p) for p in predicted]), 1)
+    return labels, cm
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Fit or evaluate the RGB prototypes on <dir>/<class>/ images.")
+    p.add_argument("command", choices=("fit", "evaluate"))
+    p.add_argument("data_dir")
+    p.add_argument("--classes", help="comma-separated class folders (default: every subfolder)")
+    p.add_argument("--out", default=PROTOTYPES_PATH, help="prototype file to write (fit)")
+    args = p.parse_args(argv)
+    classes = args.classes.split(",") if args.classes else None
+
+    if args.command == "fit":
+        labels, protos, scale = fit(args.data_dir, args.out, classes)
+        for name, proto in zip(labels, protos):
+            print(f"{name:>16}  " + " ".join(f"{v:7.2f}" for v in proto))
+        print(f"scale {scale:.2f} -> {args.out}")
+        return 0
+
+    labels, cm = evaluate(args.data_dir, classes)
+    width = max([len(c) for c in labels] + [6])
+    print(" " * (width + 2) + " ".join(f"{c[:width]:>{width}}" for c in labels))
+    for name, row in zip(labels, cm):
+        print(f"{name:>{width}}  " + " ".join(f"{v:>{width}}" for v in row))
+    total = cm.sum()
+    print(f"accuracy {np.trace(cm) / total:.3f} on {total} images" if total else "no images")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())